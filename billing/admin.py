@@ -1,36 +1,408 @@
-from django.contrib import admin
-from .models import Product, Customer, Invoice, InvoiceItem
+from django import forms
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.http import HttpResponseRedirect
+from django.utils.functional import cached_property
+from .models import (Branch, Product, ProductPrice, Customer, Invoice, InvoiceItem, Payment, CustomerBalance, Job,
+                     Schedule, ReminderRun, ReminderMessage, StockMovement)
+from .ledger import PaymentError, record_payment, rebuild_customer_balances
+from .analytics import rebuild_rollups
+from .jobs import enqueue
+from .pricing import apply_prices, set_price
+from .stock import StockError, adjust_stock, billed_quantities, receive_stock, restock_invoice
+
+
+def estimated_row_count(model, using='default'):
+    """The planner's row count for a table (cheap, approximate), or None if unknown"""
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            elif connection.vendor == 'sqlite':
+                # Filled in by ANALYZE (Django does not run it; `manage.py dbshell` + ANALYZE does)
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that skips COUNT(*) on unfiltered lists of big tables.
+
+    Counting millions of invoices costs a full scan on every changelist page;
+    the statistics estimate is close enough for page links. Filtered lists
+    and small tables still get an exact count.
+    """
+    exact_below = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Don't run a second unfiltered COUNT(*) for the "N total" link on filtered lists
+    show_full_result_count = False
+
+
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ['code', 'name', 'gstin', 'state', 'invoice_prefix', 'is_active']
+    list_filter = ['is_active', 'state']
+    search_fields = ['code', 'name', 'gstin']
+
+
+class ProductPriceInline(admin.TabularInline):
+    model = ProductPrice
+    extra = 1
+    fields = ['effective_from', 'price_per_unit', 'tax_percentage', 'created_at']
+    readonly_fields = ['created_at']
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price_per_unit', 'unit', 'tax_percentage', 'is_active', 'created_at']
-    list_filter = ['is_active', 'category', 'unit']
-    search_fields = ['name', 'category']
+    list_display = ['name', 'sku', 'category', 'hsn_code', 'price_per_unit', 'unit', 'tax_percentage', 'stock',
+                    'is_active', 'created_at']
+    list_filter = ['branch', 'is_active', 'track_stock', 'category', 'unit']
+    search_fields = ['name', 'sku', 'category', 'hsn_code']
     list_editable = ['is_active']
+    # Stock moves through Stock movements (receipts, adjustments) and checkouts only
+    readonly_fields = ['stock']
+    inlines = [ProductPriceInline]
+    
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if request.GET.get('model_name') == 'invoiceitem' and request.GET.get('field_name') == 'product':
+            # The invoice line autocomplete offers the current branch's active products only
+            queryset = queryset.filter(branch=request.branch, is_active=True)
+        return queryset, may_have_duplicates
+    
+    def get_readonly_fields(self, request, obj=None):
+        # Once created, price and tax change through the dated price history
+        if obj is not None:
+            return self.readonly_fields + ['price_per_unit', 'tax_percentage']
+        return self.readonly_fields
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        product = form.instance
+        if change:
+            apply_prices(Product.objects.filter(pk=product.pk))
+        else:
+            set_price(product, product.price_per_unit, product.tax_percentage)
 
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(LargeTableAdmin):
     list_display = ['name', 'phone', 'city', 'state', 'created_at']
     search_fields = ['name', 'phone', 'gstin', 'pan_number']
-    list_filter = ['state', 'city']
+    list_filter = ['branch', 'state', 'city']
+    readonly_fields = ['identity_key']
+
+
+class InvoiceItemFormSet(forms.BaseInlineFormSet):
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # Lines can only use products of the invoice's own branch
+        form.fields['product'].queryset = form.fields['product'].queryset.filter(branch=self.instance.branch_id)
+    
+    def clean(self):
+        super().clean()
+        # Same rule as checkout: lines can only take stock that is there.
+        # take_stock re-checks this when saving, in case a sale lands in between
+        before = billed_quantities(self.instance) if self.instance.pk else {}
+        after, products = {}, {}
+        for form in self.forms:
+            product = form.cleaned_data.get('product')
+            if not product or form.cleaned_data.get('DELETE') or form.cleaned_data.get('quantity') is None:
+                continue
+            if not product.is_active and 'product' in form.changed_data:
+                raise forms.ValidationError(f"{product.name} is no longer sold")
+            products[product.pk] = product
+            after[product.pk] = after.get(product.pk, 0) + form.cleaned_data['quantity']
+        for pk, quantity in after.items():
+            product = products[pk]
+            extra = quantity - before.get(pk, 0)
+            if product.track_stock and extra > product.stock:
+                raise forms.ValidationError(f"Only {product.stock} {product.unit} of {product.name} left in stock")
 
 
 class InvoiceItemInline(admin.TabularInline):
     model = InvoiceItem
+    formset = InvoiceItemFormSet
     extra = 1
-    readonly_fields = ['tax_amount', 'amount']
+    # New lines are priced from the product's history as of the invoice date
+    readonly_fields = ['product_name', 'product_unit', 'hsn_code', 'price_per_unit', 'tax_percentage',
+                       'tax_amount', 'amount']
+    autocomplete_fields = ['product']
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(LargeTableAdmin):
     list_display = ['invoice_number', 'customer', 'invoice_date', 'grand_total', 'due_balance', 'whatsapp_sent']
-    list_filter = ['invoice_date', 'whatsapp_sent']
+    list_filter = ['branch', 'invoice_date', 'whatsapp_sent']
+    list_select_related = ['customer']
     search_fields = ['invoice_number', 'customer__name', 'customer__phone']
-    readonly_fields = ['subtotal', 'total_tax', 'grand_total', 'due_balance']
+    readonly_fields = ['subtotal', 'total_tax', 'grand_total', 'received_amount', 'due_balance', 'version']
+    autocomplete_fields = ['customer']
     inlines = [InvoiceItemInline]
+    actions = ['queue_mark_paid', 'queue_send_emails', 'queue_export_csv', 'queue_render_pdfs']
     
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
+    def _queue(self, request, queryset, kind, description):
+        # Only ids go into the job; the worker loads the invoices itself
+        ids = queryset.order_by().values_list('pk', flat=True)
+        jobs = enqueue(kind, ids, requested_by=request.user.get_username())
+        if jobs:
+            numbers = f"job #{jobs[0].pk}" if len(jobs) == 1 else f"jobs #{jobs[0].pk}-#{jobs[-1].pk}"
+            self.message_user(request, f"Queued {description} as {numbers}; `manage.py run_jobs` runs them.",
+                              messages.SUCCESS)
+    
+    @admin.action(description='Mark selected invoices paid (queued)')
+    def queue_mark_paid(self, request, queryset):
+        self._queue(request, queryset.filter(due_balance__gt=0), 'mark_paid', 'mark paid')
+    
+    @admin.action(description='Re-send selected invoices by email (queued)')
+    def queue_send_emails(self, request, queryset):
+        self._queue(request, queryset, 'send_emails', 'email re-send')
+    
+    @admin.action(description='Export selected invoices to CSV (queued)')
+    def queue_export_csv(self, request, queryset):
+        self._queue(request, queryset, 'export_csv', 'CSV export')
+    
+    @admin.action(description='Re-render PDFs of selected invoices (queued)')
+    def queue_render_pdfs(self, request, queryset):
+        self._queue(request, queryset, 'render_pdfs', 'PDF re-render')
+    
+    def save_related(self, request, form, formsets, change):
+        # Totals depend on the inline items, so recalculate once they are saved
+        obj = form.instance
+        before = billed_quantities(obj) if change else {}
+        super().save_related(request, form, formsets, change)
+        # Added, changed and removed lines take or give back their difference
+        restock_invoice(obj, before, billed_quantities(obj))
         obj.calculate_totals()
+        # Edits made through the API against the old lines must be reloaded first
+        Invoice.objects.filter(pk=obj.pk).update(version=F('version') + 1)
+        
+        customer_ids = {obj.customer_id}
+        if change and 'customer' in form.changed_data:
+            customer_ids.add(form.initial.get('customer'))
+        rebuild_customer_balances(customer_ids)
+        
+        dates = {obj.invoice_date}
+        if change and 'invoice_date' in form.changed_data:
+            dates.add(form.initial.get('invoice_date'))
+        for day in dates:
+            rebuild_rollups(day, day)
+
+
+    def _delete_invoices(self, invoices):
+        # Deleted invoices give their stock back, and leave the balances and
+        # daily rollups they were counted in
+        customer_ids, dates = set(), set()
+        with transaction.atomic():
+            for invoice in invoices:
+                restock_invoice(invoice, billed_quantities(invoice))
+                customer_ids.add(invoice.customer_id)
+                dates.add(invoice.invoice_date)
+                invoice.delete()
+            rebuild_customer_balances(customer_ids)
+            for day in sorted(dates):
+                rebuild_rollups(day, day)
+    
+    def delete_model(self, request, obj):
+        self._delete_invoices([obj])
+    
+    def delete_queryset(self, request, queryset):
+        self._delete_invoices(list(queryset))
+
+
+class PaymentForm(forms.ModelForm):
+    class Meta:
+        model = Payment
+        fields = ['invoice', 'amount', 'method', 'reference', 'paid_on', 'notes']
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        invoice = cleaned_data.get('invoice')
+        amount = cleaned_data.get('amount')
+        if invoice and amount and amount > invoice.due_balance:
+            raise forms.ValidationError(f"Payment exceeds the due balance of Rs. {invoice.due_balance}")
+        return cleaned_data
+
+
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ['invoice', 'customer', 'amount', 'method', 'reference', 'paid_on']
+    list_filter = ['method', 'paid_on']
+    # Invoice.__str__ shows the customer's name too
+    list_select_related = ['invoice__customer', 'customer']
+    autocomplete_fields = ['invoice']
+    search_fields = ['invoice__invoice_number', 'customer__name', 'reference']
+    form = PaymentForm
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def save_model(self, request, obj, form, change):
+        # Go through the ledger so invoice and customer balances move with the payment
+        try:
+            payment = record_payment(
+                obj.invoice, obj.amount,
+                method=obj.method, reference=obj.reference, paid_on=obj.paid_on, notes=obj.notes,
+            )
+        except PaymentError as e:
+            # e.g. another payment landed after the form checked the due balance
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        obj.pk = payment.pk
+    
+    def log_addition(self, request, obj, message):
+        if obj.pk is not None:
+            return super().log_addition(request, obj, message)
+    
+    def response_add(self, request, obj, post_url_continue=None):
+        if obj.pk is None:
+            # The ledger refused the payment and save_model said why; back to the form
+            return HttpResponseRedirect(request.get_full_path())
+        return super().response_add(request, obj, post_url_continue)
+
+
+class StockMovementForm(forms.ModelForm):
+    class Meta:
+        model = StockMovement
+        fields = ['product', 'kind', 'change', 'note']
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        kind, change = cleaned_data.get('kind'), cleaned_data.get('change')
+        if kind == StockMovement.SALE:
+            raise forms.ValidationError("Sales are recorded by checkout; use a receipt or an adjustment")
+        if kind == StockMovement.RECEIPT and change is not None and change <= 0:
+            raise forms.ValidationError("A receipt must add stock")
+        product = cleaned_data.get('product')
+        if product and change is not None and product.stock + change < 0:
+            raise forms.ValidationError(f"Only {product.stock} {product.unit} of {product.name} in stock")
+        return cleaned_data
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(LargeTableAdmin):
+    list_display = ['product', 'kind', 'change', 'balance', 'invoice', 'note', 'created_at']
+    list_filter = ['kind', 'created_at']
+    list_select_related = ['product', 'invoice__customer']
+    autocomplete_fields = ['product']
+    search_fields = ['product__name', 'invoice__invoice_number', 'note']
+    form = StockMovementForm
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def save_model(self, request, obj, form, change):
+        # Go through billing.stock so the product's level moves with the movement
+        try:
+            if obj.kind == StockMovement.RECEIPT:
+                movement = receive_stock(obj.product, obj.change, note=obj.note)
+            else:
+                movement = adjust_stock(obj.product, obj.change, note=obj.note)
+        except StockError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        obj.pk = movement.pk
+
+
+@admin.register(CustomerBalance)
+class CustomerBalanceAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'total_billed', 'total_paid', 'outstanding', 'updated_at']
+    list_select_related = ['customer']
+    search_fields = ['customer__name', 'customer__phone']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'attempts', 'requested_by', 'created_at', 'duration', 'result']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['kind', 'payload', 'status', 'attempts', 'result', 'requested_by',
+                       'created_at', 'started_at', 'heartbeat_at', 'finished_at']
+    actions = ['retry']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.display(description='Duration')
+    def duration(self, obj):
+        if obj.started_at and obj.finished_at:
+            return f"{(obj.finished_at - obj.started_at).total_seconds():.1f}s"
+        return '-'
+    
+    @admin.action(description='Retry selected failed jobs')
+    def retry(self, request, queryset):
+        count = queryset.filter(status=Job.FAILED).update(status=Job.QUEUED, result='')
+        self.message_user(request, f"Requeued {count} job(s)", messages.SUCCESS)
+
+
+@admin.register(Schedule)
+class ScheduleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'cron', 'next_run_at', 'last_run_at', 'last_job', 'skipped']
+    list_select_related = ['last_job']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        # Schedules are defined in settings.SCHEDULES
+        return False
+
+
+@admin.register(ReminderRun)
+class ReminderRunAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'dry_run', 'customers', 'invoices', 'sent', 'failed', 'skipped', 'seconds']
+    list_filter = ['dry_run']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ReminderMessage)
+class ReminderMessageAdmin(LargeTableAdmin):
+    list_display = ['created_at', 'customer', 'channel', 'stage', 'invoice_count', 'amount_due', 'status', 'error']
+    list_filter = ['status', 'channel', 'stage']
+    list_select_related = ['customer']
+    search_fields = ['customer__name', 'customer__phone', 'customer__email']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
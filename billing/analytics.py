@@ -0,0 +1,238 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum, Max, Count
+from django.db.models.functions import TruncWeek, TruncMonth
+from django.utils import timezone
+
+from .models import Invoice, InvoiceItem, DailySales, DailyProductSales, DailyCustomerSales
+
+
+GRANULARITIES = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def _increment(model, lookup, **deltas):
+    """Add `deltas` to the bucket matching `lookup`, creating the bucket if needed"""
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if model is DailySales:
+        updates['updated_at'] = timezone.now()
+
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Bucket created concurrently; add to it instead
+        model.objects.filter(**lookup).update(**updates)
+
+
+def record_invoices(invoices):
+    """Add newly created invoices to their branch's daily buckets.
+
+    `invoices` is a list of (invoice, items) pairs. Deltas are merged per
+    bucket first so a batch touches each bucket row once.
+    """
+    days = defaultdict(lambda: defaultdict(Decimal))
+    products = defaultdict(lambda: defaultdict(Decimal))
+    customers = defaultdict(lambda: defaultdict(Decimal))
+
+    for invoice, items in invoices:
+        day = days[(invoice.branch_id, invoice.invoice_date)]
+        day['invoice_count'] += 1
+        day['subtotal'] += invoice.subtotal
+        day['tax'] += invoice.total_tax
+        day['discount'] += invoice.discount
+        day['revenue'] += invoice.grand_total
+
+        customer = customers[(invoice.branch_id, invoice.invoice_date, invoice.customer_id)]
+        customer['invoice_count'] += 1
+        customer['revenue'] += invoice.grand_total
+
+        for item in items:
+            if item.product_id is None:
+                continue
+            product = products[(invoice.branch_id, invoice.invoice_date, item.product_id)]
+            product['quantity'] += item.quantity
+            product['revenue'] += item.amount
+
+    with transaction.atomic():
+        for (branch_id, day), deltas in days.items():
+            deltas['invoice_count'] = int(deltas['invoice_count'])
+            _increment(DailySales, {'branch_id': branch_id, 'date': day}, **deltas)
+        for (branch_id, day, product_id), deltas in products.items():
+            _increment(DailyProductSales, {'branch_id': branch_id, 'date': day, 'product_id': product_id}, **deltas)
+        for (branch_id, day, customer_id), deltas in customers.items():
+            deltas['invoice_count'] = int(deltas['invoice_count'])
+            _increment(DailyCustomerSales, {'branch_id': branch_id, 'date': day, 'customer_id': customer_id},
+                       **deltas)
+
+
+def record_invoice(invoice):
+    """Add one newly created invoice to the daily buckets"""
+    record_invoices([(invoice, list(invoice.items.all()))])
+
+
+def record_edit(invoice, subtotal, tax, discount, products):
+    """Move an edited invoice's buckets by the change in its totals.
+
+    `products` maps product id to its (quantity, amount) change.
+    """
+    revenue = subtotal + tax - discount
+    bucket = {'branch_id': invoice.branch_id, 'date': invoice.invoice_date}
+    with transaction.atomic():
+        _increment(DailySales, bucket, subtotal=subtotal, tax=tax, discount=discount, revenue=revenue)
+        _increment(DailyCustomerSales, {**bucket, 'customer_id': invoice.customer_id}, revenue=revenue)
+        for product_id, (quantity, amount) in products.items():
+            _increment(DailyProductSales, {**bucket, 'product_id': product_id}, quantity=quantity, revenue=amount)
+
+
+def rebuild_rollups(start=None, end=None, branch=None):
+    """Recompute the daily buckets from invoices, for all dates or a date range, and all branches or one"""
+    invoices = Invoice.objects.all()
+    items = InvoiceItem.objects.filter(product__isnull=False)
+    buckets = [DailySales.objects.all(), DailyProductSales.objects.all(), DailyCustomerSales.objects.all()]
+    if branch is not None:
+        invoices = invoices.filter(branch=branch)
+        items = items.filter(invoice__branch=branch)
+        buckets = [qs.filter(branch=branch) for qs in buckets]
+    if start:
+        invoices = invoices.filter(invoice_date__gte=start)
+        items = items.filter(invoice__invoice_date__gte=start)
+        buckets = [qs.filter(date__gte=start) for qs in buckets]
+    if end:
+        invoices = invoices.filter(invoice_date__lte=end)
+        items = items.filter(invoice__invoice_date__lte=end)
+        buckets = [qs.filter(date__lte=end) for qs in buckets]
+
+    with transaction.atomic():
+        for qs in buckets:
+            qs.delete()
+
+        DailySales.objects.bulk_create([
+            DailySales(branch_id=row['branch_id'], date=row['invoice_date'], invoice_count=row['n'],
+                       subtotal=row['subtotal'], tax=row['tax'], discount=row['discount'], revenue=row['revenue'])
+            for row in invoices.values('branch_id', 'invoice_date').annotate(
+                n=Count('id'), subtotal=Sum('subtotal'), tax=Sum('total_tax'),
+                discount=Sum('discount'), revenue=Sum('grand_total'),
+            ).order_by()
+        ], batch_size=1000)
+
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(branch_id=row['invoice__branch_id'], date=row['invoice__invoice_date'],
+                              product_id=row['product_id'], quantity=row['quantity'], revenue=row['revenue'])
+            for row in items.values('invoice__branch_id', 'invoice__invoice_date', 'product_id').annotate(
+                quantity=Sum('quantity'), revenue=Sum('amount'),
+            ).order_by()
+        ], batch_size=1000)
+
+        DailyCustomerSales.objects.bulk_create([
+            DailyCustomerSales(branch_id=row['branch_id'], date=row['invoice_date'], customer_id=row['customer_id'],
+                               invoice_count=row['n'], revenue=row['revenue'])
+            for row in invoices.values('branch_id', 'invoice_date', 'customer_id').annotate(
+                n=Count('id'), revenue=Sum('grand_total'),
+            ).order_by()
+        ], batch_size=1000)
+
+        # Rebuilt rows carry a fresh updated_at; touch each branch's latest day too, in case its range is now empty
+        rebuilt = DailySales.objects.all() if branch is None else DailySales.objects.filter(branch=branch)
+        for row in rebuilt.values('branch_id').annotate(latest=Max('date')).order_by():
+            DailySales.objects.filter(branch_id=row['branch_id'], date=row['latest']).update(updated_at=timezone.now())
+
+
+def _data_version(branch):
+    """Changes whenever any of the branch's buckets changes"""
+    latest = DailySales.objects.filter(branch=branch).aggregate(latest=Max('updated_at'))['latest']
+    return latest.timestamp() if latest else 0
+
+
+def _money(value):
+    return float(value or 0)
+
+
+def sales_report(branch, start, end, granularity='day', top=10):
+    """Revenue, tax, invoice count, top products and top customers of one branch for a date range.
+
+    Answered from the branch's daily buckets, so the cost depends on the
+    length of the range rather than the size of the invoice history. Results
+    are cached per (branch, range, granularity, top) and invalidated whenever
+    one of the branch's buckets changes.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    key = f"billing:analytics:{branch.pk}:{_data_version(branch)}:{start}:{end}:{granularity}:{top}"
+    report = cache.get(key)
+    if report is None:
+        report = _build_report(branch, start, end, granularity, top)
+        cache.set(key, report, CACHE_TIMEOUT)
+    return report
+
+
+def _build_report(branch, start, end, granularity, top):
+    trunc = GRANULARITIES[granularity]
+    period = trunc('date') if trunc else F('date')
+    in_range = {'branch': branch, 'date__gte': start, 'date__lte': end}
+    rows = DailySales.objects.filter(**in_range).annotate(
+        period=period,
+    ).values('period').annotate(
+        n=Sum('invoice_count'), subtotal_sum=Sum('subtotal'), tax_sum=Sum('tax'),
+        discount_sum=Sum('discount'), revenue_sum=Sum('revenue'),
+    ).order_by('period')
+    series = [{
+        'period': row['period'].isoformat(),
+        'invoice_count': row['n'],
+        'subtotal': _money(row['subtotal_sum']),
+        'tax': _money(row['tax_sum']),
+        'discount': _money(row['discount_sum']),
+        'revenue': _money(row['revenue_sum']),
+    } for row in rows]
+
+    top_products = DailyProductSales.objects.filter(**in_range).values(
+        'product_id', 'product__name',
+    ).annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('-revenue')[:top]
+
+    top_customers = DailyCustomerSales.objects.filter(**in_range).values(
+        'customer_id', 'customer__name',
+    ).annotate(invoice_count=Sum('invoice_count'), revenue=Sum('revenue')).order_by('-revenue')[:top]
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'totals': {
+            'invoice_count': sum(row['invoice_count'] for row in series),
+            'subtotal': round(sum(row['subtotal'] for row in series), 2),
+            'tax': round(sum(row['tax'] for row in series), 2),
+            'discount': round(sum(row['discount'] for row in series), 2),
+            'revenue': round(sum(row['revenue'] for row in series), 2),
+        },
+        'series': series,
+        'top_products': [{
+            'product_id': row['product_id'],
+            'name': row['product__name'],
+            'quantity': _money(row['quantity']),
+            'revenue': _money(row['revenue']),
+        } for row in top_products],
+        'top_customers': [{
+            'customer_id': row['customer_id'],
+            'name': row['customer__name'],
+            'invoice_count': row['invoice_count'],
+            'revenue': _money(row['revenue']),
+        } for row in top_customers],
+    }
+
+
+def default_range(days=30):
+    """The last `days` days, ending today"""
+    end = date.today()
+    return end - timedelta(days=days - 1), end
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BillingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'billing'
+
+    def ready(self):
+        from . import customers  # noqa: F401 - connects the customer cache signals
+        from . import caching  # noqa: F401 - connects the cache version signals
+        from . import search  # noqa: F401 - keeps the invoice search index current
@@ -0,0 +1,417 @@
+"""Columnar archive for closed financial years.
+
+Each archived year is a directory of NumPy ``.npy`` files, one per column,
+for invoices and for their lines. Files are opened with ``mmap_mode='r'`` so
+only the pages a query touches are read. Money is stored as integer paise and
+quantities/rates as integer hundredths, so nothing is lost to floating point.
+
+Invoice lines are stored in invoice order; each invoice keeps the offset and
+count of its lines (``item_start``/``item_count``).
+"""
+import json
+import shutil
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Branch, Invoice, InvoiceItem, default_branch_id
+
+
+INVOICE_TEXT_COLUMNS = [
+    'invoice_number', 'notes', 'terms_conditions',
+    'customer_name', 'customer_email', 'customer_phone', 'customer_address',
+    'customer_pan_number', 'customer_gstin', 'customer_place_of_supply',
+]
+INVOICE_MONEY_COLUMNS = ['subtotal', 'total_tax', 'discount', 'grand_total', 'received_amount', 'due_balance']
+INVOICE_INT_COLUMNS = ['id', 'branch_id', 'customer_id', 'item_start', 'item_count']
+
+ITEM_TEXT_COLUMNS = ['product_name', 'product_unit', 'product_category', 'hsn_code']
+ITEM_HUNDREDTHS_COLUMNS = ['quantity', 'price_per_unit', 'tax_percentage', 'tax_amount', 'amount']
+ITEM_INT_COLUMNS = ['product_id']
+
+
+class ArchiveError(Exception):
+    """Raised when a year cannot be archived or read"""
+
+
+def archive_root():
+    return Path(getattr(settings, 'ARCHIVE_ROOT', settings.BASE_DIR / 'archive'))
+
+
+def financial_year_label(start_year):
+    """2023 -> '2023-24' (April 2023 to March 2024)"""
+    return f"{start_year}-{(start_year + 1) % 100:02d}"
+
+
+def financial_year_range(start_year):
+    return date(start_year, 4, 1), date(start_year + 1, 3, 31)
+
+
+def _hundredths(value):
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+def _from_hundredths(value):
+    return Decimal(int(value)).scaleb(-2)
+
+
+def _text_array(values):
+    # Fixed-width unicode so the column can be memory-mapped
+    width = max((len(v) for v in values), default=0)
+    return np.array(values, dtype=f'<U{max(width, 1)}')
+
+
+def _collect(start, end):
+    """Read one year's settled invoices and their lines into column lists"""
+    invoices = {name: [] for name in INVOICE_TEXT_COLUMNS + INVOICE_MONEY_COLUMNS + INVOICE_INT_COLUMNS}
+    invoices['invoice_date'] = []
+    items = {name: [] for name in ITEM_TEXT_COLUMNS + ITEM_HUNDREDTHS_COLUMNS + ITEM_INT_COLUMNS}
+
+    qs = (Invoice.objects
+          .filter(invoice_date__gte=start, invoice_date__lte=end, due_balance__lte=0)
+          .select_related('customer')
+          .order_by('invoice_date', 'pk'))
+
+    lines_by_invoice = {}
+    for row in (InvoiceItem.objects
+                .filter(invoice__in=qs.values('pk'))
+                .order_by('invoice_id', 'pk')
+                .values_list('invoice_id', 'product_id', *ITEM_TEXT_COLUMNS, *ITEM_HUNDREDTHS_COLUMNS)
+                .iterator(chunk_size=5000)):
+        lines_by_invoice.setdefault(row[0], []).append(row[1:])
+
+    ids = []
+    for invoice in qs.iterator(chunk_size=2000):
+        customer = invoice.customer
+        lines = lines_by_invoice.get(invoice.pk, [])
+        ids.append(invoice.pk)
+
+        invoices['id'].append(invoice.pk)
+        invoices['branch_id'].append(invoice.branch_id)
+        invoices['customer_id'].append(invoice.customer_id)
+        invoices['item_start'].append(len(items['product_id']))
+        invoices['item_count'].append(len(lines))
+        invoices['invoice_date'].append(invoice.invoice_date)
+        invoices['invoice_number'].append(invoice.invoice_number)
+        invoices['notes'].append(invoice.notes)
+        invoices['terms_conditions'].append(invoice.terms_conditions)
+        invoices['customer_name'].append(customer.name)
+        invoices['customer_email'].append(customer.email or '')
+        invoices['customer_phone'].append(customer.phone)
+        invoices['customer_address'].append(customer.get_full_address())
+        invoices['customer_pan_number'].append(customer.pan_number)
+        invoices['customer_gstin'].append(customer.gstin)
+        invoices['customer_place_of_supply'].append(customer.place_of_supply)
+        for name in INVOICE_MONEY_COLUMNS:
+            invoices[name].append(_hundredths(getattr(invoice, name)))
+
+        for line in lines:
+            product_id, *rest = line
+            items['product_id'].append(product_id or 0)
+            for name, value in zip(ITEM_TEXT_COLUMNS + ITEM_HUNDREDTHS_COLUMNS, rest):
+                items[name].append(_hundredths(value) if name in ITEM_HUNDREDTHS_COLUMNS else (value or ''))
+
+    return ids, invoices, items
+
+
+def _to_arrays(invoices, items):
+    inv = {name: _text_array(invoices[name]) for name in INVOICE_TEXT_COLUMNS}
+    inv.update({name: np.array(invoices[name], dtype=np.int64) for name in INVOICE_MONEY_COLUMNS + INVOICE_INT_COLUMNS})
+    inv['invoice_date'] = np.array(invoices['invoice_date'], dtype='datetime64[D]')
+    itm = {name: _text_array(items[name]) for name in ITEM_TEXT_COLUMNS}
+    itm.update({name: np.array(items[name], dtype=np.int64) for name in ITEM_HUNDREDTHS_COLUMNS + ITEM_INT_COLUMNS})
+    return inv, itm
+
+
+def _merge(existing, new_inv, new_itm):
+    """Append newly archived rows to an existing year, skipping invoices already there"""
+    keep = ~np.isin(new_inv['id'], existing.invoices('id'))
+    if not keep.any():
+        # Everything collected is already archived
+        return ({name: np.asarray(existing.invoices(name)) for name in new_inv},
+                {name: np.asarray(existing.items(name)) for name in new_itm})
+    if not keep.all():
+        # Rebuild the new item block without the invoices that were already archived
+        starts, counts = new_inv['item_start'][keep], new_inv['item_count'][keep]
+        index = np.concatenate([np.arange(s, s + c) for s, c in zip(starts, counts)] or [np.array([], dtype=np.int64)])
+        new_itm = {name: col[index] for name, col in new_itm.items()}
+        new_inv = {name: col[keep] for name, col in new_inv.items()}
+        new_inv['item_start'] = (np.cumsum(new_inv['item_count']) - new_inv['item_count']).astype(np.int64)
+
+    offset = len(existing.items('product_id'))
+    new_inv['item_start'] = new_inv['item_start'] + offset
+    inv = {name: np.concatenate([np.asarray(existing.invoices(name)), col]) for name, col in new_inv.items()}
+    itm = {name: np.concatenate([np.asarray(existing.items(name)), col]) for name, col in new_itm.items()}
+    return inv, itm
+
+
+def _write(path, inv, itm, meta):
+    tmp = path.with_name(path.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    (tmp / 'invoices').mkdir(parents=True)
+    (tmp / 'items').mkdir()
+    for name, col in inv.items():
+        np.save(tmp / 'invoices' / f'{name}.npy', col)
+    for name, col in itm.items():
+        np.save(tmp / 'items' / f'{name}.npy', col)
+    (tmp / 'meta.json').write_text(json.dumps(meta, indent=2))
+
+    # Swap the finished directory in so readers never see a half-written year
+    if path.exists():
+        old = path.with_name(path.name + '.old')
+        path.rename(old)
+        tmp.rename(path)
+        shutil.rmtree(old)
+    else:
+        tmp.rename(path)
+
+
+def archive_financial_year(start_year):
+    """Copy a closed financial year's settled invoices into the archive.
+
+    Invoices with a due balance are left out so dues tracking keeps working.
+    Archived invoices are not deleted: that would take their payments with
+    them, and customer balances and daily rollups rebuilt afterwards would
+    silently lose the year. Returns a dict of counts.
+    """
+    start, end = financial_year_range(start_year)
+    if end >= timezone.localdate():
+        raise ArchiveError(f"Financial year {financial_year_label(start_year)} is not closed yet")
+
+    ids, invoices, items = _collect(start, end)
+    path = archive_root() / financial_year_label(start_year)
+
+    inv, itm = _to_arrays(invoices, items)
+    if path.exists():
+        inv, itm = _merge(ArchivedYear(path), inv, itm)
+
+    meta = {
+        'financial_year': financial_year_label(start_year),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'invoices': int(len(inv['id'])),
+        'items': int(len(itm['product_id'])),
+        'archived_at': timezone.now().isoformat(),
+    }
+    _write(path, inv, itm, meta)
+
+    unpaid = Invoice.objects.filter(invoice_date__gte=start, invoice_date__lte=end, due_balance__gt=0).count()
+    return {'archived': len(ids), 'total': meta['invoices'], 'left_unpaid': unpaid}
+
+
+class ArchivedCustomer:
+    """Customer details as they were when the invoice was archived"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def get_full_address(self):
+        return self.address
+
+
+class ArchivedItem:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def get_base_amount(self):
+        return self.price_per_unit * self.quantity
+
+    def get_tax_per_unit(self):
+        return (self.price_per_unit * self.tax_percentage) / Decimal('100')
+
+
+class ArchivedItems(list):
+    """List of lines that also answers `.all()`, like a related manager"""
+
+    def all(self):
+        return self
+
+
+class ArchivedInvoice:
+    """Read-only invoice rebuilt from archive columns.
+
+    Exposes the attributes `generate_invoice_pdf` and the templates use, so
+    archived invoices render through the normal paths.
+    """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def __str__(self):
+        return f"Invoice #{self.invoice_number} - {self.customer.name}"
+
+
+class ArchivedYear:
+    """One archived financial year, with columns memory-mapped on first use"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if not (self.path / 'meta.json').exists():
+            raise ArchiveError(f"No archive at {self.path}")
+        self.meta = json.loads((self.path / 'meta.json').read_text())
+        self._columns = {}
+
+    @property
+    def label(self):
+        return self.meta['financial_year']
+
+    def _column(self, table, name):
+        key = (table, name)
+        if key not in self._columns:
+            path = self.path / table / f'{name}.npy'
+            if key == ('invoices', 'branch_id') and not path.exists():
+                # Years archived before branches were recorded hold only default-branch invoices
+                self._columns[key] = np.full(len(self), default_branch_id(), dtype=np.int64)
+            else:
+                self._columns[key] = np.load(path, mmap_mode='r')
+        return self._columns[key]
+
+    def invoices(self, name):
+        return self._column('invoices', name)
+
+    def items(self, name):
+        return self._column('items', name)
+
+    def __len__(self):
+        return self.meta['invoices']
+
+    def _branch_rows(self, branch_id):
+        """Boolean mask of the rows in `branch_id` (every row when it is None)"""
+        if branch_id is None:
+            return np.ones(len(self), dtype=bool)
+        return np.asarray(self.invoices('branch_id')) == branch_id
+
+    def search(self, query, limit=50, branch_id=None):
+        """Row numbers of invoices whose number, customer name, phone, email or GSTIN contains `query`"""
+        query = query.strip().lower()
+        if not query or not len(self):
+            return []
+        mask = np.zeros(len(self), dtype=bool)
+        for name in ['invoice_number', 'customer_name', 'customer_phone', 'customer_email', 'customer_gstin']:
+            mask |= np.char.find(np.char.lower(np.asarray(self.invoices(name))), query) >= 0
+        rows = np.flatnonzero(mask & self._branch_rows(branch_id))
+        # Newest first, like the live invoice search
+        return rows[::-1][:limit].tolist()
+
+    def find(self, invoice_number, branch_id=None):
+        """Row of an invoice number; numbers are only unique within a branch, so pass the branch"""
+        matches = np.asarray(self.invoices('invoice_number')) == invoice_number
+        rows = np.flatnonzero(matches & self._branch_rows(branch_id))
+        return int(rows[0]) if len(rows) else None
+
+    def invoice(self, row):
+        """Rebuild the invoice at `row`, with its customer snapshot and lines"""
+        col = self.invoices
+        start = int(col('item_start')[row])
+        count = int(col('item_count')[row])
+
+        items = ArchivedItems()
+        for i in range(start, start + count):
+            items.append(ArchivedItem(
+                product_id=int(self.items('product_id')[i]) or None,
+                product_name=str(self.items('product_name')[i]),
+                product_unit=str(self.items('product_unit')[i]),
+                product_category=str(self.items('product_category')[i]),
+                hsn_code=str(self.items('hsn_code')[i]),
+                quantity=_from_hundredths(self.items('quantity')[i]),
+                price_per_unit=_from_hundredths(self.items('price_per_unit')[i]),
+                tax_percentage=_from_hundredths(self.items('tax_percentage')[i]),
+                tax_amount=_from_hundredths(self.items('tax_amount')[i]),
+                amount=_from_hundredths(self.items('amount')[i]),
+            ))
+
+        customer = ArchivedCustomer(
+            pk=int(col('customer_id')[row]),
+            name=str(col('customer_name')[row]),
+            email=str(col('customer_email')[row]),
+            phone=str(col('customer_phone')[row]),
+            address=str(col('customer_address')[row]),
+            pan_number=str(col('customer_pan_number')[row]),
+            gstin=str(col('customer_gstin')[row]),
+            place_of_supply=str(col('customer_place_of_supply')[row]),
+        )
+
+        return ArchivedInvoice(
+            pk=int(col('id')[row]),
+            financial_year=self.label,
+            # The branch's own name and GSTIN go on the PDF, as for live invoices
+            branch=Branch.objects.filter(pk=int(col('branch_id')[row])).first(),
+            invoice_number=str(col('invoice_number')[row]),
+            invoice_date=col('invoice_date')[row].astype(object),
+            customer=customer,
+            items=items,
+            notes=str(col('notes')[row]),
+            terms_conditions=str(col('terms_conditions')[row]),
+            **{name: _from_hundredths(col(name)[row]) for name in INVOICE_MONEY_COLUMNS},
+        )
+
+    def summary(self, top=10, branch_id=None):
+        """Monthly totals and top products computed with vectorized column scans"""
+        rows = self._branch_rows(branch_id)
+        # Lines are stored in invoice order, so each invoice's flag covers its block of lines
+        lines = np.repeat(rows, np.asarray(self.invoices('item_count')))
+        months = np.asarray(self.invoices('invoice_date'))[rows].astype('datetime64[M]')
+        labels, index = np.unique(months, return_inverse=True)
+
+        def by_month(name):
+            return np.bincount(index, weights=np.asarray(self.invoices(name))[rows], minlength=len(labels))
+
+        counts = np.bincount(index, minlength=len(labels))
+        revenue, tax = by_month('grand_total'), by_month('total_tax')
+
+        names, product_index = np.unique(np.asarray(self.items('product_name'))[lines], return_inverse=True)
+        product_revenue = np.bincount(product_index, weights=np.asarray(self.items('amount'))[lines],
+                                      minlength=len(names))
+        product_quantity = np.bincount(product_index, weights=np.asarray(self.items('quantity'))[lines],
+                                       minlength=len(names))
+        best = np.argsort(product_revenue)[::-1][:top]
+
+        return {
+            'financial_year': self.label,
+            'invoice_count': int(counts.sum()),
+            'revenue': round(float(revenue.sum()) / 100, 2),
+            'tax': round(float(tax.sum()) / 100, 2),
+            'months': [{
+                'period': str(label),
+                'invoice_count': int(n),
+                'revenue': round(float(r) / 100, 2),
+                'tax': round(float(t) / 100, 2),
+            } for label, n, r, t in zip(labels, counts, revenue, tax)],
+            'top_products': [{
+                'name': str(names[i]),
+                'quantity': round(float(product_quantity[i]) / 100, 2),
+                'revenue': round(float(product_revenue[i]) / 100, 2),
+            } for i in best],
+        }
+
+
+def archived_years():
+    """All archived years, newest first"""
+    root = archive_root()
+    if not root.exists():
+        return []
+    return [ArchivedYear(path) for path in sorted(root.iterdir(), reverse=True)
+            if path.suffix not in ('.tmp', '.old') and (path / 'meta.json').exists()]
+
+
+def get_year(label):
+    path = archive_root() / label
+    if '/' in label or '..' in label or not path.exists():
+        raise ArchiveError(f"No archive for financial year {label}")
+    return ArchivedYear(path)
+
+
+def search_archives(query, limit=50, branch_id=None):
+    """Search every archived year (of one branch, if given); returns ArchivedInvoice objects, newest year first"""
+    results = []
+    for year in archived_years():
+        for row in year.search(query, limit - len(results), branch_id):
+            results.append(year.invoice(row))
+        if len(results) >= limit:
+            break
+    return results
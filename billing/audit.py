@@ -0,0 +1,152 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+from .integrity import TOTAL_FIELDS, check_sequence, compare_totals, line_sums
+from .models import Branch, Invoice, InvoiceItem, Payment
+
+
+# Invoices per chunk; each chunk is one key range read by one worker
+CHUNK_SIZE = 20000
+
+
+class AuditResult:
+    """What an audit found: mismatched totals, orphaned rows and number gaps"""
+
+    def __init__(self):
+        self.invoices = 0
+        self.lines = 0
+        self.mismatches = []  # (invoice pk, problem)
+        self.orphan_items = []
+        self.orphan_payments = []
+        self.sequences = []  # integrity.Check per branch
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return not (self.mismatches or self.orphan_items or self.orphan_payments
+                    or any(not check.ok for check in self.sequences))
+
+
+def _init_worker():
+    # Spawned workers (macOS, Windows) start without Django; forked ones
+    # already have it and get fresh connections because the parent closed its own
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def audit_chunk(low, high):
+    """Audit invoices with low <= pk < high against their lines; runs in a worker.
+
+    Line sums come from one aggregate query over the range, which is read
+    straight off the invoice_id index of the line table.
+    """
+    lines = line_sums(InvoiceItem.objects.filter(invoice_id__gte=low, invoice_id__lt=high))
+    rows = list(Invoice.objects.filter(pk__gte=low, pk__lt=high).values(*TOTAL_FIELDS))
+    known = {row['pk'] for row in rows}
+
+    orphan_items = []
+    missing = [invoice_id for invoice_id in lines if invoice_id not in known]
+    if missing:
+        orphan_items = list(InvoiceItem.objects.filter(invoice_id__in=missing).values_list('pk', flat=True))
+    paid = (Payment.objects.filter(invoice_id__gte=low, invoice_id__lt=high)
+            .values_list('invoice_id', flat=True).distinct())
+    orphan_payments = []
+    missing = [invoice_id for invoice_id in paid if invoice_id not in known]
+    if missing:
+        orphan_payments = list(Payment.objects.filter(invoice_id__in=missing).values_list('pk', flat=True))
+
+    return {
+        'invoices': len(rows),
+        'lines': sum(line['n'] for line in lines.values()),
+        'mismatches': list(compare_totals(rows, lines)),
+        'orphan_items': orphan_items,
+        'orphan_payments': orphan_payments,
+    }
+
+
+def audit_sequence(branch_id, prefix):
+    """Number gaps in one branch's series; runs in a worker"""
+    check = check_sequence(Invoice.objects.filter(branch_id=branch_id), prefix)
+    check.name = f"{check.name} (branch {branch_id})"
+    return check
+
+
+def key_ranges(chunk_size=CHUNK_SIZE):
+    """[low, high) invoice id ranges covering every invoice and every line or payment pointing at one"""
+    bounds = [Invoice.objects.aggregate(low=Min('pk'), high=Max('pk')),
+              InvoiceItem.objects.aggregate(low=Min('invoice_id'), high=Max('invoice_id')),
+              Payment.objects.aggregate(low=Min('invoice_id'), high=Max('invoice_id'))]
+    lows = [b['low'] for b in bounds if b['low'] is not None]
+    if not lows:
+        return []
+    high = max(b['high'] for b in bounds if b['high'] is not None)
+    return [(low, low + chunk_size) for low in range(min(lows), high + 1, chunk_size)]
+
+
+def run_audit(chunk_size=CHUNK_SIZE, workers=None, progress=None):
+    """Audit every invoice in key-range chunks across a process pool; returns an AuditResult.
+
+    `progress(done, total, result)` is called as chunks finish.
+    """
+    started = time.perf_counter()
+    result = AuditResult()
+    ranges = key_ranges(chunk_size)
+    branches = list(Branch.objects.values_list('pk', 'invoice_prefix'))
+    workers = workers or min(os.cpu_count() or 1, 8)
+
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        sequences = [pool.submit(audit_sequence, branch_id, prefix) for branch_id, prefix in branches]
+        chunks = [pool.submit(audit_chunk, low, high) for low, high in ranges]
+        for done, future in enumerate(as_completed(chunks), 1):
+            found = future.result()
+            result.invoices += found['invoices']
+            result.lines += found['lines']
+            result.mismatches.extend(found['mismatches'])
+            result.orphan_items.extend(found['orphan_items'])
+            result.orphan_payments.extend(found['orphan_payments'])
+            if progress:
+                progress(done, len(chunks), result)
+        result.sequences = [future.result() for future in sequences]
+
+    result.mismatches.sort()
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def repair(result):
+    """Fix what can be fixed: recompute mismatched totals from their lines and delete orphaned rows.
+
+    Invoices without any line and gaps in the numbering are left for a
+    person to look at. Returns how many invoices were recomputed.
+    """
+    from .analytics import rebuild_rollups
+    from .caching import bump_version
+    from .ledger import rebuild_customer_balances
+
+    pks = {pk for pk, _ in result.mismatches}
+    invoices = Invoice.objects.filter(pk__in=pks, items__isnull=False).distinct()
+    with transaction.atomic():
+        InvoiceItem.objects.filter(pk__in=result.orphan_items).delete()
+        Payment.objects.filter(pk__in=result.orphan_payments).delete()
+        customer_ids, dates = set(), set()
+        repaired = 0
+        for invoice in invoices.iterator(chunk_size=500):
+            invoice.calculate_totals()
+            customer_ids.add(invoice.customer_id)
+            dates.add(invoice.invoice_date)
+            repaired += 1
+        if customer_ids:
+            rebuild_customer_balances(customer_ids)
+        for day in sorted(dates):
+            rebuild_rollups(day, day)
+    bump_version('invoice', 'customer')
+    return repaired
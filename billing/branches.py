@@ -0,0 +1,29 @@
+from django.conf import settings
+
+from .models import Branch
+
+
+SESSION_KEY = 'branch'
+# API clients (bulk import, scripts) pick a branch per request instead of per session
+HEADER = 'X-Branch'
+
+
+def branch_for_request(request):
+    """The branch named by the X-Branch header or the session, else DEFAULT_BRANCH"""
+    code = request.headers.get(HEADER) or request.session.get(SESSION_KEY)
+    branch = None
+    if code:
+        branch = Branch.objects.filter(code=code, is_active=True).first()
+    return branch or Branch.get_default()
+
+
+def branches(request):
+    """Template context: the active branches for the switcher (queried only if a template uses them)"""
+    return {'branches': Branch.objects.filter(is_active=True)}
+
+
+def get_branch(code=None):
+    """Branch by code for management commands; the default branch when no code is given"""
+    if not code or code == settings.DEFAULT_BRANCH:
+        return Branch.get_default()
+    return Branch.objects.get(code=code)
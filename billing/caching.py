@@ -0,0 +1,115 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.http import HttpResponse
+
+from .models import Branch, Product, ProductPrice, Customer, Invoice, InvoiceItem, Payment
+from .routers import track_replica
+
+
+VERSION_KEY = 'billing:version:{}'
+
+# Which version counters a save/delete of each model moves
+MODEL_VERSIONS = {
+    Invoice: ['invoice'],
+    InvoiceItem: ['invoice'],
+    Payment: ['invoice'],
+    Product: ['product'],
+    # Cached "price as of a day" lookups (billing.pricing)
+    ProductPrice: ['price'],
+    Customer: ['customer'],
+    # Branch names appear in every page header
+    Branch: ['invoice', 'product', 'customer'],
+}
+
+
+def _initial_version():
+    # Start from the clock so a cleared cache never hands out an old version again
+    return time.time_ns()
+
+
+def get_versions(*names):
+    """Return the current version counter for each name, creating missing ones"""
+    keys = {name: VERSION_KEY.format(name) for name in names}
+    found = cache.get_many(keys.values())
+
+    versions = {}
+    for name, key in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), None)
+            found[key] = cache.get(key)
+        versions[name] = found[key]
+    return versions
+
+
+def get_version(name):
+    return get_versions(name)[name]
+
+
+def bump_version(*names):
+    """Invalidate everything cached against these counters"""
+    for name in names:
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def bump_version_on_commit(*names):
+    """bump_version() once the current transaction commits, or straight away outside one.
+
+    Bumping earlier would let another worker cache pre-commit data under the
+    new version, and a rollback would invalidate for nothing.
+    """
+    transaction.on_commit(lambda: bump_version(*names))
+
+
+def cache_view(*version_names, timeout=None):
+    """Cache a GET view's response until one of the named model versions moves.
+
+    The key is the branch, the full request path and the current counters,
+    so a save of any watched model makes the old entry unreachable instead
+    of stale, and branches never see each other's pages.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            versions = get_versions(*version_names)
+            stamp = ':'.join(str(versions[name]) for name in version_names)
+            branch = getattr(request, 'branch', None)
+            key = f"billing:view:{view.__name__}:{branch.pk if branch else '-'}:{stamp}:{request.get_full_path()}"
+
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            with track_replica() as used_replica:
+                response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies and not getattr(response, 'streaming', False):
+                seconds = settings.CACHE_VIEW_TIMEOUT if timeout is None else timeout
+                if used_replica():
+                    # The replica may not have the write that moved the version
+                    # yet, so don't pin its answer in the cache for long
+                    seconds = min(seconds, settings.REPLICA_MAX_LAG)
+                cache.set(key, (response.content, response['Content-Type']), seconds)
+            return response
+        return wrapper
+    return decorator
+
+
+def _model_changed(sender, **kwargs):
+    bump_version_on_commit(*MODEL_VERSIONS[sender])
+
+
+for _model in MODEL_VERSIONS:
+    post_save.connect(_model_changed, sender=_model, dispatch_uid=f'billing_version_save_{_model.__name__}')
+    post_delete.connect(_model_changed, sender=_model, dispatch_uid=f'billing_version_delete_{_model.__name__}')
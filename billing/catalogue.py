@@ -0,0 +1,282 @@
+import csv
+import tempfile
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_version
+from .importers import ImportResult, RecordError, _to_decimal
+from .models import Branch, Product, ProductPrice
+
+
+# Columns of a catalogue file; `stock` is exported for reference but never imported
+COLUMNS = ['sku', 'name', 'category', 'hsn_code', 'unit', 'price_per_unit', 'tax_percentage',
+           'track_stock', 'reorder_level', 'is_active']
+EXPORT_COLUMNS = COLUMNS + ['stock']
+
+TEXT_LIMITS = {'sku': 50, 'name': 200, 'category': 100, 'hsn_code': 8}
+TRUE = {'1', 'true', 'yes', 'y'}
+FALSE = {'0', 'false', 'no', 'n'}
+UNITS = {value for value, _ in Product.UNIT_CHOICES}
+TWO_PLACES = Decimal('0.01')
+
+
+class CatalogueError(Exception):
+    """Raised when a catalogue file can't be read at all"""
+
+
+def parse_csv(stream):
+    """Yield (line_no, row) pairs from a CSV catalogue with a header row"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def parse_xlsx(file):
+    """Yield (row_no, row) pairs from the first sheet of an XLSX catalogue, read row by row"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise CatalogueError('XLSX files need openpyxl (pip install openpyxl)')
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell or '').strip().lower() for cell in next(rows, [])]
+        for row_no, values in enumerate(rows, 2):
+            if any(value not in (None, '') for value in values):
+                yield row_no, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _bool(value, field):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE:
+        return True
+    if text in FALSE:
+        return False
+    raise RecordError(f"Invalid {field}: {value!r} (use yes/no)")
+
+
+def clean_row(row):
+    """The product fields given in a row; blank cells are left out, so they leave existing values alone"""
+    fields = {}
+    for column in COLUMNS:
+        value = row.get(column)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if column in TEXT_LIMITS:
+            value = str(value).strip()
+            if len(value) > TEXT_LIMITS[column]:
+                raise RecordError(f"{column} is longer than {TEXT_LIMITS[column]} characters")
+        elif column == 'unit':
+            value = str(value).strip().upper()
+            if value not in UNITS:
+                raise RecordError(f"Unknown unit {value!r}; use one of {', '.join(sorted(UNITS))}")
+        elif column in ('track_stock', 'is_active'):
+            value = _bool(value, column)
+        else:
+            value = _to_decimal(value, column).quantize(TWO_PLACES)
+            if column == 'price_per_unit' and value <= 0:
+                raise RecordError("price_per_unit must be positive")
+            if column == 'tax_percentage' and not 0 <= value <= 100:
+                raise RecordError("tax_percentage must be between 0 and 100")
+            if column == 'reorder_level' and value < 0:
+                raise RecordError("reorder_level can't be negative")
+        fields[column] = value
+    if 'sku' not in fields and 'name' not in fields:
+        raise RecordError("Each row needs a sku or a name")
+    return fields
+
+
+class ProductImportResult(ImportResult):
+    """ImportResult that also counts updated and unchanged products"""
+
+    def __init__(self):
+        super().__init__()
+        self.updated = 0
+        self.unchanged = 0
+
+    @property
+    def rate(self):
+        """Rows handled per second"""
+        rows = self.created + self.updated + self.unchanged
+        return rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self, max_errors=100):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'errors': self.errors[:max_errors],
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rate, 1),
+        }
+
+
+class ProductImporter:
+    """Upsert a catalogue into one branch, matching rows to products by SKU, or by name when a row has none.
+
+    Only the keys of the branch's products are held in memory; rows are read
+    as a stream and each batch is one lookup, one bulk_create and one
+    bulk_update. Price changes go into the price history from today. Caches
+    are invalidated once, at the end.
+    """
+
+    def __init__(self, batch_size=1000, branch=None, dry_run=False, progress=None):
+        self.batch_size = batch_size
+        self.branch = branch or Branch.get_default()
+        self.dry_run = dry_run
+        self.progress = progress
+
+    def run(self, rows):
+        """Import an iterable of (row_no, row) pairs and return a ProductImportResult"""
+        result = ProductImportResult()
+        self.by_sku, self.by_name = {}, defaultdict(list)
+        # Keys seen so far in the file, so a repeated row fails instead of overwriting the first
+        self.seen = set()
+        for pk, sku, name in Product.objects.filter(branch=self.branch).values_list('pk', 'sku', 'name').iterator():
+            self._remember(pk, sku, name)
+
+        with transaction.atomic():
+            batch = []
+            for row_no, row in rows:
+                batch.append((row_no, row))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch, result)
+                    batch = []
+            if batch:
+                self._import_batch(batch, result)
+            if self.dry_run:
+                # Everything was diffed and written, then is thrown away
+                transaction.set_rollback(True)
+
+        if not self.dry_run and (result.created or result.updated):
+            # Bulk writes send no save signals, so invalidate cached pages and prices once
+            bump_version('product', 'price')
+        return result.finish()
+
+    def _remember(self, pk, sku, name):
+        if sku:
+            self.by_sku[sku] = pk
+        self.by_name[name].append(pk)
+
+    def _match(self, fields):
+        if fields.get('sku'):
+            return self.by_sku.get(fields['sku'])
+        matches = self.by_name.get(fields['name'], [])
+        if len(matches) > 1:
+            raise RecordError(f"{len(matches)} products are named {fields['name']!r}; add a sku to tell them apart")
+        return matches[0] if matches else None
+
+    def _import_batch(self, batch, result):
+        rows = []
+        for row_no, row in batch:
+            try:
+                fields = clean_row(row)
+                pk = self._match(fields)
+                key = fields.get('sku') or ('name', fields['name'])
+                if key in self.seen:
+                    raise RecordError("Duplicate of an earlier row in the file")
+                if pk is None and ('name' not in fields or 'price_per_unit' not in fields):
+                    raise RecordError("New products need a name and a price_per_unit")
+            except RecordError as e:
+                result.add_error(row_no, e)
+                continue
+            self.seen.add(key)
+            rows.append((pk, fields))
+
+        existing = Product.objects.in_bulk([pk for pk, _ in rows if pk is not None])
+        to_create, to_update, changed_fields, priced = [], [], set(), []
+        for pk, fields in rows:
+            if pk is None:
+                product = Product(branch=self.branch, **fields)
+                to_create.append(product)
+                priced.append(product)
+                continue
+            product = existing[pk]
+            changed = {field for field, value in fields.items() if getattr(product, field) != value}
+            if not changed:
+                result.unchanged += 1
+                continue
+            for field in changed:
+                setattr(product, field, fields[field])
+            to_update.append(product)
+            changed_fields |= changed
+            if changed & {'price_per_unit', 'tax_percentage'}:
+                priced.append(product)
+
+        Product.objects.bulk_create(to_create, batch_size=500)
+        if to_update:
+            product_updated = timezone.now()
+            for product in to_update:
+                product.updated_at = product_updated
+            Product.objects.bulk_update(to_update, sorted(changed_fields | {'updated_at'}), batch_size=500)
+        if priced:
+            today = timezone.localdate()
+            ProductPrice.objects.bulk_create(
+                [ProductPrice(product=product, effective_from=today, price_per_unit=product.price_per_unit,
+                              tax_percentage=product.tax_percentage) for product in priced],
+                batch_size=500, update_conflicts=True, unique_fields=['product', 'effective_from'],
+                update_fields=['price_per_unit', 'tax_percentage'],
+            )
+
+        for product in to_create:
+            self._remember(product.pk, product.sku, product.name)
+        for product in to_update:
+            # A renamed product is found under its new name from the next batch on
+            self._remember(product.pk, product.sku, product.name)
+        result.created += len(to_create)
+        result.updated += len(to_update)
+        if self.progress:
+            self.progress(result)
+
+
+def export_rows(branch):
+    """Header plus one row per product of the branch, read in chunks"""
+    yield EXPORT_COLUMNS
+    products = Product.objects.filter(branch=branch).order_by('name', 'pk').values_list(*EXPORT_COLUMNS)
+    for row in products.iterator(chunk_size=2000):
+        yield ['yes' if value is True else 'no' if value is False else value for value in row]
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def export_csv_lines(branch):
+    """The branch's catalogue as CSV text, one line at a time"""
+    writer = csv.writer(_Echo())
+    for row in export_rows(branch):
+        yield writer.writerow(row)
+
+
+def export_xlsx(branch, target=None):
+    """Write the branch's catalogue as XLSX to `target` (default: a temporary file); returns the target.
+
+    The workbook is write-only, so rows go to disk as they are added instead
+    of being held in memory.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise CatalogueError('XLSX files need openpyxl (pip install openpyxl)')
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Products')
+    for row in export_rows(branch):
+        sheet.append([float(value) if isinstance(value, Decimal) else value for value in row])
+    target = target or tempfile.TemporaryFile(suffix='.xlsx')
+    workbook.save(target)
+    if hasattr(target, 'seek'):
+        target.seek(0)
+    return target
@@ -0,0 +1,187 @@
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models.signals import post_save, post_delete
+
+from .caching import get_version
+from .models import Customer, default_branch_id
+
+
+CUSTOMER_FIELDS = [
+    'name', 'email', 'phone', 'address', 'city', 'state', 'pincode',
+    'pan_number', 'gstin', 'place_of_supply',
+]
+
+# Placeholders for customers created at checkout with only a name and contact
+CUSTOMER_DEFAULTS = {
+    'phone': '',
+    'address': '-',
+    'city': '-',
+    'state': 'India',
+    'pincode': '000000',
+    'pan_number': '',
+    'gstin': '',
+    'place_of_supply': 'India',
+}
+
+NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_email(email):
+    """Lowercase and trim an email address"""
+    return (email or '').strip().lower()
+
+
+def normalize_phone(phone):
+    """Reduce a phone number to its digits, dropping the +91 / leading 0 prefix"""
+    digits = NON_DIGITS.sub('', phone or '').lstrip('0')
+    if len(digits) == 12 and digits.startswith('91'):
+        digits = digits[2:]
+    return digits
+
+
+def customer_identity_key(email, phone):
+    """Return the unique identity key for a customer: email if known, else phone"""
+    email = normalize_email(email)
+    if email:
+        return f"e:{email}"
+    phone = normalize_phone(phone)
+    if phone:
+        return f"p:{phone}"
+    return None
+
+
+class CustomerCache:
+    """Small per-worker LRU of recently billed customers, keyed by (branch id, identity key).
+
+    Entries are only good for the `customer` cache version they were read
+    under. Any customer save or delete, in any worker sharing the cache
+    backend, moves that version and empties the LRU on its next use.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        # Caller holds the lock
+        if version != self._version:
+            self._data.clear()
+            self._version = version
+
+    def get(self, key, version=None):
+        with self._lock:
+            self._check_version(version)
+            customer = self._data.get(key)
+            if customer is not None:
+                self._data.move_to_end(key)
+            return customer
+
+    def put(self, key, customer, version=None):
+        if not self.maxsize:
+            return
+        with self._lock:
+            if version != self._version:
+                # Read under an older version, so it may already be stale
+                return
+            self._data[key] = customer
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+customer_cache = CustomerCache(getattr(settings, 'CUSTOMER_CACHE_SIZE', 256))
+
+
+def _new_customer(key, data, branch_id):
+    fields = {k: v for k, v in data.items() if k in CUSTOMER_FIELDS and v}
+    customer = Customer(branch_id=branch_id, **{**CUSTOMER_DEFAULTS, **fields})
+    customer.identity_key = key
+    return customer
+
+
+def resolve_customer(data, branch=None):
+    """Return the branch's customer for checkout data, creating it on first purchase.
+
+    Lookups go through the worker's LRU, then the unique (branch, identity_key)
+    index. Concurrent first purchases by the same customer resolve to one row.
+    """
+    key = customer_identity_key(data.get('email'), data.get('phone'))
+    if key is None:
+        raise ValueError("Customer email or phone is required")
+    branch_id = branch.pk if branch is not None else default_branch_id()
+
+    version = get_version('customer')
+    customer = customer_cache.get((branch_id, key), version)
+    if customer is not None:
+        return customer
+
+    customers = Customer.objects.filter(branch_id=branch_id)
+    customer = customers.filter(identity_key=key).first()
+    if customer is None:
+        try:
+            with transaction.atomic():
+                customer = _new_customer(key, data, branch_id)
+                customer.save()
+        except IntegrityError:
+            # Another request created the same customer first
+            customer = customers.get(identity_key=key)
+
+    # Only once committed: a checkout that rolls back must not leave a customer
+    # in the cache that was never saved
+    transaction.on_commit(lambda: customer_cache.put((branch_id, key), customer, version))
+    return customer
+
+
+def upsert_customers(records, branch=None):
+    """Resolve many customer dicts in one branch at once, bulk creating the missing ones.
+
+    Returns a dict mapping identity key to Customer. Records without an email
+    or phone are skipped.
+    """
+    branch_id = branch.pk if branch is not None else default_branch_id()
+    wanted = {}
+    for data in records:
+        key = customer_identity_key(data.get('email'), data.get('phone'))
+        if key is not None:
+            wanted.setdefault(key, data)
+
+    def lookup(keys):
+        # identity_key is only unique per branch, so in_bulk() can't key on it
+        return {c.identity_key: c for c in Customer.objects.filter(branch_id=branch_id, identity_key__in=keys)}
+
+    found = lookup(list(wanted))
+
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        Customer.objects.bulk_create(
+            [_new_customer(key, wanted[key], branch_id) for key in missing],
+            ignore_conflicts=True,
+        )
+        found.update(lookup(missing))
+
+    return found
+
+
+def _evict_customer(sender, instance, **kwargs):
+    customer_cache.discard((instance.branch_id, instance.identity_key))
+
+
+post_save.connect(_evict_customer, sender=Customer, dispatch_uid='billing_customer_cache_save')
+post_delete.connect(_evict_customer, sender=Customer, dispatch_uid='billing_customer_cache_delete')
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import analytics
+from .caching import bump_version_on_commit
+from .ledger import adjust_customer_balance
+from .models import Invoice, InvoiceItem, Product
+from .pricing import prices_on
+from .stock import take_stock
+
+
+TWO_PLACES = Decimal('0.01')
+
+
+class EditError(Exception):
+    """Raised when an invoice edit can't be applied; nothing of it is saved"""
+
+
+class StaleInvoiceError(EditError):
+    """Raised when the invoice changed since the version an edit was made against"""
+
+
+def _line_totals(item):
+    """(base, tax, amount) of a line, rounded to paise the way the database stores them"""
+    return (item.get_base_amount().quantize(TWO_PLACES), item.tax_amount.quantize(TWO_PLACES),
+            item.amount.quantize(TWO_PLACES))
+
+
+def edit_invoice(invoice, version, add=(), update=(), remove=(), discount=None):
+    """Add, change and remove lines of an invoice, moving its totals by the difference.
+
+    `add` is (product_id, quantity) pairs, `update` is (item_id, quantity)
+    pairs and `remove` is item ids. Only the touched lines are read; the
+    invoice, customer balance, stock and analytics buckets each get one
+    UPDATE with the change instead of being recomputed. The edit applies only
+    if the invoice is still at `version`, otherwise StaleInvoiceError.
+    Returns the refreshed invoice.
+    """
+    add = [(product_id, Decimal(quantity)) for product_id, quantity in add]
+    update = {item_id: Decimal(quantity) for item_id, quantity in update}
+    remove = set(remove)
+    if remove & update.keys():
+        raise EditError("A line can't be both updated and removed")
+    if any(quantity <= 0 for quantity in [q for _, q in add] + list(update.values())):
+        raise EditError("Quantities must be positive; remove the line instead")
+    if discount is not None and discount < 0:
+        raise EditError("Discount can't be negative")
+
+    with transaction.atomic():
+        # Claim the version first: this write-locks the invoice, and an edit
+        # made against an older version changes nothing
+        if not Invoice.objects.filter(pk=invoice.pk, version=version).update(version=F('version') + 1):
+            raise StaleInvoiceError(f"Invoice #{invoice.invoice_number} was changed by someone else; "
+                                    f"reload it and try again")
+        invoice.refresh_from_db()
+
+        items = invoice.items.in_bulk(update.keys() | remove)
+        unknown = (update.keys() | remove) - items.keys()
+        if unknown:
+            raise EditError(f"Lines {sorted(unknown)} are not on Invoice #{invoice.invoice_number}")
+        added_ids = {pk for pk, _ in add}
+        # New lines may only use active products of the invoice's branch;
+        # lines already on the invoice keep theirs even if since deactivated
+        added = Product.objects.filter(branch=invoice.branch_id, is_active=True).in_bulk(added_ids)
+        missing = added_ids - added.keys()
+        if missing:
+            raise EditError(f"Unknown or inactive product(s): {sorted(missing)}")
+        products = Product.objects.filter(branch=invoice.branch_id).in_bulk(
+            {item.product_id for item in items.values() if item.product_id} - added.keys())
+        products.update(added)
+
+        subtotal = tax = Decimal('0')
+        # product id -> [quantity, amount] change, for stock and the analytics buckets
+        sold = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+
+        for pk in remove:
+            item = items[pk]
+            base, line_tax, amount = _line_totals(item)
+            subtotal -= base
+            tax -= line_tax
+            if item.product_id:
+                sold[item.product_id][0] -= item.quantity
+                sold[item.product_id][1] -= amount
+        InvoiceItem.objects.filter(pk__in=remove).delete()
+
+        for pk, quantity in update.items():
+            item = items[pk]
+            old_base, old_tax, old_amount = _line_totals(item)
+            old_quantity = item.quantity
+            item.quantity = quantity
+            # Keeps the line's stored price; only the quantity changes
+            item.save(update_fields=['quantity', 'tax_amount', 'amount'])
+            base, line_tax, amount = _line_totals(item)
+            subtotal += base - old_base
+            tax += line_tax - old_tax
+            if item.product_id:
+                sold[item.product_id][0] += quantity - old_quantity
+                sold[item.product_id][1] += amount - old_amount
+
+        prices = prices_on([pk for pk, _ in add], invoice.invoice_date)
+        for product_id, quantity in add:
+            price_per_unit, tax_percentage = prices[product_id]
+            item = InvoiceItem.objects.create(invoice=invoice, product=products[product_id], quantity=quantity,
+                                              price_per_unit=price_per_unit, tax_percentage=tax_percentage)
+            base, line_tax, amount = _line_totals(item)
+            subtotal += base
+            tax += line_tax
+            sold[product_id][0] += quantity
+            sold[product_id][1] += amount
+
+        if not invoice.items.exists():
+            raise EditError("An invoice needs at least one line")
+
+        take_stock(invoice, [(products[pk], quantity) for pk, (quantity, _) in sold.items() if pk in products])
+
+        discount_change = discount - invoice.discount if discount is not None else Decimal('0')
+        change = subtotal + tax - discount_change
+        # Payments move received/due with F() too, so this can't lose one
+        updated = Invoice.objects.filter(pk=invoice.pk, received_amount__lte=F('grand_total') + change).update(
+            subtotal=F('subtotal') + subtotal,
+            total_tax=F('total_tax') + tax,
+            discount=F('discount') + discount_change,
+            grand_total=F('grand_total') + change,
+            due_balance=F('due_balance') + change,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            raise EditError(f"The new total of Invoice #{invoice.invoice_number} would be less than the "
+                            f"Rs. {invoice.received_amount} already received")
+
+        adjust_customer_balance(invoice.customer_id, billed=change)
+        analytics.record_edit(invoice, subtotal, tax, discount_change,
+                              {pk: tuple(deltas) for pk, deltas in sold.items()})
+
+    # update() sends no save signals, so invalidate cached invoice pages once the edit commits
+    bump_version_on_commit('invoice')
+    invoice.refresh_from_db()
+    return invoice
@@ -0,0 +1,212 @@
+import csv
+import io
+import time
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+
+from .models import InvoiceItem
+
+
+LINE_FIELDS = [
+    'tax_percentage', 'price_per_unit', 'quantity', 'tax_amount',
+    'hsn_code', 'product_unit',
+    'invoice__customer__place_of_supply', 'invoice__customer__gstin',
+]
+
+
+class Factorizer:
+    """Assigns a dense integer code to each distinct string as it is first seen"""
+
+    def __init__(self):
+        self.codes = {}
+        self.labels = []
+
+    def __call__(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.labels)
+            self.labels.append(value)
+        return code
+
+
+def _paise(value):
+    return int(round(value * 100))
+
+
+def month_range(year, month):
+    start = date(year, month, 1)
+    end = date(year + (month == 12), month % 12 + 1, 1)
+    return start, end
+
+
+def load_lines(start, end, chunk_size=50000, branch=None):
+    """Stream invoice lines in [start, end) (of one branch, if given) into NumPy columns.
+
+    Money is kept in integer paise and strings are factorized into integer
+    codes, so the arrays stay compact even for millions of lines.
+    """
+    rates, taxable, tax = [], [], []
+    hsn_codes, states, b2b = [], [], []
+    rate_f, hsn_f, state_f = Factorizer(), Factorizer(), Factorizer()
+
+    items = InvoiceItem.objects.filter(invoice__invoice_date__gte=start, invoice__invoice_date__lt=end)
+    if branch is not None:
+        items = items.filter(invoice__branch=branch)
+    rows = (items
+            .values_list(*LINE_FIELDS)
+            .iterator(chunk_size=chunk_size))
+    for rate, price, quantity, tax_amount, hsn, unit, place, gstin in rows:
+        rates.append(rate_f(str(rate)))
+        taxable.append(_paise(price * quantity))
+        tax.append(_paise(tax_amount))
+        hsn_codes.append(hsn_f((hsn or '', unit or '')))
+        states.append(state_f((place or '').strip().lower()))
+        b2b.append(bool(gstin))
+
+    return {
+        'rate': np.array(rates, dtype=np.int32),
+        'taxable': np.array(taxable, dtype=np.int64),
+        'tax': np.array(tax, dtype=np.int64),
+        'hsn': np.array(hsn_codes, dtype=np.int32),
+        'state': np.array(states, dtype=np.int32),
+        'b2b': np.array(b2b, dtype=bool),
+        'rate_labels': rate_f.labels,
+        'hsn_labels': hsn_f.labels,
+        'state_labels': state_f.labels,
+    }
+
+
+def _group(keys, n_groups, **columns):
+    """Sum each column per key with bincount; returns dict of int64 arrays"""
+    return {name: np.bincount(keys, weights=col, minlength=n_groups).astype(np.int64)
+            for name, col in columns.items()}
+
+
+def summarize(lines, company_state=None):
+    """Per-rate, per-state and per-HSN tax summaries with a CGST/SGST/IGST split.
+
+    Supplies to the company's own state are intra-state (tax split equally
+    into CGST and SGST); everything else is inter-state IGST.
+    """
+    company_state = (company_state or settings.COMPANY_STATE).strip().lower()
+    state_labels = lines['state_labels']
+    home = state_labels.index(company_state) if company_state in state_labels else -1
+
+    intra = lines['state'] == home
+    tax = lines['tax']
+    cgst = np.where(intra, tax // 2, 0)
+    sgst = np.where(intra, tax - tax // 2, 0)
+    igst = np.where(intra, 0, tax)
+    columns = {'taxable': lines['taxable'], 'cgst': cgst, 'sgst': sgst, 'igst': igst}
+
+    def rupees(paise):
+        return round(int(paise) / 100, 2)
+
+    def rows(keys, labels, describe, extra=None):
+        sums = _group(keys, len(labels), **columns, **(extra or {}))
+        counts = np.bincount(keys, minlength=len(labels))
+        result = []
+        for code in np.flatnonzero(counts):
+            row = describe(labels[code])
+            row['lines'] = int(counts[code])
+            row.update({name: rupees(col[code]) for name, col in sums.items()})
+            row['total_tax'] = round(row['cgst'] + row['sgst'] + row['igst'], 2)
+            result.append(row)
+        return result
+
+    by_rate = rows(lines['rate'], lines['rate_labels'], lambda rate: {'rate': float(rate)},
+                   extra={'b2b_taxable': np.where(lines['b2b'], lines['taxable'], 0),
+                          'b2c_taxable': np.where(lines['b2b'], 0, lines['taxable'])})
+    by_rate.sort(key=lambda row: row['rate'])
+
+    by_state = rows(lines['state'], state_labels,
+                    lambda state: {'place_of_supply': state.title(), 'intra_state': state == company_state})
+    by_state.sort(key=lambda row: row['place_of_supply'])
+
+    # HSN summary is per (HSN, unit, rate), like the GSTR-1 HSN table
+    n_rates = max(len(lines['rate_labels']), 1)
+    hsn_rate = lines['hsn'].astype(np.int64) * n_rates + lines['rate']
+    combos, hsn_keys = np.unique(hsn_rate, return_inverse=True)
+    hsn_labels = [(lines['hsn_labels'][c // n_rates], lines['rate_labels'][c % n_rates]) for c in combos]
+    by_hsn = rows(hsn_keys.ravel(), hsn_labels,
+                  lambda label: {'hsn_code': label[0][0], 'unit': label[0][1], 'rate': float(label[1])})
+    by_hsn.sort(key=lambda row: (row['hsn_code'], row['rate']))
+
+    totals = {name: rupees(col.sum()) for name, col in columns.items()}
+    totals['lines'] = int(len(tax))
+    totals['total_tax'] = round(totals['cgst'] + totals['sgst'] + totals['igst'], 2)
+
+    return {
+        'company_state': company_state.title(),
+        'totals': totals,
+        'by_rate': by_rate,
+        'by_state': by_state,
+        'by_hsn': by_hsn,
+    }
+
+
+def gst_report(year, month, company_state=None, branch=None):
+    """GST summary for one calendar month, for one branch (its GSTIN and state) or the whole company"""
+    start, end = month_range(year, month)
+    if branch is not None:
+        company_state = company_state or branch.state
+    report = summarize(load_lines(start, end, branch=branch), company_state)
+    report['period'] = f"{year}-{month:02d}"
+    if branch is not None:
+        report['branch'] = branch.code
+        report['gstin'] = branch.gstin
+    return report
+
+
+def report_to_csv(report):
+    """Render a report as CSV, one section per summary table"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for section in ['by_rate', 'by_state', 'by_hsn']:
+        rows = report[section]
+        writer.writerow([f"# {section.replace('_', ' ')} ({report['period']})"])
+        if rows:
+            writer.writerow(rows[0].keys())
+            for row in rows:
+                writer.writerow(row.values())
+        writer.writerow([])
+    return out.getvalue()
+
+
+def synthetic_lines(n, seed=0):
+    """Random line columns with a realistic spread of rates, HSN codes and states"""
+    rng = np.random.default_rng(seed)
+    rate_labels = ['0.00', '5.00', '12.00', '18.00', '28.00']
+    state_labels = [s.lower() for s in ['Maharashtra', 'Gujarat', 'Karnataka', 'Rajasthan', 'Delhi',
+                                        'Tamil Nadu', 'Kerala', 'Goa']]
+    hsn_labels = [(f"{code:04d}", 'KG') for code in rng.choice(9999, size=300, replace=False)]
+
+    rate = rng.integers(0, len(rate_labels), n, dtype=np.int32)
+    taxable = rng.integers(100, 500000, n, dtype=np.int64)
+    rate_values = np.array([float(r) for r in rate_labels])
+    tax = np.rint(taxable * rate_values[rate] / 100).astype(np.int64)
+    return {
+        'rate': rate,
+        'taxable': taxable,
+        'tax': tax,
+        'hsn': rng.integers(0, len(hsn_labels), n, dtype=np.int32),
+        'state': rng.integers(0, len(state_labels), n, dtype=np.int32),
+        'b2b': rng.random(n) < 0.3,
+        'rate_labels': rate_labels,
+        'hsn_labels': hsn_labels,
+        'state_labels': state_labels,
+    }
+
+
+def benchmark(n=5_000_000, repeat=3):
+    """Time `summarize` over `n` synthetic lines; returns the best run in seconds"""
+    lines = synthetic_lines(n)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        summarize(lines, 'Maharashtra')
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
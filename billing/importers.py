@@ -0,0 +1,336 @@
+import csv
+import json
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import Branch, Product, Invoice, InvoiceItem, InvoiceSequence
+from . import analytics
+from .caching import bump_version
+from .customers import CUSTOMER_FIELDS, customer_identity_key, upsert_customers
+from .ledger import record_invoices
+from .pricing import prices_on
+from .search import index_invoices
+from .stock import take_stock
+
+
+TWO_PLACES = Decimal('0.01')
+
+
+class RecordError(Exception):
+    """Raised for a single bad record; the rest of the batch carries on"""
+
+
+class ImportResult:
+    """Counters and per-record errors collected during an import run"""
+
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.invoice_numbers = []
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, record_no, error):
+        self.failed += 1
+        self.errors.append({'record': record_no, 'error': str(error)})
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rate(self):
+        """Imported invoices per second"""
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self, max_errors=100):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors[:max_errors],
+            'elapsed_seconds': round(self.elapsed, 3),
+            'invoices_per_second': round(self.rate, 1),
+        }
+
+
+def parse_ndjson(stream):
+    """Yield (record_no, record) pairs from an NDJSON stream, one invoice per line"""
+    for record_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield record_no, json.loads(line)
+        except ValueError as e:
+            yield record_no, RecordError(f"Invalid JSON: {e}")
+
+
+def parse_csv(stream):
+    """Yield (record_no, record) pairs from a CSV stream with one row per invoice line.
+
+    Consecutive rows sharing a `reference` form one invoice. Customer columns are
+    prefixed with `customer_` and are read from the first row of each invoice.
+    """
+    reader = csv.DictReader(stream)
+    record_no = 0
+    current_ref = None
+    record = None
+
+    for row in reader:
+        ref = (row.get('reference') or '').strip()
+        if record is None or not ref or ref != current_ref:
+            if record is not None:
+                yield record_no, record
+            record_no += 1
+            current_ref = ref
+            record = {
+                'reference': ref,
+                'invoice_date': row.get('invoice_date') or None,
+                'customer': {
+                    field: row[f'customer_{field}']
+                    for field in CUSTOMER_FIELDS
+                    if row.get(f'customer_{field}')
+                },
+                'discount': row.get('discount') or 0,
+                'received_amount': row.get('received_amount') or 0,
+                'notes': row.get('notes') or '',
+                'terms_conditions': row.get('terms_conditions') or '',
+                'items': [],
+            }
+        record['items'].append({
+            'product_id': row.get('product_id'),
+            'quantity': row.get('quantity'),
+        })
+
+    if record is not None:
+        yield record_no, record
+
+
+def _to_decimal(value, field):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        raise RecordError(f"Invalid {field}: {value!r}")
+
+
+def _validate(record):
+    """Normalise one raw record, raising RecordError if it cannot be imported"""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise RecordError("Record must be a JSON object")
+
+    customer = record.get('customer') or {}
+    if not customer.get('name'):
+        raise RecordError("Customer name is required")
+    if customer_identity_key(customer.get('email'), customer.get('phone')) is None:
+        raise RecordError("Customer email or phone is required")
+
+    items = []
+    for item in record.get('items') or []:
+        try:
+            product_id = int(item['product_id'])
+        except (KeyError, TypeError, ValueError):
+            raise RecordError(f"Invalid product_id: {item.get('product_id')!r}")
+        quantity = _to_decimal(item.get('quantity'), 'quantity')
+        if quantity <= 0:
+            raise RecordError(f"Quantity must be positive for product {product_id}")
+        items.append((product_id, quantity))
+    if not items:
+        raise RecordError("Invoice has no items")
+
+    invoice_date = record.get('invoice_date')
+    if invoice_date:
+        try:
+            invoice_date = date.fromisoformat(str(invoice_date))
+        except ValueError:
+            raise RecordError(f"Invalid invoice_date: {invoice_date!r}")
+    else:
+        invoice_date = date.today()
+
+    return {
+        'customer': customer,
+        'items': items,
+        'invoice_date': invoice_date,
+        'discount': _to_decimal(record.get('discount', 0), 'discount'),
+        'received_amount': _to_decimal(record.get('received_amount', 0), 'received_amount'),
+        'notes': record.get('notes', ''),
+        'terms_conditions': record.get('terms_conditions', ''),
+    }
+
+
+class InvoiceImporter:
+    """Bulk invoice import into one branch: batched lookups, block-allocated numbers, chunked inserts"""
+
+    def __init__(self, batch_size=500, prefix=None, progress=None, branch=None):
+        self.batch_size = batch_size
+        self.branch = branch or Branch.get_default()
+        self.prefix = prefix or self.branch.invoice_prefix
+        self.progress = progress
+
+    def run(self, records):
+        """Import an iterable of (record_no, record) pairs and return an ImportResult.
+
+        The result is also kept in `self.result`, so a caller whose stream
+        fails part way can still report what was imported.
+        """
+        result = self.result = ImportResult()
+        batch = []
+        for record_no, record in records:
+            batch.append((record_no, record))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch, result)
+                batch = []
+        if batch:
+            self._import_batch(batch, result)
+        return result.finish()
+
+    def _resolve_customers(self, valid):
+        """Map each record's customer to a Customer row, creating the missing ones in bulk"""
+        customers = upsert_customers((r['customer'] for _, r in valid), self.branch)
+
+        def lookup(data):
+            return customers[customer_identity_key(data.get('email'), data.get('phone'))]
+
+        return lookup
+
+    def _import_batch(self, batch, result):
+        valid = []
+        for record_no, record in batch:
+            try:
+                valid.append((record_no, _validate(record)))
+            except RecordError as e:
+                result.add_error(record_no, e)
+
+        if not valid:
+            return
+
+        product_ids = {pid for _, r in valid for pid, _ in r['items']}
+        products = Product.objects.filter(branch=self.branch, is_active=True).in_bulk(product_ids)
+
+        ready = []
+        for record_no, r in valid:
+            missing = [pid for pid, _ in r['items'] if pid not in products]
+            if missing:
+                result.add_error(record_no, f"Unknown or inactive product(s): {missing}")
+            else:
+                ready.append((record_no, r))
+
+        if not ready:
+            return
+
+        # Historical invoices are priced as of their own date: one lookup per day in the batch
+        by_day = {}
+        for _, r in ready:
+            by_day.setdefault(r['invoice_date'], set()).update(pid for pid, _ in r['items'])
+        prices = {day: prices_on(ids, day) for day, ids in by_day.items()}
+
+        # Numbers, customers, invoices and stock commit together or not at
+        # all, so a failed record leaves no gap in the series and no customer
+        try:
+            with transaction.atomic():
+                invoices = self._build_invoices(ready, products, prices)
+                self._insert(invoices)
+        except Exception:
+            # Fall back to one transaction per invoice to isolate the bad records
+            for record_no, r in ready:
+                try:
+                    with transaction.atomic():
+                        invoices = self._build_invoices([(record_no, r)], products, prices)
+                        self._insert(invoices)
+                except Exception as e:
+                    result.add_error(record_no, e)
+                    continue
+                result.created += 1
+                result.invoice_numbers.append(invoices[0][1].invoice_number)
+        else:
+            result.created += len(invoices)
+            result.invoice_numbers.extend(invoice.invoice_number for _, invoice, _ in invoices)
+
+        # bulk_create sends no save signals, so invalidate cached pages here
+        bump_version('invoice', 'customer')
+
+        if self.progress:
+            self.progress(result)
+
+    def _build_invoices(self, ready, products, prices):
+        """Allocate numbers and customers and build (record_no, invoice, lines); must run inside a transaction"""
+        # The sequence UPDATE comes first so concurrent writers queue on it
+        numbers = InvoiceSequence.allocate(self.prefix, len(ready), self.branch)
+        customer_for = self._resolve_customers(ready)
+        invoices = []
+        for (record_no, r), number in zip(ready, numbers):
+            invoice, lines = self._build_invoice(r, number, customer_for(r['customer']), products,
+                                                 prices[r['invoice_date']])
+            invoices.append((record_no, invoice, lines))
+        return invoices
+
+    def _build_invoice(self, r, number, customer, products, prices):
+        """Build unsaved Invoice and InvoiceItem objects with totals computed in Python"""
+        invoice = Invoice(
+            branch=self.branch,
+            invoice_number=number,
+            customer=customer,
+            invoice_date=r['invoice_date'],
+            discount=r['discount'],
+            received_amount=r['received_amount'],
+            notes=r['notes'],
+            terms_conditions=r['terms_conditions'],
+        )
+
+        lines = []
+        subtotal = Decimal('0')
+        total_tax = Decimal('0')
+        for product_id, quantity in r['items']:
+            product = products[product_id]
+            price_per_unit, tax_percentage = prices[product_id]
+            item = InvoiceItem(
+                product=product,
+                quantity=quantity,
+                price_per_unit=price_per_unit,
+                tax_percentage=tax_percentage,
+            )
+            item.snapshot_product(product)
+            item.calculate_amounts()
+            # Round like the database would, so totals match calculate_totals()
+            item.tax_amount = item.tax_amount.quantize(TWO_PLACES)
+            item.amount = item.amount.quantize(TWO_PLACES)
+            subtotal += item.get_base_amount()
+            total_tax += item.tax_amount
+            lines.append(item)
+
+        invoice.subtotal = subtotal.quantize(TWO_PLACES)
+        invoice.total_tax = total_tax
+        invoice.grand_total = invoice.subtotal + invoice.total_tax - invoice.discount
+        invoice.due_balance = invoice.grand_total - invoice.received_amount
+        return invoice, lines
+
+    def _insert(self, invoices):
+        """Bulk insert invoices and their lines and take their stock; must run inside a transaction"""
+        Invoice.objects.bulk_create([invoice for _, invoice, _ in invoices], batch_size=self.batch_size)
+
+        # Not every backend returns primary keys from bulk_create
+        unsaved = {invoice.invoice_number: invoice for _, invoice, _ in invoices if invoice.pk is None}
+        if unsaved:
+            numbers = Invoice.objects.filter(branch=self.branch, invoice_number__in=unsaved)
+            for pk, number in numbers.values_list('pk', 'invoice_number'):
+                unsaved[number].pk = pk
+
+        items = []
+        for _, invoice, lines in invoices:
+            for item in lines:
+                item.invoice = invoice
+                items.append(item)
+        InvoiceItem.objects.bulk_create(items, batch_size=self.batch_size)
+        # Imported sales take stock like checkout does; a short product raises
+        # StockError, which fails the record in the per-invoice fallback
+        for _, invoice, lines in invoices:
+            take_stock(invoice, [(item.product, item.quantity) for item in lines])
+        record_invoices([invoice for _, invoice, _ in invoices])
+        analytics.record_invoices([(invoice, lines) for _, invoice, lines in invoices])
+        # bulk_create skips the post_save hook that keeps the search index current
+        index_invoices([invoice.pk for _, invoice, _ in invoices])
@@ -0,0 +1,168 @@
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from .customers import customer_identity_key
+from .models import Customer, Invoice, InvoiceItem, Payment, Product, StockMovement
+
+
+# Line amounts are stored rounded to paise, so sums may drift by a paisa
+TOLERANCE = Decimal('0.01')
+
+
+class Check:
+    """Outcome of one invariant: `problems` lists offending records (empty = pass)"""
+
+    def __init__(self, name, problems=(), note=''):
+        self.name = name
+        self.problems = list(problems)
+        self.note = note
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    def __str__(self):
+        status = 'ok' if self.ok else f'FAILED ({len(self.problems)})'
+        note = f' - {self.note}' if self.note else ''
+        return f"{self.name}: {status}{note}"
+
+
+def check_unique_numbers(invoices):
+    """Invoice numbers must be unique within each branch"""
+    duplicates = (invoices.values('branch_id', 'invoice_number')
+                  .annotate(n=Count('pk')).filter(n__gt=1)
+                  .values_list('branch_id', 'invoice_number'))
+    return Check('unique invoice numbers', [f"{number} (branch {branch_id})" for branch_id, number in duplicates])
+
+
+def check_sequence(invoices, prefix='S'):
+    """Numbers with `prefix` should be consecutive in each branch, with no gaps"""
+    pattern = re.compile(rf'^{re.escape(prefix)}(\d+)$')
+    by_branch = defaultdict(list)
+    for branch_id, number in invoices.values_list('branch_id', 'invoice_number'):
+        match = pattern.match(number)
+        if match:
+            by_branch[branch_id].append(int(match.group(1)))
+    if not by_branch:
+        return Check(f'sequential {prefix} numbers')
+
+    notes, missing = [], []
+    for branch_id, numbers in sorted(by_branch.items()):
+        numbers.sort()
+        gaps = sorted(set(range(numbers[0], numbers[-1] + 1)) - set(numbers))
+        label = f'branch {branch_id}: ' if len(by_branch) > 1 else ''
+        notes.append(f'{label}{numbers[0]}..{numbers[-1]}, {len(gaps)} gaps')
+        missing.extend(f"{label}{prefix}{n:02d}" for n in gaps)
+    return Check(f'sequential {prefix} numbers', missing[:50], note='; '.join(notes))
+
+
+TOTAL_FIELDS = ['pk', 'invoice_number', 'subtotal', 'total_tax', 'discount', 'grand_total',
+                'received_amount', 'due_balance']
+
+
+def line_sums(items):
+    """{invoice_id: {'n', 'tax', 'gross'}} for `items`, summed in the database"""
+    return {
+        row['invoice_id']: row
+        for row in items.values('invoice_id').annotate(n=Count('pk'), tax=Sum('tax_amount'), gross=Sum('amount')).order_by()
+    }
+
+
+def compare_totals(rows, lines):
+    """(pk, problem) for each invoice row (TOTAL_FIELDS values) whose stored totals disagree with `lines`"""
+    for inv in rows:
+        line = lines.get(inv['pk'])
+        if line is None:
+            yield inv['pk'], f"{inv['invoice_number']}: no lines"
+            continue
+        slack = TOLERANCE * line['n']
+        if abs(line['tax'] - inv['total_tax']) > slack:
+            yield inv['pk'], f"{inv['invoice_number']}: tax {inv['total_tax']} != lines {line['tax']}"
+        elif abs(line['gross'] - (inv['subtotal'] + inv['total_tax'])) > slack:
+            yield inv['pk'], f"{inv['invoice_number']}: subtotal+tax {inv['subtotal'] + inv['total_tax']} != lines {line['gross']}"
+        elif inv['grand_total'] != inv['subtotal'] + inv['total_tax'] - inv['discount']:
+            yield inv['pk'], f"{inv['invoice_number']}: grand total {inv['grand_total']} != subtotal + tax - discount"
+        elif inv['due_balance'] != inv['grand_total'] - inv['received_amount']:
+            yield inv['pk'], f"{inv['invoice_number']}: due {inv['due_balance']} != grand total - received"
+
+
+def check_totals(invoices):
+    """Invoice totals must equal the sum of their lines"""
+    lines = line_sums(InvoiceItem.objects.filter(invoice__in=invoices))
+    rows = invoices.values(*TOTAL_FIELDS).iterator(chunk_size=2000)
+    return Check('totals match lines', [problem for _, problem in compare_totals(rows, lines)])
+
+
+def check_orphan_items():
+    orphans = InvoiceItem.objects.exclude(invoice_id__in=Invoice.objects.values('pk')).values_list('pk', flat=True)
+    return Check('no orphan invoice lines', orphans)
+
+
+def check_payments(invoices):
+    """Each invoice's payments must add up to its received amount"""
+    paid = dict(Payment.objects.filter(invoice__in=invoices).values('invoice_id')
+                .annotate(total=Sum('amount')).order_by().values_list('invoice_id', 'total'))
+    problems = [
+        f"{number}: received {received} != payments {paid.get(pk, Decimal('0'))}"
+        for pk, number, received in invoices.values_list('pk', 'invoice_number', 'received_amount')
+        if paid.get(pk, Decimal('0')) != received
+    ]
+    return Check('payments match received amounts', problems)
+
+
+def check_duplicate_customers(customers=None):
+    """No two customers of a branch may share an email, or a phone number when neither has an email"""
+    customers = Customer.objects.all() if customers is None else customers
+    by_identity = defaultdict(list)
+    rows = customers.values_list('pk', 'branch_id', 'email', 'phone').iterator(chunk_size=5000)
+    for pk, branch_id, email, phone in rows:
+        key = customer_identity_key(email, phone)
+        if key:
+            by_identity[branch_id, key].append(pk)
+    problems = [f"{key} shared by customers {pks}" for (_, key), pks in by_identity.items() if len(pks) > 1]
+    return Check('no duplicate customers', problems)
+
+
+def check_stock(invoices, products=None):
+    """Stock is never negative, equals the sum of its movements, and each sale took what was billed"""
+    products = Product.objects.all() if products is None else products
+    moved = dict(StockMovement.objects.filter(product__in=products).values('product_id')
+                 .annotate(total=Sum('change')).order_by().values_list('product_id', 'total'))
+    problems = []
+    for pk, name, stock, tracked in products.values_list('pk', 'name', 'stock', 'track_stock'):
+        if tracked and stock < 0:
+            problems.append(f"{name}: stock {stock} is negative")
+        elif stock != moved.get(pk, Decimal('0')):
+            problems.append(f"{name}: stock {stock} != movements {moved.get(pk, Decimal('0'))}")
+
+    billed = defaultdict(Decimal)
+    for invoice_id, product_id, quantity in (InvoiceItem.objects.filter(invoice__in=invoices)
+                                             .values_list('invoice_id', 'product_id', 'quantity')):
+        billed[invoice_id, product_id] += quantity
+    # An edited invoice has one sale movement per change to a line
+    sales = (StockMovement.objects.filter(kind=StockMovement.SALE, invoice__in=invoices)
+             .values('invoice__invoice_number', 'invoice_id', 'product_id').annotate(taken=-Sum('change')).order_by()
+             .values_list('invoice__invoice_number', 'invoice_id', 'product_id', 'taken'))
+    problems.extend(
+        f"{number}: took {taken} of product {product_id}, billed {billed[invoice_id, product_id]}"
+        for number, invoice_id, product_id, taken in sales
+        if taken != billed[invoice_id, product_id]
+    )
+    return Check('stock matches movements', problems)
+
+
+def check_invariants(invoices=None, customers=None, prefix='S', products=None):
+    """Run every check over `invoices` (default: all); returns a list of Check"""
+    invoices = Invoice.objects.all() if invoices is None else invoices
+    return [
+        check_unique_numbers(invoices),
+        check_sequence(invoices, prefix),
+        check_totals(invoices),
+        check_orphan_items(),
+        check_payments(invoices),
+        check_duplicate_customers(customers),
+        check_stock(invoices, products),
+    ]
@@ -0,0 +1,259 @@
+import csv
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .ledger import PaymentError, record_payment
+from .models import Customer, Invoice, Job, Payment
+
+
+# Large selections are split so one job never holds thousands of invoices
+BATCH_SIZE = 500
+
+
+def enqueue(kind, invoice_ids, requested_by='', **options):
+    """Queue `kind` over `invoice_ids` in batches; returns the created jobs"""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    invoice_ids = list(invoice_ids)
+    return Job.objects.bulk_create([
+        Job(kind=kind, payload={**options, 'invoice_ids': invoice_ids[start:start + BATCH_SIZE]},
+            requested_by=requested_by)
+        for start in range(0, len(invoice_ids), BATCH_SIZE)
+    ])
+
+
+def _invoices(job):
+    return Invoice.objects.filter(pk__in=job.payload.get('invoice_ids', [])).select_related('customer')
+
+
+def mark_paid(job):
+    """Record a payment for the full due balance of each invoice"""
+    paid, skipped = 0, 0
+    for invoice in _invoices(job).filter(due_balance__gt=0):
+        try:
+            record_payment(invoice, invoice.due_balance, method=job.payload.get('method', 'CASH'),
+                           reference=f'Job #{job.pk}', notes='Marked paid from admin')
+            paid += 1
+        except PaymentError:
+            # Paid in the meantime; the conditional update refused to overpay
+            skipped += 1
+    return f"{paid} marked paid, {skipped} skipped"
+
+
+def send_emails(job):
+    """Email each invoice to its customer"""
+    from .utils import send_invoice_email
+
+    sent, failed = [], 0
+    for invoice in _invoices(job).exclude(Q(customer__email='') | Q(customer__email__isnull=True)):
+        if send_invoice_email(invoice, invoice.customer.email):
+            sent.append(invoice.pk)
+        else:
+            failed += 1
+    Invoice.objects.filter(pk__in=sent).update(email_sent=True, email_sent_at=timezone.now())
+    if failed and not sent:
+        raise RuntimeError(f"All {failed} emails failed; check the email settings")
+    return f"{len(sent)} sent, {failed} failed"
+
+
+def _write_csv(path, invoices):
+    fields = ['invoice_number', 'invoice_date', 'customer__name', 'customer__phone', 'customer__gstin',
+              'subtotal', 'total_tax', 'discount', 'grand_total', 'received_amount', 'due_balance']
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([field.replace('customer__', 'customer_') for field in fields])
+        rows = invoices.order_by('invoice_date', 'invoice_number').values_list(*fields)
+        count = 0
+        for count, row in enumerate(rows.iterator(chunk_size=2000), 1):
+            writer.writerow(row)
+    return count
+
+
+def export_csv(job):
+    """Write the invoices to MEDIA_ROOT/exports/ as CSV"""
+    path = Path(settings.MEDIA_ROOT) / 'exports' / f'invoices-job{job.pk}.csv'
+    count = _write_csv(path, _invoices(job))
+    return f"{count} invoices written to {path}"
+
+
+def render_pdfs(job):
+    """Re-render each invoice's PDF into MEDIA_ROOT/invoices/"""
+    from .utils import generate_invoice_pdf
+
+    folder = Path(settings.MEDIA_ROOT) / 'invoices'
+    folder.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for invoice in _invoices(job).prefetch_related('items'):
+        (folder / f'{invoice.invoice_number}.pdf').write_bytes(
+            generate_invoice_pdf(invoice, job.payload.get('renderer')).getvalue()
+        )
+        count += 1
+    return f"{count} PDFs written to {folder}"
+
+
+def export_day(job):
+    """Nightly export: one day's invoices (default yesterday) to MEDIA_ROOT/exports/"""
+    day = timezone.localdate() - timedelta(days=job.payload.get('days_ago', 1))
+    path = Path(settings.MEDIA_ROOT) / 'exports' / f'invoices-{day:%Y-%m-%d}.csv'
+    count = _write_csv(path, Invoice.objects.filter(invoice_date=day))
+    return f"{count} invoices written to {path}"
+
+
+def refresh_rollups(job):
+    """Rebuild the last few days of analytics buckets, correcting any drift"""
+    from .analytics import rebuild_rollups
+
+    end = timezone.localdate()
+    start = end - timedelta(days=job.payload.get('days', 2) - 1)
+    rebuild_rollups(start, end)
+    return f"Rollups rebuilt for {start} to {end}"
+
+
+def cleanup_files(job):
+    """Delete generated PDFs and exports older than `days` from MEDIA_ROOT"""
+    cutoff = timezone.now().timestamp() - job.payload.get('days', 7) * 86400
+    removed = 0
+    for folder in job.payload.get('folders', ['invoices', 'exports']):
+        root = Path(settings.MEDIA_ROOT) / folder
+        if not root.is_dir():
+            continue
+        for path in root.rglob('*'):
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+    return f"{removed} files removed"
+
+
+def payment_reminders(job):
+    """Send the due payment reminders (see billing.reminders)"""
+    from .reminders import run_reminders
+
+    run = run_reminders(dry_run=job.payload.get('dry_run', False), limit=job.payload.get('limit'))
+    return (f"{run.customers} customers: {run.sent} sent, {run.failed} failed, {run.skipped} skipped "
+            f"in {run.seconds:.1f}s")
+
+
+def monthly_statements(job):
+    """Pre-render last month's statements for customers with activity in it"""
+    from .statements import cached_statement, parse_period
+
+    start, end = parse_period(job.payload.get('month'))
+    customer_ids = set(Invoice.objects.filter(invoice_date__range=(start, end)).values_list('customer_id', flat=True))
+    customer_ids.update(Payment.objects.filter(paid_on__range=(start, end)).values_list('customer_id', flat=True))
+    for customer in Customer.objects.filter(pk__in=customer_ids).iterator(chunk_size=500):
+        cached_statement(customer, start, end)
+    return f"{len(customer_ids)} statements for {start:%Y-%m} ready"
+
+
+def apply_prices(job):
+    """Move products onto prices that take effect today (see billing.pricing)"""
+    from .pricing import apply_prices as apply
+
+    return f"{apply()} products repriced"
+
+
+HANDLERS = {
+    'mark_paid': mark_paid,
+    'send_emails': send_emails,
+    'export_csv': export_csv,
+    'render_pdfs': render_pdfs,
+    'export_day': export_day,
+    'refresh_rollups': refresh_rollups,
+    'cleanup_files': cleanup_files,
+    'payment_reminders': payment_reminders,
+    'monthly_statements': monthly_statements,
+    'apply_prices': apply_prices,
+}
+
+
+def claim(job):
+    """Take a queued job; the conditional UPDATE lets only one worker win it"""
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+        status=Job.RUNNING, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+    ) == 1
+    if claimed:
+        job.attempts += 1
+    return claimed
+
+
+class Heartbeat:
+    """Refreshes a running job's heartbeat_at from a side thread until the job returns"""
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = interval or settings.JOB_HEARTBEAT_SECONDS
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f'heartbeat-{job.pk}', daemon=True)
+
+    def _beat(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    Job.objects.filter(pk=self.job.pk, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    # Database busy; the next beat tries again
+                    pass
+        finally:
+            # The thread has its own connection; don't leak it
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_job(job):
+    """Run one claimed job and record its outcome"""
+    try:
+        with Heartbeat(job):
+            result, status = HANDLERS[job.kind](job), Job.DONE
+    except Exception as e:
+        result, status = f"{type(e).__name__}: {e}", Job.FAILED
+    # Only this attempt's outcome: if the job was requeued and claimed again,
+    # that run records its own
+    Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+        status=status, result=result, finished_at=timezone.now())
+    return status
+
+
+def requeue_stale(minutes):
+    """Put running jobs back in the queue whose worker stopped sending heartbeats `minutes` ago.
+
+    A live worker refreshes heartbeat_at every JOB_HEARTBEAT_SECONDS however
+    long its job takes, so only jobs of dead workers are picked up again.
+    """
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    silent = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    return Job.objects.filter(silent, status=Job.RUNNING).update(status=Job.QUEUED)
+
+
+def claim_next():
+    """Claim the oldest queued job, or return None when the queue is empty"""
+    while True:
+        job = Job.objects.filter(status=Job.QUEUED).order_by('id').first()
+        if job is None or claim(job):
+            return job
+
+
+def run_pending(limit=None):
+    """Run queued jobs oldest first; returns how many this worker ran"""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Invoice, Payment, CustomerBalance
+
+
+class PaymentError(Exception):
+    """Raised when a payment cannot be applied to an invoice"""
+
+
+def adjust_customer_balance(customer_id, billed=Decimal('0'), paid=Decimal('0')):
+    """Apply a billed/paid delta to a customer's running balance with a single UPDATE"""
+    billed = Decimal(billed)
+    paid = Decimal(paid)
+    if not billed and not paid:
+        return
+
+    updated = CustomerBalance.objects.filter(customer_id=customer_id).update(
+        total_billed=F('total_billed') + billed,
+        total_paid=F('total_paid') + paid,
+        outstanding=F('outstanding') + billed - paid,
+    )
+    if updated:
+        return
+
+    try:
+        with transaction.atomic():
+            CustomerBalance.objects.create(
+                customer_id=customer_id,
+                total_billed=billed,
+                total_paid=paid,
+                outstanding=billed - paid,
+            )
+    except IntegrityError:
+        # Created concurrently; apply the delta to that row instead
+        adjust_customer_balance(customer_id, billed, paid)
+
+
+def record_invoice(invoice):
+    """Post a newly created invoice to the ledger.
+
+    The amount received at checkout becomes the invoice's first payment so
+    the sum of payments always equals `received_amount`.
+    """
+    record_invoices([invoice])
+
+
+def record_invoices(invoices):
+    """Post many newly created invoices, with one balance UPDATE per customer"""
+    deltas = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    payments = []
+    for invoice in invoices:
+        deltas[invoice.customer_id][0] += invoice.grand_total
+        deltas[invoice.customer_id][1] += invoice.received_amount
+        if invoice.received_amount > 0:
+            payments.append(Payment(
+                invoice=invoice,
+                customer_id=invoice.customer_id,
+                amount=invoice.received_amount,
+                paid_on=invoice.invoice_date,
+                notes='Received at billing',
+            ))
+
+    with transaction.atomic():
+        if payments:
+            Payment.objects.bulk_create(payments)
+        for customer_id, (billed, paid) in deltas.items():
+            adjust_customer_balance(customer_id, billed, paid)
+
+
+def record_payment(invoice, amount, method='CASH', reference='', paid_on=None, notes=''):
+    """Append a payment and apply it to the invoice and customer balances atomically"""
+    amount = Decimal(str(amount))
+    if amount <= 0:
+        raise PaymentError("Payment amount must be positive")
+
+    with transaction.atomic():
+        # Conditional UPDATE: the due check and the decrement cannot interleave
+        updated = Invoice.objects.filter(pk=invoice.pk, due_balance__gte=amount).update(
+            received_amount=F('received_amount') + amount,
+            due_balance=F('due_balance') - amount,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            raise PaymentError(f"Payment exceeds the due balance of Invoice #{invoice.invoice_number}")
+
+        payment = Payment.objects.create(
+            invoice=invoice,
+            customer_id=invoice.customer_id,
+            amount=amount,
+            method=method,
+            reference=reference,
+            paid_on=paid_on or date.today(),
+            notes=notes,
+        )
+        adjust_customer_balance(invoice.customer_id, paid=amount)
+
+    invoice.refresh_from_db(fields=['received_amount', 'due_balance'])
+    return payment
+
+
+def rebuild_customer_balances(customer_ids=None):
+    """Recompute running balances from invoice totals, for all or some customers"""
+    invoices = Invoice.objects.all()
+    balances = CustomerBalance.objects.all()
+    if customer_ids is not None:
+        invoices = invoices.filter(customer_id__in=customer_ids)
+        balances = balances.filter(customer_id__in=customer_ids)
+
+    rows = invoices.values('customer_id').annotate(
+        billed=Sum('grand_total'),
+        paid=Sum('received_amount'),
+    ).order_by()
+
+    with transaction.atomic():
+        balances.delete()
+        CustomerBalance.objects.bulk_create([
+            CustomerBalance(
+                customer_id=row['customer_id'],
+                total_billed=row['billed'],
+                total_paid=row['paid'],
+                outstanding=row['billed'] - row['paid'],
+            )
+            for row in rows
+        ], batch_size=1000)
+
+
+def outstanding_customers(limit=50, branch=None):
+    """Customers (of one branch, if given) who owe money, largest balance first, straight off the balance index"""
+    balances = CustomerBalance.objects.filter(outstanding__gt=0)
+    if branch is not None:
+        balances = balances.filter(customer__branch=branch)
+    return balances.select_related('customer').order_by('-outstanding')[:limit]
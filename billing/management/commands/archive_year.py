@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from billing.archive import ArchiveError, archive_financial_year, financial_year_label, get_year
+
+
+class Command(BaseCommand):
+    help = 'Copy a closed financial year (April-March) into the columnar archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start_year', type=int, help='First year of the financial year, e.g. 2023 for 2023-24')
+        parser.add_argument('--summary', action='store_true',
+                            help='Only print the summary of an existing archive')
+
+    def handle(self, *args, **options):
+        label = financial_year_label(options['start_year'])
+
+        try:
+            if not options['summary']:
+                self.stdout.write(f'Archiving financial year {label}...')
+                result = archive_financial_year(options['start_year'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ Archived {result['archived']} invoices ({result['total']} in archive)"
+                ))
+                if result['left_unpaid']:
+                    self.stdout.write(self.style.WARNING(
+                        f"  {result['left_unpaid']} invoices with a due balance were left out"
+                    ))
+            summary = get_year(label).summary()
+        except ArchiveError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(json.dumps(summary, indent=2))
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.audit import CHUNK_SIZE, repair, run_audit
+
+
+class Command(BaseCommand):
+    help = ('Audit every invoice against its lines in parallel key-range chunks: stored totals, '
+            'orphaned lines and payments, and gaps in the number series; optionally repair')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPUs, at most 8)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Invoices per chunk')
+        parser.add_argument('--repair', action='store_true',
+                            help='Recompute mismatched totals from their lines and delete orphaned rows')
+        parser.add_argument('--show', type=int, default=20, help='How many problems of each kind to list')
+
+    def handle(self, *args, **options):
+        reported = {'tenth': 0}
+
+        def progress(done, total, result):
+            # About ten progress lines, however many chunks there are
+            tenth = done * 10 // total
+            if tenth > reported['tenth'] or done == total:
+                reported['tenth'] = tenth
+                self.stdout.write(f"  {done}/{total} chunks, {result.invoices:,} invoices, {result.lines:,} lines, "
+                                  f"{len(result.mismatches)} mismatches")
+
+        self.stdout.write('Auditing invoices...')
+        result = run_audit(options['chunk_size'], options['workers'], progress)
+        rate = result.lines / result.seconds if result.seconds else 0
+        self.stdout.write(f"{result.invoices:,} invoices and {result.lines:,} lines in {result.seconds:.1f}s "
+                          f"({rate:,.0f} lines/s)\n")
+
+        show = options['show']
+        for check in result.sequences:
+            style = self.style.SUCCESS if check.ok else self.style.ERROR
+            self.stdout.write(style(f"  {'✅' if check.ok else '❌'} {check}"))
+            for problem in check.problems[:show]:
+                self.stdout.write(f"      {problem}")
+        for label, problems in [('totals match lines', [problem for _, problem in result.mismatches]),
+                                ('no orphan invoice lines', result.orphan_items),
+                                ('no orphan payments', result.orphan_payments)]:
+            style = self.style.SUCCESS if not problems else self.style.ERROR
+            status = 'ok' if not problems else f'FAILED ({len(problems)})'
+            self.stdout.write(style(f"  {'✅' if not problems else '❌'} {label}: {status}"))
+            for problem in problems[:show]:
+                self.stdout.write(f"      {problem}")
+
+        if result.ok:
+            self.stdout.write(self.style.SUCCESS('✅ No problems found'))
+            return
+        if not options['repair']:
+            raise CommandError('Audit found problems; run again with --repair to fix totals and orphaned rows')
+
+        repaired = repair(result)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Recomputed {repaired} invoices, deleted {len(result.orphan_items)} orphan lines and "
+            f"{len(result.orphan_payments)} orphan payments"
+        ))
+        if any(not check.ok for check in result.sequences) or repaired < len({pk for pk, _ in result.mismatches}):
+            raise CommandError('Number gaps and invoices without lines need to be looked at by hand')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from billing.models import Invoice
+from billing.renderers import RENDERERS, RendererError, benchmark
+
+
+class Command(BaseCommand):
+    help = 'Compare invoice renderers (platypus, canvas, thermal) on a real invoice'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoice', help='Invoice number to render (default: the one with the most lines)')
+        parser.add_argument('--renderer', action='append', dest='renderers',
+                            help=f"Renderer to include (repeatable; default: {', '.join(RENDERERS)})")
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.select_related('customer').prefetch_related('items')
+        if options['invoice']:
+            invoice = invoices.filter(invoice_number=options['invoice']).first()
+        else:
+            invoice = invoices.annotate(lines=Count('items')).order_by('-lines').first()
+        if invoice is None:
+            raise CommandError('No invoice to render')
+
+        # Load the lines once so the timings measure rendering only
+        lines = len(invoice.items.all())
+        self.stdout.write(f"Invoice #{invoice.invoice_number} ({lines} lines), best of {options['repeat']}:")
+
+        try:
+            results = benchmark(invoice, options['renderers'], options['repeat'])
+        except RendererError as e:
+            raise CommandError(str(e))
+
+        slowest = max(best for _, best, _ in results.values())
+        for name, (first, best, size) in results.items():
+            self.stdout.write(
+                f"  {name:10} {best * 1000:8.2f} ms  (first {first * 1000:7.1f} ms)  "
+                f"{size / 1024:6.1f} KB  {slowest / best:5.1f}x"
+            )
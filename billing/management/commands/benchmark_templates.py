@@ -0,0 +1,94 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from billing.models import Invoice
+
+
+def benchmark_pages(requests=50):
+    """Time full GETs of the main pages in this process's settings profile.
+
+    The cache is cleared before every request so view and fragment caches
+    don't hide the template rendering being measured.
+    """
+    invoice = Invoice.objects.order_by('-pk').first()
+    pages = ['/', '/products/', '/invoices/search/?q=s1', '/statistics/']
+    if invoice:
+        pages.insert(2, f'/invoice/{invoice.pk}/')
+
+    client = Client()
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        for page in pages:
+            timings = []
+            for _ in range(requests + 1):
+                cache.clear()
+                started = time.perf_counter()
+                response = client.get(page)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"GET {page} returned {response.status_code}")
+            # Timed without Accept-Encoding so both profiles do the same work;
+            # the transfer size is what a browser would actually receive
+            cache.clear()
+            size = len(client.get(page, HTTP_ACCEPT_ENCODING='gzip').content)
+            # The first request pays for template compilation; report it apart
+            results[page] = {
+                'first_ms': timings[0] * 1000,
+                'median_ms': statistics.median(timings[1:]) * 1000,
+                'bytes': size,
+            }
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request render time between the dev and prod settings profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per page and profile')
+        parser.add_argument('--worker', action='store_true', help='Internal: benchmark the current profile, print JSON')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            if settings.PRODUCTION and not staticfiles_storage.exists(staticfiles_storage.manifest_name):
+                # The hashed static storage can't resolve {% static %} without a manifest
+                call_command('collectstatic', interactive=False, verbosity=0)
+            self.stdout.write(json.dumps(benchmark_pages(options['requests'])))
+            return
+
+        # Each profile needs its own process: settings are fixed at startup
+        results = {}
+        for profile in ('dev', 'prod'):
+            env = dict(os.environ, DJANGO_PROFILE=profile)
+            env.pop('DEBUG', None)
+            env.setdefault('SECRET_KEY', 'benchmark-only-' + 'x' * 40)
+            proc = subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark_templates', '--worker',
+                 '--requests', str(options['requests'])],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if proc.returncode:
+                raise CommandError(f"{profile} profile failed:\n{proc.stderr.strip()}")
+            results[profile] = json.loads(proc.stdout)
+
+        self.stdout.write(f"{'page':24} {'dev ms':>8} {'prod ms':>8} {'speedup':>8} "
+                          f"{'dev KB':>8} {'prod KB':>8}  (first request dev/prod ms)")
+        for page, dev in results['dev'].items():
+            prod = results['prod'][page]
+            self.stdout.write(
+                f"{page:24} {dev['median_ms']:8.2f} {prod['median_ms']:8.2f} "
+                f"{dev['median_ms'] / prod['median_ms']:7.1f}x "
+                f"{dev['bytes'] / 1024:8.1f} {prod['bytes'] / 1024:8.1f}  "
+                f"({dev['first_ms']:.0f}/{prod['first_ms']:.0f})"
+            )
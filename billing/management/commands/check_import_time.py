@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# What a fresh gunicorn worker imports before it can serve its first request
+STARTUP_CODE = (
+    "import os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bizbilling.settings'); "
+    "from bizbilling.wsgi import application; "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+# Only needed by PDF rendering, WhatsApp sending, archives and GST reports
+LAZY_MODULES = ['reportlab', 'requests', 'numpy']
+
+
+def measure_imports(code=STARTUP_CODE):
+    """Run `code` under `python -X importtime`.
+
+    Returns {module: cumulative microseconds} for the top-level imports and the
+    set of every module imported along the way.
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode:
+        raise CommandError(proc.stderr.strip().splitlines()[-1])
+
+    top_level, modules = {}, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        modules.add(name.strip())
+        # Nested imports are indented further; top-level ones add up to the total
+        if not name.startswith('   '):
+            top_level[name.strip()] = int(cumulative)
+    return top_level, modules
+
+
+class Command(BaseCommand):
+    help = 'Measure the import time of the WSGI app and fail if it exceeds the budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget-ms', type=float, default=settings.IMPORT_TIME_BUDGET_MS,
+                            help='Maximum total import time in milliseconds')
+        parser.add_argument('--runs', type=int, default=3, help='Take the best of this many runs')
+        parser.add_argument('--top', type=int, default=10, help='Show the slowest N top-level imports')
+
+    def handle(self, *args, **options):
+        runs = [measure_imports() for _ in range(options['runs'])]
+        top_level, modules = min(runs, key=lambda run: sum(run[0].values()))
+        total = sum(top_level.values()) / 1000
+
+        slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)
+        for name, us in slowest[:options['top']]:
+            self.stdout.write(f"{us / 1000:9.1f} ms  {name}")
+
+        eager = sorted({name.split('.')[0] for name in modules} & set(LAZY_MODULES))
+        if eager:
+            raise CommandError(f"Imported at startup but should be lazy: {', '.join(eager)}")
+
+        message = f"Startup imports: {total:.1f} ms (budget {options['budget_ms']:.0f} ms)"
+        if total > options['budget_ms']:
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(f"✅ {message}"))
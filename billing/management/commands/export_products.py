@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from billing.branches import get_branch
+from billing.catalogue import CatalogueError, export_csv_lines, export_xlsx
+from billing.models import Branch
+
+
+class Command(BaseCommand):
+    help = 'Export a branch\'s products as a CSV or XLSX catalogue that import_products can read back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write, or "-" for CSV on stdout')
+        parser.add_argument('--format', choices=['csv', 'xlsx'],
+                            help='Output format (default: guessed from the file extension)')
+        parser.add_argument('--branch', metavar='CODE',
+                            help='Branch to export (default: DEFAULT_BRANCH)')
+
+    def handle(self, *args, **options):
+        try:
+            branch = get_branch(options['branch'])
+        except Branch.DoesNotExist:
+            raise CommandError(f"No branch with code '{options['branch']}'")
+
+        path = options['path']
+        fmt = options['format'] or ('xlsx' if path.lower().endswith('.xlsx') else 'csv')
+        if fmt == 'xlsx':
+            if path == '-':
+                raise CommandError('XLSX files must be written to a path, not stdout')
+            try:
+                export_xlsx(branch, path)
+            except CatalogueError as e:
+                raise CommandError(str(e))
+        else:
+            stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+            for line in export_csv_lines(branch):
+                stream.write(line)
+            if path == '-':
+                return
+            stream.close()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Exported {branch.code} products to {path}'))
@@ -0,0 +1,46 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from billing.models import Customer, Invoice
+from billing.statements import cached_statement, parse_period
+
+
+class Command(BaseCommand):
+    help = 'Render (and cache) statement-of-account PDFs for a period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='YYYY-MM (default: last month)')
+        parser.add_argument('--start', help='First day, YYYY-MM-DD (with --end)')
+        parser.add_argument('--end', help='Last day, YYYY-MM-DD')
+        parser.add_argument('--customer', type=int, action='append', help='Only this customer id (repeatable)')
+        parser.add_argument('--profile', action='store_true', help='Report time and peak Python memory per statement')
+
+    def handle(self, *args, **options):
+        try:
+            start, end = parse_period(options['month'], options['start'], options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['customer']:
+            customers = Customer.objects.filter(pk__in=options['customer'])
+        else:
+            active = Invoice.objects.filter(invoice_date__range=(start, end)).values('customer_id')
+            customers = Customer.objects.filter(pk__in=active)
+
+        count = 0
+        for customer in customers.iterator(chunk_size=500):
+            if options['profile']:
+                tracemalloc.start()
+                began = time.perf_counter()
+            path = cached_statement(customer, start, end)
+            count += 1
+            if options['profile']:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                rows = Invoice.objects.filter(customer=customer, invoice_date__range=(start, end)).aggregate(n=Count('id'))['n']
+                self.stdout.write(f"{customer.name}: {rows} invoices, {time.perf_counter() - began:.2f}s, "
+                                  f"peak {peak / 1024 / 1024:.1f} MB, {path.stat().st_size / 1024:.0f} KB -> {path}")
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} statements for {start} to {end}'))
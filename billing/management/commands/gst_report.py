@@ -0,0 +1,58 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from billing.branches import get_branch
+from billing.gst import benchmark, gst_report, report_to_csv
+from billing.models import Branch
+from billing.routers import replica_reads
+
+
+class Command(BaseCommand):
+    help = 'GST summary (per rate, per state, per HSN) for a month, as JSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Month to report, YYYY-MM (default: last month)')
+        parser.add_argument('--format', choices=['json', 'csv'], default='json')
+        parser.add_argument('--branch', metavar='CODE',
+                            help="Only this branch's invoices, split by its state (default: all branches)")
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--benchmark', type=int, metavar='N',
+                            help='Time the summary over N synthetic lines instead (e.g. 5000000)')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            n = options['benchmark']
+            seconds = benchmark(n)
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Summarized {n:,} lines in {seconds:.3f}s ({n / seconds:,.0f} lines/sec)'
+            ))
+            return
+
+        if options['month']:
+            try:
+                year, month = (int(part) for part in options['month'].split('-'))
+                date(year, month, 1)
+            except ValueError:
+                raise CommandError('--month must look like YYYY-MM')
+        else:
+            today = date.today()
+            year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+
+        branch = None
+        if options['branch']:
+            try:
+                branch = get_branch(options['branch'])
+            except Branch.DoesNotExist:
+                raise CommandError(f"No branch with code '{options['branch']}'")
+
+        with replica_reads():
+            report = gst_report(year, month, branch=branch)
+        output = report_to_csv(report) if options['format'] == 'csv' else json.dumps(report, indent=2)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"✅ GST report for {report['period']} written to {options['output']}"))
+        else:
+            self.stdout.write(output)
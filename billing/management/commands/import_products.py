@@ -0,0 +1,60 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from billing.branches import get_branch
+from billing.catalogue import CatalogueError, ProductImporter, parse_csv, parse_xlsx
+from billing.models import Branch
+
+
+class Command(BaseCommand):
+    help = ('Create and update products from a CSV or XLSX catalogue (use "-" for CSV on stdin), '
+            'matching rows to existing products by SKU, or by name when a row has no SKU')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or "-" for stdin')
+        parser.add_argument('--format', choices=['csv', 'xlsx'],
+                            help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per lookup/write batch (default: 1000)')
+        parser.add_argument('--branch', metavar='CODE',
+                            help='Branch to import into (default: DEFAULT_BRANCH)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without saving anything')
+
+    def handle(self, *args, **options):
+        try:
+            branch = get_branch(options['branch'])
+        except Branch.DoesNotExist:
+            raise CommandError(f"No branch with code '{options['branch']}'")
+
+        path = options['path']
+        fmt = options['format'] or ('xlsx' if path.lower().endswith('.xlsx') else 'csv')
+        if fmt == 'xlsx' and path == '-':
+            raise CommandError('XLSX files must be read from a path, not stdin')
+
+        def progress(result):
+            self.stdout.write(f'  ... {result.created} added, {result.updated} updated, '
+                              f'{result.unchanged} unchanged, {result.failed} failed')
+
+        importer = ProductImporter(batch_size=max(1, options['batch_size']), branch=branch,
+                                   dry_run=options['dry_run'], progress=progress)
+        try:
+            if fmt == 'xlsx':
+                result = importer.run(parse_xlsx(path))
+            else:
+                stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+                with stream:
+                    result = importer.run(parse_csv(stream))
+        except (CatalogueError, OSError) as e:
+            raise CommandError(str(e))
+
+        for error in result.errors[:20]:
+            self.stdout.write(self.style.WARNING(f"  ✗ Row {error['record']}: {error['error']}"))
+        if len(result.errors) > 20:
+            self.stdout.write(self.style.WARNING(f'  ... and {len(result.errors) - 20} more errors'))
+
+        verb = 'Would add' if options['dry_run'] else 'Added'
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ {verb} {result.created}, updated {result.updated}, left {result.unchanged} unchanged '
+            f'({result.failed} failed) in {result.elapsed:.2f}s — {result.rate:.0f} rows/sec'
+        ))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from billing.models import Product, Customer, Invoice, InvoiceItem
+from billing.pricing import set_price
 from datetime import datetime, timedelta
 from decimal import Decimal
 
@@ -32,6 +33,7 @@ class Command(BaseCommand):
             )
             products.append(product)
             if created:
+                set_price(product, product.price_per_unit, product.tax_percentage)
                 self.stdout.write(f'  ✓ Created product: {product.name}')
         
         # Create sample customer
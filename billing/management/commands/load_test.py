@@ -0,0 +1,256 @@
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from billing.integrity import Check, check_invariants
+from billing.models import Customer, Invoice, InvoiceItem, Product, default_branch_id
+from billing.stock import set_stock
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Stats:
+    """Latencies and failures per endpoint, shared by all client threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def record(self, endpoint, seconds, error=None):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if error:
+                self.errors[endpoint][error[:120]] += 1
+
+
+class ShopClient(threading.Thread):
+    """One till: searches for products, bills a cart and sometimes downloads the PDF"""
+
+    def __init__(self, base_url, products, customers, stats, deadline, remaining, pdf_ratio, seed, hot_product=None):
+        super().__init__(daemon=True)
+        import requests
+
+        self.base_url = base_url
+        self.products = products
+        self.customers = customers
+        self.stats = stats
+        self.deadline = deadline
+        self.remaining = remaining
+        self.pdf_ratio = pdf_ratio
+        self.hot_product = hot_product
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+
+    def call(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        error = None
+        response = None
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+            if response.status_code != 200:
+                detail = response.json().get('error', '') if 'json' in response.headers.get('Content-Type', '') else ''
+                error = f"HTTP {response.status_code} {detail}".strip()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.stats.record(endpoint, time.perf_counter() - started, error)
+        return None if error else response
+
+    def take_ticket(self):
+        """Claim one invoice from the shared budget; False once it is used up"""
+        with self.remaining['lock']:
+            if self.remaining['count'] <= 0:
+                return False
+            self.remaining['count'] -= 1
+            return True
+
+    def cart(self):
+        lines = self.random.sample(self.products, k=min(len(self.products), self.random.randint(1, 8)))
+        items = [{'product_id': p['id'], 'quantity': str(self.random.choice([1, 1, 2, 3, 5, 0.5, 1.25]))}
+                 for p in lines if p['id'] != self.hot_product]
+        if self.hot_product:
+            # Every till fights over the same few units
+            items.append({'product_id': self.hot_product, 'quantity': '1'})
+        return items
+
+    def run(self):
+        # The landing page sets the CSRF cookie, exactly as for a browser
+        self.call('index', 'GET', '/')
+        csrf = self.session.cookies.get('csrftoken', '')
+
+        while time.monotonic() < self.deadline and self.take_ticket():
+            for _ in range(self.random.randint(1, 3)):
+                name = self.random.choice(self.products)['name']
+                self.call('search_products', 'GET', '/api/search-products/',
+                          params={'q': name[:self.random.randint(2, max(2, len(name)))]})
+
+            items = self.cart()
+            response = self.call('generate_invoice', 'POST', '/invoice/generate/', json={
+                # A small customer pool makes concurrent first-time customers likely
+                'customer': self.random.choice(self.customers),
+                'items': items,
+                'discount': str(self.random.choice([0, 0, 0, 5, 10])),
+                'received_amount': str(self.random.choice([0, 50, 100])),
+                'notes': 'load test',
+            }, headers={'X-CSRFToken': csrf, 'Referer': self.base_url + '/'})
+            if response is None:
+                continue
+            if self.random.random() < self.pdf_ratio:
+                self.call('invoice_pdf', 'GET', f"/invoice/{response.json()['invoice_id']}/pdf/")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ('Drive concurrent checkout traffic (search, generate invoice, PDF) against a running '
+            'server, report throughput and latency, then verify database invariants')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server to test')
+        parser.add_argument('--start-server', action='store_true',
+                            help='Start a threaded runserver on a free port for the test')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--invoices', type=int, default=200, help='Total invoices to create')
+        parser.add_argument('--duration', type=float, default=300, help='Stop after this many seconds')
+        parser.add_argument('--customers', type=int, default=20,
+                            help='Size of the (new) customer pool; smaller means more contention')
+        parser.add_argument('--pdf-ratio', type=float, default=0.3, help='Share of invoices also downloaded as PDF')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--hot-product', type=int, default=None,
+                            help='Product id put in every cart, with stock tracked, to test concurrent stock takes')
+        parser.add_argument('--stock', type=int, default=20, help='Starting stock of the --hot-product')
+
+    def handle(self, *args, **options):
+        # The tills post without X-Branch, so they bill in the default branch
+        products = list(Product.objects.filter(branch_id=default_branch_id(), is_active=True).values('id', 'name'))
+        if not products:
+            raise CommandError('No active products; add some (or run load_sample_data) first')
+
+        hot_product = None
+        if options['hot_product']:
+            hot_product = Product.objects.filter(pk=options['hot_product'], branch_id=default_branch_id()).first()
+            if hot_product is None:
+                raise CommandError(f"No product {options['hot_product']} in the default branch")
+            Product.objects.filter(pk=hot_product.pk).update(track_stock=True)
+            set_stock(hot_product, options['stock'], note='Load test')
+
+        run_id = f"{int(time.time()) % 100000:05d}"
+        customers = [
+            {'name': f'Load Test {run_id}-{i}', 'phone': f'+91 9{run_id}{i:04d}', 'email': ''}
+            for i in range(options['customers'])
+        ]
+
+        server = None
+        base_url = options['url'].rstrip('/')
+        if options['start_server']:
+            port = free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            server = subprocess.Popen(
+                [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+                cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            self.wait_for(base_url)
+
+        started_at = timezone.now()
+        stats = Stats()
+        remaining = {'count': options['invoices'], 'lock': threading.Lock()}
+        seed = options['seed'] if options['seed'] is not None else random.randrange(1 << 30)
+        clients = [
+            ShopClient(base_url, products, customers, stats, time.monotonic() + options['duration'],
+                       remaining, options['pdf_ratio'], seed + i, hot_product and hot_product.pk)
+            for i in range(options['clients'])
+        ]
+
+        self.stdout.write(f"{options['clients']} clients -> {base_url}, {options['invoices']} invoices, seed {seed}")
+        began = time.perf_counter()
+        try:
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+        finally:
+            elapsed = time.perf_counter() - began
+            if server:
+                server.terminate()
+                server.wait()
+
+        self.report(stats, elapsed)
+        self.verify(started_at, customers, hot_product, options['stock'])
+
+    def wait_for(self, base_url, timeout=30):
+        import requests
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                requests.get(base_url + '/api/search-products/', timeout=1)
+                return
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        raise CommandError(f'Server at {base_url} did not start')
+
+    def report(self, stats, elapsed):
+        total = sum(len(v) for v in stats.latencies.values())
+        self.stdout.write(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)\n")
+        self.stdout.write(f"{'endpoint':18} {'count':>6} {'errors':>6} {'rps':>7} "
+                          f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for endpoint, latencies in sorted(stats.latencies.items()):
+            ordered = sorted(latencies)
+            errors = sum(stats.errors[endpoint].values())
+            self.stdout.write(
+                f"{endpoint:18} {len(ordered):6} {errors:6} {len(ordered) / elapsed:7.1f} "
+                f"{percentile(ordered, 50) * 1000:8.1f} {percentile(ordered, 90) * 1000:8.1f} "
+                f"{percentile(ordered, 99) * 1000:8.1f} {ordered[-1] * 1000:8.1f}"
+            )
+        for endpoint, errors in sorted(stats.errors.items()):
+            for message, count in errors.most_common(5):
+                self.stdout.write(self.style.WARNING(f"  {endpoint}: {count} x {message}"))
+
+    def verify(self, started_at, customers, hot_product=None, stock=0):
+        invoices = Invoice.objects.filter(branch_id=default_branch_id(), created_at__gte=started_at)
+        phones = [c['phone'] for c in customers]
+        self.stdout.write(f"\nChecking {invoices.count()} invoices created by this run:")
+
+        checks = check_invariants(
+            invoices=invoices,
+            customers=Customer.objects.filter(phone__in=phones),
+            products=Product.objects.filter(track_stock=True),
+        )
+        if hot_product:
+            checks.append(self.check_hot_product(hot_product, invoices, stock))
+        for check in checks:
+            style = self.style.SUCCESS if check.ok else self.style.ERROR
+            self.stdout.write(style(f"  {'✅' if check.ok else '❌'} {check}"))
+            for problem in check.problems[:5]:
+                self.stdout.write(f"      {problem}")
+
+        if not all(check.ok for check in checks):
+            raise CommandError('Invariant checks failed')
+
+    def check_hot_product(self, product, invoices, stock):
+        """The hot product's stock went down by exactly what was billed, and never past zero"""
+        sold = InvoiceItem.objects.filter(invoice__in=invoices, product=product).count()
+        left = Product.objects.filter(pk=product.pk).values_list('stock', flat=True).get()
+        problems = []
+        if left != stock - sold:
+            problems.append(f"{left} left, expected {stock} - {sold} sold")
+        if sold > stock:
+            problems.append(f"{sold} sold from a stock of {stock}")
+        return Check(f'stock of {product.name}', problems, note=f'{sold} sold, {left} left')
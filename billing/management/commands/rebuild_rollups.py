@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from billing.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the pre-aggregated daily sales buckets used by the analytics API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write('Rebuilding daily sales buckets...')
+        rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS('✅ Rollups rebuilt'))
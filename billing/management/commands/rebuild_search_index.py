@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from billing.search import backend, rebuild_index, search_invoice_ids
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text invoice search index, or time a query against it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', help='Run this search and report the timing instead of rebuilding')
+
+    def handle(self, *args, **options):
+        if backend() is None:
+            raise CommandError('This database backend has no invoice search index')
+
+        if options['query']:
+            started = time.perf_counter()
+            ids = search_invoice_ids(options['query'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{len(ids)} matches in {elapsed * 1000:.1f} ms")
+            return
+
+        self.stdout.write('Rebuilding invoice search index...')
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'✅ Indexed {count} invoices'))
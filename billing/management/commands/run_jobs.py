@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from billing.jobs import requeue_stale, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs queued from the admin (bulk mark paid, emails, exports, PDFs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run what is queued now, then exit')
+        parser.add_argument('--sleep', type=float, default=5, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=30, metavar='MINUTES',
+                            help='Requeue running jobs whose worker has sent no heartbeat for this long')
+
+    def handle(self, *args, **options):
+        while True:
+            requeued = requeue_stale(options['stale_after'])
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale jobs'))
+            ran = run_pending()
+            if ran:
+                self.stdout.write(self.style.SUCCESS(f'✅ Ran {ran} jobs'))
+            if options['once']:
+                return
+            if not ran:
+                time.sleep(options['sleep'])
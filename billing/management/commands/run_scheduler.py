@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from billing.models import Job, Schedule
+from billing.scheduler import Scheduler, job_stats, load_schedules
+
+
+class Command(BaseCommand):
+    help = ('Run periodic jobs from settings.SCHEDULES and anything queued from the admin, '
+            'with a concurrency limit; safe to run on several nodes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Queue what is due, run everything queued, then exit')
+        parser.add_argument('--concurrency', type=int, help='Jobs running at once (default SCHEDULER_CONCURRENCY)')
+        parser.add_argument('--run', metavar='NAME', help='Queue this schedule now, regardless of its cron')
+        parser.add_argument('--list', action='store_true', help='Show schedules and their next run')
+        parser.add_argument('--stats', action='store_true', help='Show job timings')
+        parser.add_argument('--days', type=int, default=7, help='Period covered by --stats')
+
+    def handle(self, *args, **options):
+        try:
+            schedules = load_schedules()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['list']:
+            return self.list_schedules(schedules)
+        if options['stats']:
+            return self.show_stats(options['days'])
+        if options['run']:
+            if options['run'] not in schedules:
+                raise CommandError(f"No schedule named '{options['run']}'")
+            _, kind, payload = schedules[options['run']]
+            job = Job.objects.create(kind=kind, payload=payload, requested_by=f"scheduler:{options['run']}")
+            self.stdout.write(self.style.SUCCESS(f'✅ Queued {job}'))
+            if not options['once']:
+                return
+
+        scheduler = Scheduler(concurrency=options['concurrency'])
+        if options['once']:
+            scheduler.drain()
+            self.stdout.write(self.style.SUCCESS('✅ Queue drained'))
+            return
+        self.stdout.write(f'Scheduler running {len(schedules)} schedules, '
+                          f'{scheduler.concurrency} jobs at a time (Ctrl+C to stop)')
+        try:
+            scheduler.run_forever(log=self.stdout.write)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped; waiting for running jobs to finish')
+
+    def list_schedules(self, schedules):
+        state = {s.name: s for s in Schedule.objects.select_related('last_job')}
+        self.stdout.write(f"{'name':20} {'cron':16} {'kind':16} {'next run':17} {'skipped':>7}  last result")
+        for name, (cron, kind, _) in schedules.items():
+            s = state.get(name)
+            next_run = timezone.localtime(s.next_run_at if s else cron.next_after(timezone.now()))
+            last = f"{s.last_job.status}: {s.last_job.result[:60]}" if s and s.last_job else '-'
+            self.stdout.write(f"{name:20} {cron.expression:16} {kind:16} {next_run:%Y-%m-%d %H:%M} "
+                              f"{s.skipped if s else 0:7}  {last}")
+
+    def show_stats(self, days):
+        stats = job_stats(timezone.now() - timedelta(days=days))
+        if not stats:
+            self.stdout.write(f'No jobs finished in the last {days} days')
+            return
+        self.stdout.write(f"{'kind':16} {'runs':>5} {'failed':>6} {'p50 s':>8} {'p95 s':>8} {'max s':>8} {'total s':>9}")
+        for row in stats:
+            self.stdout.write(f"{row['kind']:16} {row['runs']:5} {row['failed']:6} {row['p50']:8.2f} "
+                              f"{row['p95']:8.2f} {row['max']:8.2f} {row['total']:9.1f}")
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from billing.models import ReminderRun
+from billing.reminders import CHANNELS, due_for_reminder, run_reminders
+
+
+class Command(BaseCommand):
+    help = 'Send consolidated payment reminders (with statement PDF) for unpaid invoices past REMINDER_STAGES'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Select and render, but send nothing')
+        parser.add_argument('--limit', type=int, help='At most this many customers')
+        parser.add_argument('--date', help='Treat this day (YYYY-MM-DD) as today')
+        parser.add_argument('--channel', action='append', choices=sorted(CHANNELS),
+                            help='Channels to try, in order (default REMINDER_CHANNELS)')
+        parser.add_argument('--history', type=int, nargs='?', const=10, metavar='N',
+                            help='Show the last N runs instead')
+
+    def handle(self, *args, **options):
+        if options['history']:
+            self.stdout.write(f"{'started':17} {'dry':4} {'customers':>9} {'invoices':>8} {'sent':>5} "
+                              f"{'failed':>6} {'skipped':>7} {'seconds':>8} {'per min':>8}")
+            for run in ReminderRun.objects.all()[:options['history']]:
+                self.stdout.write(f"{run.started_at:%Y-%m-%d %H:%M} {'yes' if run.dry_run else 'no':4} "
+                                  f"{run.customers:9} {run.invoices:8} {run.sent:5} {run.failed:6} "
+                                  f"{run.skipped:7} {run.seconds:8.1f} {run.per_minute:8.1f}")
+            return
+
+        try:
+            today = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{due_for_reminder(today).count()} invoices due for a reminder")
+        run = run_reminders(today, dry_run=options['dry_run'], limit=options['limit'],
+                            channels=options['channel'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {run.customers} customers ({run.invoices} invoices): {run.sent} sent, {run.failed} failed, "
+            f"{run.skipped} skipped in {run.seconds:.1f}s ({run.customers * 60 / max(run.seconds, 1e-9):.0f} customers/min)"
+        ))
@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from billing.routers import REPLICA, replica_configured, replica_lag
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into the replica file (REPLICA_DB_NAME), '
+            'to try read/write splitting locally without a real replica')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, metavar='SECONDS',
+                            help='Keep copying at this interval, simulating replication lag')
+        parser.add_argument('--status', action='store_true', help='Only report the replica lag')
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('No replica configured; set REPLICA_DB_NAME')
+
+        if options['status']:
+            lag = replica_lag()
+            self.stdout.write('Replica lag: unknown' if lag is None else f'Replica lag: {lag:.1f}s')
+            return
+
+        primary, replica = connections['default'], connections[REPLICA]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite files; use real replication for other databases')
+
+        while True:
+            started = time.perf_counter()
+            self.copy(primary.settings_dict['NAME'], replica.settings_dict['NAME'])
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Replica synced in {(time.perf_counter() - started) * 1000:.0f} ms"
+            ))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def copy(self, source, target):
+        # The online backup API gives a consistent snapshot even while the
+        # primary is being written, and replica readers never see a torn file
+        with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+            src.backup(dst)
+        src.close()
+        dst.close()
@@ -0,0 +1,140 @@
+import json
+import mimetypes
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags
+
+from .branches import branch_for_request
+from .routers import PIN_COOKIE, primary_pinned
+
+
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+class StaticFile:
+    """One collected file, with its precompressed variants and response headers"""
+
+    def __init__(self, path, immutable):
+        self.path = path
+        self.variants = [(encoding, path.with_name(path.name + suffix)) for encoding, suffix in ENCODINGS
+                         if path.with_name(path.name + suffix).is_file()]
+        stat = path.stat()
+        content_type, _ = mimetypes.guess_type(path.name)
+        if content_type and content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        self.content_type = content_type or 'application/octet-stream'
+        self.tag = f'{stat.st_size:x}-{int(stat.st_mtime):x}'
+        self.headers = {
+            'Last-Modified': http_date(stat.st_mtime),
+            # Hashed names change whenever the content does, so they never expire
+            'Cache-Control': ('public, max-age=31536000, immutable' if immutable
+                              else f'public, max-age={settings.STATIC_MAX_AGE}'),
+        }
+        if self.variants:
+            self.headers['Vary'] = 'Accept-Encoding'
+
+    def etag(self, encoding):
+        """ETag of one representation: the gzip and brotli bodies differ from the file, so each gets its own"""
+        return f'"{self.tag}-{encoding}"' if encoding else f'"{self.tag}"'
+
+    def choose(self, accept_encoding):
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+        for encoding, path in self.variants:
+            if encoding in accepted:
+                return encoding, path
+        return None, self.path
+
+
+class StaticFilesMiddleware:
+    """Serve STATIC_ROOT directly from the app server, so no nginx is needed.
+
+    The files are indexed once at startup (they only change on deploy, with
+    collectstatic). Fingerprinted names get a one-year immutable
+    Cache-Control, and the .br/.gz files written by
+    CompressedManifestStaticFilesStorage are sent to clients that accept them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.files = self.scan(Path(settings.STATIC_ROOT))
+
+    def scan(self, root):
+        if not root.is_dir():
+            return {}
+        manifest = root / 'staticfiles.json'
+        hashed = set(json.loads(manifest.read_text())['paths'].values()) if manifest.is_file() else set()
+
+        files = {}
+        for path in root.rglob('*'):
+            if not path.is_file() or path.suffix in ('.gz', '.br') or path == manifest:
+                continue
+            name = path.relative_to(root).as_posix()
+            files[self.prefix + name] = StaticFile(path, immutable=name in hashed)
+        return files
+
+    def __call__(self, request):
+        static_file = self.files.get(request.path_info)
+        if static_file is None or request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+
+        encoding, path = static_file.choose(request.headers.get('Accept-Encoding', ''))
+        etag = static_file.etag(encoding)
+        # If-None-Match uses the weak comparison, so W/"..." matches too
+        if etag in {tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))}:
+            response = HttpResponseNotModified()
+        else:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=static_file.content_type)
+                response['Content-Length'] = path.stat().st_size
+            else:
+                response = FileResponse(path.open('rb'), content_type=static_file.content_type)
+                del response['Content-Disposition']
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        for header, value in static_file.headers.items():
+            response[header] = value
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Read-your-writes when reports are served from the read replica.
+
+    A request that writes (or any POST) gets a short-lived cookie that keeps
+    that browser's reads on the primary until the replica has caught up, so
+    a freshly generated invoice shows up in its next search or report.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        with primary_pinned(pinned_until > time.time()) as wrote:
+            response = self.get_response(request)
+            if wrote() or request.method not in self.SAFE_METHODS:
+                seconds = settings.REPLICA_MAX_LAG + settings.REPLICA_LAG_CHECK_INTERVAL
+                response.set_cookie(PIN_COOKIE, f'{time.time() + seconds:.0f}', max_age=int(seconds) + 1,
+                                    httponly=True, samesite='Lax')
+        return response
+
+
+class BranchMiddleware:
+    """Sets `request.branch`, the branch whose products, customers and invoices
+    this request works with (see billing.branches.branch_for_request)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.branch = branch_for_request(request)
+        return self.get_response(request)
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:14
+
+import re
+
+from django.db import migrations, models
+
+
+def backfill_identity_keys(apps, schema_editor):
+    """Key existing customers; the oldest row wins when emails/phones collide"""
+    Customer = apps.get_model('billing', 'Customer')
+    non_digits = re.compile(r'\D')
+
+    def identity_key(email, phone):
+        email = (email or '').strip().lower()
+        if email:
+            return f"e:{email}"
+        phone = non_digits.sub('', phone or '').lstrip('0')
+        if len(phone) == 12 and phone.startswith('91'):
+            phone = phone[2:]
+        return f"p:{phone}" if phone else None
+
+    seen = set()
+    batch = []
+    for customer in Customer.objects.order_by('pk').only('pk', 'email', 'phone').iterator(chunk_size=2000):
+        key = identity_key(customer.email, customer.phone)
+        if key is None or key in seen:
+            continue
+        seen.add(key)
+        customer.identity_key = key
+        batch.append(customer)
+        if len(batch) >= 2000:
+            Customer.objects.bulk_update(batch, ['identity_key'])
+            batch = []
+    if batch:
+        Customer.objects.bulk_update(batch, ['identity_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='identity_key',
+            field=models.CharField(blank=True, editable=False, max_length=260, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_identity_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:15
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_ledger(apps, schema_editor):
+    """Open the ledger with existing received amounts and per-customer balances"""
+    Invoice = apps.get_model('billing', 'Invoice')
+    Payment = apps.get_model('billing', 'Payment')
+    CustomerBalance = apps.get_model('billing', 'CustomerBalance')
+
+    payments = []
+    for invoice in Invoice.objects.filter(received_amount__gt=0).only(
+            'pk', 'customer_id', 'received_amount', 'invoice_date').iterator(chunk_size=2000):
+        payments.append(Payment(
+            invoice_id=invoice.pk,
+            customer_id=invoice.customer_id,
+            amount=invoice.received_amount,
+            paid_on=invoice.invoice_date,
+            notes='Received at billing',
+        ))
+        if len(payments) >= 2000:
+            Payment.objects.bulk_create(payments)
+            payments = []
+    if payments:
+        Payment.objects.bulk_create(payments)
+
+    rows = Invoice.objects.values('customer_id').annotate(
+        billed=models.Sum('grand_total'),
+        paid=models.Sum('received_amount'),
+    ).order_by()
+    CustomerBalance.objects.bulk_create([
+        CustomerBalance(
+            customer_id=row['customer_id'],
+            total_billed=row['billed'],
+            total_paid=row['paid'],
+            outstanding=row['billed'] - row['paid'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_customer_identity_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerBalance',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='billing.customer')),
+                ('total_billed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('outstanding', models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-outstanding'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('method', models.CharField(choices=[('CASH', 'Cash'), ('UPI', 'UPI'), ('CARD', 'Card'), ('BANK', 'Bank Transfer'), ('CHEQUE', 'Cheque')], default='CASH', max_length=10)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('paid_on', models.DateField()),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='billing.customer')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='billing.invoice')),
+            ],
+            options={
+                'ordering': ['-paid_on', '-id'],
+                'indexes': [models.Index(fields=['customer', 'paid_on'], name='billing_pay_custome_bbbdd1_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    """Aggregate existing invoices into the daily buckets"""
+    Invoice = apps.get_model('billing', 'Invoice')
+    InvoiceItem = apps.get_model('billing', 'InvoiceItem')
+    DailySales = apps.get_model('billing', 'DailySales')
+    DailyProductSales = apps.get_model('billing', 'DailyProductSales')
+    DailyCustomerSales = apps.get_model('billing', 'DailyCustomerSales')
+    Sum = models.Sum
+
+    DailySales.objects.bulk_create([
+        DailySales(date=row['invoice_date'], invoice_count=row['n'], subtotal=row['subtotal'],
+                   tax=row['tax'], discount=row['discount'], revenue=row['revenue'])
+        for row in Invoice.objects.values('invoice_date').annotate(
+            n=models.Count('id'), subtotal=Sum('subtotal'), tax=Sum('total_tax'),
+            discount=Sum('discount'), revenue=Sum('grand_total'),
+        ).order_by()
+    ], batch_size=1000)
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(date=row['invoice__invoice_date'], product_id=row['product_id'],
+                          quantity=row['quantity'], revenue=row['revenue'])
+        for row in InvoiceItem.objects.values('invoice__invoice_date', 'product_id').annotate(
+            quantity=Sum('quantity'), revenue=Sum('amount'),
+        ).order_by()
+    ], batch_size=1000)
+    DailyCustomerSales.objects.bulk_create([
+        DailyCustomerSales(date=row['invoice_date'], customer_id=row['customer_id'],
+                           invoice_count=row['n'], revenue=row['revenue'])
+        for row in Invoice.objects.values('invoice_date', 'customer_id').annotate(
+            n=models.Count('id'), revenue=Sum('grand_total'),
+        ).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_payment_customerbalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCustomerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'daily customer sales',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'daily product sales',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'daily sales',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_date'], name='billing_inv_invoice_2a056e_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='billing.product'),
+        ),
+        migrations.AddField(
+            model_name='dailycustomersales',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='billing.customer'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='unique_daily_product_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycustomersales',
+            constraint=models.UniqueConstraint(fields=('date', 'customer'), name='unique_daily_customer_sales'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
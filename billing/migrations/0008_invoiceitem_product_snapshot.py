@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def snapshot_existing_lines(apps, schema_editor):
+    """Copy product details onto existing invoice lines in one UPDATE"""
+    InvoiceItem = apps.get_model('billing', 'InvoiceItem')
+    Product = apps.get_model('billing', 'Product')
+
+    def product_field(name):
+        return models.Subquery(Product.objects.filter(pk=models.OuterRef('product_id')).values(name)[:1])
+
+    InvoiceItem.objects.filter(product__isnull=False).update(
+        product_name=product_field('name'),
+        product_unit=product_field('unit'),
+        product_category=product_field('category'),
+        hsn_code=product_field('hsn_code'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='hsn_code',
+            field=models.CharField(blank=True, max_length=8, verbose_name='HSN code'),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='product_category',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='product_unit',
+            field=models.CharField(blank=True, choices=[('KG', 'Kilogram'), ('PIECE', 'Piece'), ('LITER', 'Liter'), ('METER', 'Meter'), ('BOX', 'Box'), ('DOZEN', 'Dozen')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='hsn_code',
+            field=models.CharField(blank=True, max_length=8, verbose_name='HSN code'),
+        ),
+        migrations.AlterField(
+            model_name='invoiceitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='billing.product'),
+        ),
+        migrations.RunPython(snapshot_existing_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+def digits_only(phone):
+    digits = ''.join(ch for ch in phone or '' if ch.isdigit()).lstrip('0')
+    if len(digits) == 12 and digits.startswith('91'):
+        digits = digits[2:]
+    return digits
+
+
+def create_search_index(apps, schema_editor):
+    """Create the FTS5 / tsvector search table and index every existing invoice"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS billing_invoice_fts USING fts5("
+            "invoice_number, customer_name, phone, email, gstin, notes, "
+            "tokenize='unicode61', prefix='2 3')"
+        )
+        insert = (
+            "INSERT INTO billing_invoice_fts "
+            "(rowid, invoice_number, customer_name, phone, email, gstin, notes) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS billing_invoice_search ("
+            "invoice_id bigint PRIMARY KEY REFERENCES billing_invoice(id) ON DELETE CASCADE "
+            "DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS billing_invoice_search_document_gin "
+            "ON billing_invoice_search USING GIN (document)"
+        )
+        insert = (
+            "INSERT INTO billing_invoice_search (invoice_id, document) VALUES (%s, "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s || ' ' || %s || ' ' || %s || ' ' || %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'C'))"
+        )
+    else:
+        return
+
+    Invoice = apps.get_model('billing', 'Invoice')
+    rows = Invoice.objects.order_by('pk').values_list(
+        'pk', 'invoice_number', 'customer__name', 'customer__phone', 'customer__email',
+        'customer__gstin', 'notes',
+    ).iterator(chunk_size=2000)
+
+    batch = []
+    with schema_editor.connection.cursor() as cursor:
+        for pk, number, name, phone, email, gstin, notes in rows:
+            phone = f"{phone} {digits_only(phone)}".strip()
+            batch.append((pk, number, name, phone, email or '', gstin, notes))
+            if len(batch) >= 2000:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS billing_invoice_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS billing_invoice_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_invoiceitem_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:05
+
+import billing.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BRANCH_MODELS = ['product', 'customer', 'invoice', 'invoicesequence']
+
+
+def assign_default_branch(apps, schema_editor):
+    """Create the default branch from the COMPANY_* settings and move all existing data into it"""
+    Branch = apps.get_model('billing', 'Branch')
+    branch, _ = Branch.objects.get_or_create(code=settings.DEFAULT_BRANCH, defaults={
+        'name': settings.COMPANY_NAME,
+        'address': settings.COMPANY_ADDRESS,
+        'phone': settings.COMPANY_PHONE,
+        'gstin': settings.COMPANY_GSTIN,
+        'pan': settings.COMPANY_PAN,
+        'state': settings.COMPANY_STATE,
+    })
+    for name in BRANCH_MODELS:
+        apps.get_model('billing', name).objects.filter(branch__isnull=True).update(branch=branch)
+
+
+def branch_field(related_name, on_delete=django.db.models.deletion.PROTECT, **kwargs):
+    return models.ForeignKey(on_delete=on_delete, related_name=related_name, to='billing.branch', **kwargs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0012_payment_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('address', models.CharField(blank=True, max_length=300)),
+                ('phone', models.CharField(blank=True, max_length=20)),
+                ('gstin', models.CharField(blank=True, max_length=15)),
+                ('pan', models.CharField(blank=True, max_length=10)),
+                ('state', models.CharField(blank=True, max_length=100)),
+                ('invoice_prefix', models.CharField(default='S', max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'branches',
+                'ordering': ['name'],
+            },
+        ),
+        # Nullable first, filled with the default branch, then made required
+        migrations.AddField(model_name='product', name='branch', field=branch_field('products', null=True)),
+        migrations.AddField(model_name='customer', name='branch', field=branch_field('customers', null=True)),
+        migrations.AddField(model_name='invoice', name='branch', field=branch_field('invoices', null=True)),
+        migrations.AddField(
+            model_name='invoicesequence', name='branch',
+            field=branch_field('sequences', on_delete=django.db.models.deletion.CASCADE, null=True),
+        ),
+        migrations.RunPython(assign_default_branch, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product', name='branch',
+            field=branch_field('products', default=billing.models.default_branch_id),
+        ),
+        migrations.AlterField(
+            model_name='customer', name='branch',
+            field=branch_field('customers', default=billing.models.default_branch_id),
+        ),
+        migrations.AlterField(
+            model_name='invoice', name='branch',
+            field=branch_field('invoices', default=billing.models.default_branch_id),
+        ),
+        migrations.AlterField(
+            model_name='invoicesequence', name='branch',
+            field=branch_field('sequences', on_delete=django.db.models.deletion.CASCADE,
+                               default=billing.models.default_branch_id),
+        ),
+        # Uniqueness moves from global to per branch
+        migrations.AlterField(
+            model_name='customer',
+            name='identity_key',
+            field=models.CharField(blank=True, editable=False, max_length=260, null=True),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='invoice_number',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='invoicesequence',
+            name='prefix',
+            field=models.CharField(max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(fields=('branch', 'identity_key'), name='unique_branch_customer_identity'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('branch', 'invoice_number'), name='unique_branch_invoice_number'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoicesequence',
+            constraint=models.UniqueConstraint(fields=('branch', 'prefix'), name='unique_branch_sequence_prefix'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['branch', 'is_active', 'name'], name='product_branch_active_name'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['branch', 'name'], name='customer_branch_name'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['branch', 'invoice_date'], name='invoice_branch_date'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['branch', '-created_at'], name='invoice_branch_created'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:10
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def seed_prices(apps, schema_editor):
+    """Start each product's history with its current price, from the day it was created"""
+    Product = apps.get_model('billing', 'Product')
+    ProductPrice = apps.get_model('billing', 'ProductPrice')
+    ProductPrice.objects.bulk_create([
+        ProductPrice(product_id=pk, effective_from=timezone.localdate(created_at),
+                     price_per_unit=price, tax_percentage=tax)
+        for pk, created_at, price, tax in Product.objects.values_list(
+            'pk', 'created_at', 'price_per_unit', 'tax_percentage').iterator(chunk_size=2000)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0014_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('effective_from', models.DateField()),
+                ('price_per_unit', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('tax_percentage', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='billing.product')),
+            ],
+            options={
+                'ordering': ['product', '-effective_from'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productprice',
+            constraint=models.UniqueConstraint(fields=('product', 'effective_from'), name='unique_product_price_date'),
+        ),
+        migrations.RunPython(seed_prices, migrations.RunPython.noop),
+    ]
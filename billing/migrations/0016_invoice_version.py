@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0015_product_prices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:10
+
+import billing.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def rebuild_by_branch(apps, schema_editor):
+    """Re-aggregate the daily buckets from invoices, one set per branch"""
+    Invoice = apps.get_model('billing', 'Invoice')
+    InvoiceItem = apps.get_model('billing', 'InvoiceItem')
+    DailySales = apps.get_model('billing', 'DailySales')
+    DailyProductSales = apps.get_model('billing', 'DailyProductSales')
+    DailyCustomerSales = apps.get_model('billing', 'DailyCustomerSales')
+    Sum = models.Sum
+
+    for model in (DailySales, DailyProductSales, DailyCustomerSales):
+        model.objects.all().delete()
+
+    DailySales.objects.bulk_create([
+        DailySales(branch_id=row['branch_id'], date=row['invoice_date'], invoice_count=row['n'],
+                   subtotal=row['subtotal'], tax=row['tax'], discount=row['discount'], revenue=row['revenue'])
+        for row in Invoice.objects.values('branch_id', 'invoice_date').annotate(
+            n=models.Count('id'), subtotal=Sum('subtotal'), tax=Sum('total_tax'),
+            discount=Sum('discount'), revenue=Sum('grand_total'),
+        ).order_by()
+    ], batch_size=1000)
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(branch_id=row['invoice__branch_id'], date=row['invoice__invoice_date'],
+                          product_id=row['product_id'], quantity=row['quantity'], revenue=row['revenue'])
+        for row in InvoiceItem.objects.filter(product__isnull=False).values(
+            'invoice__branch_id', 'invoice__invoice_date', 'product_id',
+        ).annotate(quantity=Sum('quantity'), revenue=Sum('amount')).order_by()
+    ], batch_size=1000)
+    DailyCustomerSales.objects.bulk_create([
+        DailyCustomerSales(branch_id=row['branch_id'], date=row['invoice_date'], customer_id=row['customer_id'],
+                           invoice_count=row['n'], revenue=row['revenue'])
+        for row in Invoice.objects.values('branch_id', 'invoice_date', 'customer_id').annotate(
+            n=models.Count('id'), revenue=Sum('grand_total'),
+        ).order_by()
+    ], batch_size=1000)
+
+
+def branch_field(related_name, **kwargs):
+    return models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name=related_name,
+                             to='billing.branch', **kwargs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0018_job_heartbeat_at'),
+    ]
+
+    operations = [
+        # Buckets are kept per branch, so a day or product is only unique within one
+        migrations.AlterField(
+            model_name='dailysales',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyproductsales',
+            name='unique_daily_product_sales',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailycustomersales',
+            name='unique_daily_customer_sales',
+        ),
+        # Nullable first, rebuilt per branch, then made required
+        migrations.AddField(model_name='dailysales', name='branch', field=branch_field('daily_sales', null=True)),
+        migrations.AddField(
+            model_name='dailyproductsales', name='branch', field=branch_field('daily_product_sales', null=True),
+        ),
+        migrations.AddField(
+            model_name='dailycustomersales', name='branch', field=branch_field('daily_customer_sales', null=True),
+        ),
+        migrations.RunPython(rebuild_by_branch, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dailysales', name='branch',
+            field=branch_field('daily_sales', default=billing.models.default_branch_id),
+        ),
+        migrations.AlterField(
+            model_name='dailyproductsales', name='branch',
+            field=branch_field('daily_product_sales', default=billing.models.default_branch_id),
+        ),
+        migrations.AlterField(
+            model_name='dailycustomersales', name='branch',
+            field=branch_field('daily_customer_sales', default=billing.models.default_branch_id),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('branch', 'date'), name='unique_branch_daily_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('branch', 'date', 'product'),
+                                               name='unique_branch_daily_product_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycustomersales',
+            constraint=models.UniqueConstraint(fields=('branch', 'date', 'customer'),
+                                               name='unique_branch_daily_customer_sales'),
+        ),
+    ]
@@ -1,8 +1,67 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from django.core.validators import MinValueValidator
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.conf import settings
 from decimal import Decimal
 
 
+class Branch(models.Model):
+    """Model for one branch (tenant): its own GST identity, catalogue, customers and invoice series"""
+    code = models.CharField(max_length=20, unique=True)
+    name = models.CharField(max_length=200)
+    address = models.CharField(max_length=300, blank=True)
+    phone = models.CharField(max_length=20, blank=True)
+    gstin = models.CharField(max_length=15, blank=True)
+    pan = models.CharField(max_length=10, blank=True)
+    # Used to split GST into CGST+SGST (same state) or IGST (other states)
+    state = models.CharField(max_length=100, blank=True)
+    invoice_prefix = models.CharField(max_length=10, default='S')
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'branches'
+    
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+    
+    @classmethod
+    def get_default(cls):
+        """The DEFAULT_BRANCH branch, created from the COMPANY_* settings on first use.
+
+        Read first: get_or_create is routed as a write, which would pin every
+        request on the default branch to the primary (see ReplicaPinMiddleware).
+        """
+        branch = cls.objects.filter(code=settings.DEFAULT_BRANCH).first()
+        if branch is not None:
+            return branch
+        branch, _ = cls.objects.get_or_create(code=settings.DEFAULT_BRANCH, defaults={
+            'name': settings.COMPANY_NAME,
+            'address': settings.COMPANY_ADDRESS,
+            'phone': settings.COMPANY_PHONE,
+            'gstin': settings.COMPANY_GSTIN,
+            'pan': settings.COMPANY_PAN,
+            'state': settings.COMPANY_STATE,
+        })
+        return branch
+
+
+_default_branch_ids = {}
+
+
+def default_branch_id():
+    """Primary key of the default branch; rows created without a branch belong to it"""
+    code = settings.DEFAULT_BRANCH
+    if code not in _default_branch_ids:
+        pk = Branch.objects.filter(code=code).values_list('pk', flat=True).first()
+        _default_branch_ids[code] = pk if pk is not None else Branch.get_default().pk
+    return _default_branch_ids[code]
+
+
 class Product(models.Model):
     """Model for storing product/item information"""
     UNIT_CHOICES = [
@@ -14,9 +73,14 @@ class Product(models.Model):
         ('DOZEN', 'Dozen'),
     ]
     
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='products', default=default_branch_id)
+    # Supplier/stock-keeping code; unique per branch when set, and the key catalogue imports match on
+    sku = models.CharField('SKU', max_length=50, blank=True, default='')
     name = models.CharField(max_length=200)
     category = models.CharField(max_length=100, blank=True)
+    hsn_code = models.CharField('HSN code', max_length=8, blank=True)
     unit = models.CharField(max_length=10, choices=UNIT_CHOICES, default='PIECE')
+    # Price and tax as of today; the dated history lives in ProductPrice (see billing.pricing)
     price_per_unit = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
@@ -29,15 +93,41 @@ class Product(models.Model):
         validators=[MinValueValidator(Decimal('0.00'))]
     )
     is_active = models.BooleanField(default=True)
+    
+    # Stock is only kept (and enforced at checkout) for products that track it;
+    # it changes through billing.stock only, which records a StockMovement each time
+    track_stock = models.BooleanField(default=False)
+    stock = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    reorder_level = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['branch', 'is_active', 'name'], name='product_branch_active_name'),
+            # Holds only the products at or below their reorder level
+            models.Index(fields=['branch', 'stock'], name='product_low_stock',
+                         condition=models.Q(track_stock=True, stock__lte=F('reorder_level'))),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(track_stock=False) | models.Q(stock__gte=0),
+                                   name='product_stock_not_negative'),
+            models.UniqueConstraint(fields=['branch', 'sku'], condition=~models.Q(sku=''),
+                                    name='unique_branch_product_sku'),
+        ]
     
     def __str__(self):
         return f"{self.name} - Rs. {self.price_per_unit}/{self.unit}"
     
+    def save(self, *args, **kwargs):
+        """Override save so editing a product never writes back a stale stock level"""
+        if self.pk is not None and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != 'stock']
+        super().save(*args, **kwargs)
+    
     def get_tax_amount(self, quantity):
         """Calculate tax amount for given quantity"""
         base_amount = self.price_per_unit * Decimal(quantity)
@@ -50,8 +140,36 @@ class Product(models.Model):
         return base_amount + tax_amount
 
 
+class ProductPrice(models.Model):
+    """Model for a product's price and tax rate from a date onwards (effective-dated history)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='prices')
+    effective_from = models.DateField()
+    price_per_unit = models.DecimalField(
+        max_digits=10, 
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+    tax_percentage = models.DecimalField(
+        max_digits=5, 
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.00'))]
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['product', '-effective_from']
+        constraints = [
+            # Also the index behind "latest price on or before a date"
+            models.UniqueConstraint(fields=['product', 'effective_from'], name='unique_product_price_date'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id}: Rs. {self.price_per_unit} + {self.tax_percentage}% from {self.effective_from}"
+
+
 class Customer(models.Model):
     """Model for storing customer information"""
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='customers', default=default_branch_id)
     name = models.CharField(max_length=200)
     email = models.EmailField(max_length=254, blank=True, null=True)
     phone = models.CharField(max_length=15, blank=True)
@@ -62,15 +180,49 @@ class Customer(models.Model):
     pan_number = models.CharField(max_length=10, blank=True)
     gstin = models.CharField(max_length=15, blank=True)
     place_of_supply = models.CharField(max_length=100)
+    # Normalized email ("e:...") or phone ("p:...") used to find returning customers
+    identity_key = models.CharField(max_length=260, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['branch', 'name'], name='customer_branch_name'),
+        ]
+        constraints = [
+            # A returning customer is only recognised within the same branch
+            models.UniqueConstraint(fields=['branch', 'identity_key'], name='unique_branch_customer_identity'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.email or self.phone}"
     
+    def _checked_identity_key(self):
+        """The identity key for the current email/phone; ValidationError if another customer has it"""
+        from .customers import customer_identity_key
+        
+        key = customer_identity_key(self.email, self.phone)
+        if not key or key == self.identity_key:
+            return key
+        other = Customer.objects.filter(branch_id=self.branch_id, identity_key=key).exclude(pk=self.pk).first()
+        if other is None:
+            return key
+        if self.pk is not None and self.identity_key is None:
+            # A legacy duplicate that was already unkeyed stays that way
+            return None
+        field, label = ('email', 'email') if key.startswith('e:') else ('phone', 'phone number')
+        raise ValidationError({field: f"{other.name} (customer #{other.pk}) already has this {label} in this branch"})
+    
+    def clean(self):
+        super().clean()
+        self._checked_identity_key()
+    
+    def save(self, *args, **kwargs):
+        """Override save to keep the identity key in step with email/phone"""
+        self.identity_key = self._checked_identity_key()
+        super().save(*args, **kwargs)
+    
     def get_full_address(self):
         """Return formatted full address"""
         return f"{self.address}, {self.city}, {self.state}, {self.pincode}"
@@ -78,7 +230,9 @@ class Customer(models.Model):
 
 class Invoice(models.Model):
     """Model for storing invoice/bill information"""
-    invoice_number = models.CharField(max_length=50, unique=True)
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='invoices', default=default_branch_id)
+    # Unique per branch: each branch has its own number series
+    invoice_number = models.CharField(max_length=50)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='invoices')
     invoice_date = models.DateField()
     
@@ -102,11 +256,30 @@ class Invoice(models.Model):
     email_sent = models.BooleanField(default=False)
     email_sent_at = models.DateTimeField(null=True, blank=True)
     
+    # Payment reminders: how many of REMINDER_STAGES have been sent
+    reminder_stage = models.PositiveSmallIntegerField(default=0)
+    last_reminded_at = models.DateTimeField(null=True, blank=True)
+    
+    # Bumped by every edit of the lines or discount; edits name the version
+    # they were made against, so two editors can't overwrite each other
+    version = models.PositiveIntegerField(default=1)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-invoice_date', '-invoice_number']
+        indexes = [
+            models.Index(fields=['invoice_date']),
+            # Only unpaid invoices, so reminder runs don't scan the paid history
+            models.Index(fields=['invoice_date'], condition=models.Q(due_balance__gt=0), name='invoice_unpaid_date'),
+            # Branch screens (reports by date, newest first lists) stay inside their branch
+            models.Index(fields=['branch', 'invoice_date'], name='invoice_branch_date'),
+            models.Index(fields=['branch', '-created_at'], name='invoice_branch_created'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'invoice_number'], name='unique_branch_invoice_number'),
+        ]
     
     def __str__(self):
         return f"Invoice #{self.invoice_number} - {self.customer.name}"
@@ -122,13 +295,20 @@ class Invoice(models.Model):
         self.grand_total = total_before_discount - self.discount
         self.due_balance = self.grand_total - self.received_amount
         
-        self.save()
+        self.save(update_fields=['subtotal', 'total_tax', 'grand_total', 'due_balance', 'updated_at'])
 
 
 class InvoiceItem(models.Model):
     """Model for storing individual items in an invoice"""
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    # Snapshot of the product at billing time; invoices never read the catalogue again
+    product_name = models.CharField(max_length=200, blank=True)
+    product_unit = models.CharField(max_length=10, choices=Product.UNIT_CHOICES, blank=True)
+    product_category = models.CharField(max_length=100, blank=True)
+    hsn_code = models.CharField('HSN code', max_length=8, blank=True)
+    
     quantity = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
@@ -140,7 +320,14 @@ class InvoiceItem(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     
     def __str__(self):
-        return f"{self.product.name} x {self.quantity}"
+        return f"{self.product_name} x {self.quantity}"
+    
+    def snapshot_product(self, product):
+        """Copy the product details shown on the invoice onto this line"""
+        self.product_name = product.name
+        self.product_unit = product.unit
+        self.product_category = product.category
+        self.hsn_code = product.hsn_code
     
     def get_base_amount(self):
         """Calculate amount without tax"""
@@ -150,15 +337,349 @@ class InvoiceItem(models.Model):
         """Calculate tax per unit"""
         return (self.price_per_unit * self.tax_percentage) / Decimal('100')
     
+    def calculate_amounts(self):
+        """Calculate tax amount and line amount from price, tax rate and quantity"""
+        base_amount = self.get_base_amount()
+        self.tax_amount = (base_amount * self.tax_percentage) / Decimal('100')
+        self.amount = base_amount + self.tax_amount
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        item = super().from_db(db, field_names, values)
+        # Remembered so save() can tell when the line was switched to another product
+        item._loaded_product_id = item.product_id
+        return item
+    
     def save(self, *args, **kwargs):
         """Override save to auto-calculate amounts"""
-        # Store current product values
-        self.price_per_unit = self.product.price_per_unit
-        self.tax_percentage = self.product.tax_percentage
+        product_changed = (not self._state.adding
+                           and self.product_id != getattr(self, '_loaded_product_id', self.product_id))
+        if self.product_id is not None:
+            # Priced once, as of the invoice date; later saves keep the stored
+            # price unless the line now points at a different product
+            if product_changed or self.price_per_unit is None or self.tax_percentage is None:
+                from .pricing import price_on
+                self.price_per_unit, self.tax_percentage = price_on(self.product_id, self.invoice.invoice_date)
+            if product_changed or not self.product_name:
+                self.snapshot_product(self.product)
+        if product_changed and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {
+                'product', 'product_name', 'product_unit', 'product_category', 'hsn_code',
+                'price_per_unit', 'tax_percentage', 'tax_amount', 'amount'}
         
         # Calculate amounts
-        base_amount = self.get_base_amount()
-        self.tax_amount = (base_amount * self.tax_percentage) / Decimal('100')
-        self.amount = base_amount + self.tax_amount
+        self.calculate_amounts()
         
         super().save(*args, **kwargs)
+        self._loaded_product_id = self.product_id
+
+
+class InvoiceSequence(models.Model):
+    """Model for allocating invoice numbers, one counter per branch and prefix"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='sequences', default=default_branch_id)
+    prefix = models.CharField(max_length=10)
+    last_number = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'prefix'], name='unique_branch_sequence_prefix'),
+        ]
+    
+    def __str__(self):
+        return f"{self.branch_id}/{self.prefix} (last: {self.last_number})"
+    
+    @staticmethod
+    def format_number(prefix, number):
+        """Format an invoice number the way the billing screen always has (S01, S02, ...)"""
+        return f"{prefix}{number:02d}"
+    
+    @classmethod
+    def _ensure(cls, prefix, branch_id):
+        """Create the counter for a prefix, seeded from the branch's existing invoice numbers"""
+        if cls.objects.filter(branch_id=branch_id, prefix=prefix).exists():
+            return
+        
+        last_number = 0
+        numbers = Invoice.objects.filter(branch_id=branch_id, invoice_number__startswith=prefix)
+        for number in numbers.values_list('invoice_number', flat=True):
+            try:
+                last_number = max(last_number, int(number[len(prefix):]))
+            except ValueError:
+                continue
+        
+        try:
+            with transaction.atomic():
+                cls.objects.create(branch_id=branch_id, prefix=prefix, last_number=last_number)
+        except IntegrityError:
+            # Another worker created it first
+            pass
+    
+    @classmethod
+    def allocate(cls, prefix='S', count=1, branch=None):
+        """Reserve a block of `count` consecutive invoice numbers in a branch (default: the default branch)"""
+        branch_id = branch.pk if branch is not None else default_branch_id()
+        counter = cls.objects.filter(branch_id=branch_id, prefix=prefix)
+        
+        with transaction.atomic():
+            # Increment first so the row is write-locked before it is read back.
+            # Inside a caller's transaction this keeps the write lock ahead of
+            # every read, which SQLite needs to queue writers instead of failing
+            if not counter.update(last_number=F('last_number') + count):
+                cls._ensure(prefix, branch_id)
+                counter.update(last_number=F('last_number') + count)
+            last_number = counter.values_list('last_number', flat=True).get()
+        
+        first_number = last_number - count + 1
+        return [cls.format_number(prefix, n) for n in range(first_number, last_number + 1)]
+
+
+class Payment(models.Model):
+    """Model for storing payments received against invoices (append-only ledger)"""
+    METHOD_CHOICES = [
+        ('CASH', 'Cash'),
+        ('UPI', 'UPI'),
+        ('CARD', 'Card'),
+        ('BANK', 'Bank Transfer'),
+        ('CHEQUE', 'Cheque'),
+    ]
+    
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='payments')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='payments')
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+    method = models.CharField(max_length=10, choices=METHOD_CHOICES, default='CASH')
+    reference = models.CharField(max_length=100, blank=True)
+    paid_on = models.DateField()
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-paid_on', '-id']
+        indexes = [
+            models.Index(fields=['customer', 'paid_on']),
+        ]
+    
+    def __str__(self):
+        return f"Rs. {self.amount} against Invoice #{self.invoice_id} on {self.paid_on}"
+    
+    def save(self, *args, **kwargs):
+        """Payments are never edited; record a new entry instead"""
+        if self.pk is not None:
+            raise ValueError("Payments are append-only and cannot be modified")
+        super().save(*args, **kwargs)
+
+
+class StockMovement(models.Model):
+    """Model for every change to a product's stock (append-only ledger)"""
+    SALE = 'sale'
+    RECEIPT = 'receipt'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (SALE, 'Sale'),
+        (RECEIPT, 'Receipt'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    change = models.DecimalField(max_digits=12, decimal_places=2)
+    # Stock right after this movement
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    invoice = models.ForeignKey(Invoice, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['product', '-id'], name='stockmovement_product'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.change:+} of product {self.product_id} (now {self.balance})"
+    
+    def save(self, *args, **kwargs):
+        """Movements are never edited; record a correcting adjustment instead"""
+        if self.pk is not None:
+            raise ValueError("Stock movements are append-only and cannot be modified")
+        super().save(*args, **kwargs)
+
+
+class CustomerBalance(models.Model):
+    """Model for each customer's running balance, updated incrementally"""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    total_billed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=14, decimal_places=2, default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-outstanding']
+    
+    def __str__(self):
+        return f"{self.customer_id}: Rs. {self.outstanding} outstanding"
+
+
+class DailySales(models.Model):
+    """Pre-aggregated sales totals for one branch and day, maintained as invoices are created"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='daily_sales', default=default_branch_id)
+    date = models.DateField()
+    invoice_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'date'], name='unique_branch_daily_sales'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date}: {self.invoice_count} invoices, Rs. {self.revenue}"
+
+
+class DailyProductSales(models.Model):
+    """Pre-aggregated quantity and revenue per product per day, within a branch"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='daily_product_sales',
+                               default=default_branch_id)
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'date', 'product'], name='unique_branch_daily_product_sales'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date}: product {self.product_id} x {self.quantity}"
+
+
+class DailyCustomerSales(models.Model):
+    """Pre-aggregated invoice count and revenue per customer per day, within a branch"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='daily_customer_sales',
+                               default=default_branch_id)
+    date = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='daily_sales')
+    invoice_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'daily customer sales'
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'date', 'customer'], name='unique_branch_daily_customer_sales'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date}: customer {self.customer_id}, Rs. {self.revenue}"
+
+
+class Job(models.Model):
+    """Model for background work queued from the admin and run by `run_jobs`"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    result = models.TextField(blank=True)
+    requested_by = models.CharField(max_length=150, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs; a stale one means the worker died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Job #{self.pk} {self.kind} ({self.status})"
+
+
+class Schedule(models.Model):
+    """Model for the run state of one periodic job from settings.SCHEDULES"""
+    name = models.CharField(max_length=50, unique=True)
+    cron = models.CharField(max_length=100)
+    next_run_at = models.DateTimeField()
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_job = models.ForeignKey(Job, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    skipped = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.cron}), next {self.next_run_at:%Y-%m-%d %H:%M}"
+
+
+class ReminderRun(models.Model):
+    """Model for one payment reminder run and its throughput"""
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    dry_run = models.BooleanField(default=False)
+    customers = models.PositiveIntegerField(default=0)
+    invoices = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    seconds = models.FloatField(default=0)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Reminder run {self.started_at:%Y-%m-%d %H:%M}: {self.sent} sent, {self.failed} failed"
+    
+    @property
+    def per_minute(self):
+        return self.sent * 60 / self.seconds if self.seconds else 0
+
+
+class ReminderMessage(models.Model):
+    """Model for one consolidated reminder to a customer"""
+    STATUS_CHOICES = [
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+    
+    run = models.ForeignKey(ReminderRun, on_delete=models.CASCADE, related_name='messages')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='reminders')
+    channel = models.CharField(max_length=10, blank=True)
+    stage = models.PositiveSmallIntegerField()
+    invoice_count = models.PositiveIntegerField()
+    amount_due = models.DecimalField(max_digits=14, decimal_places=2)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-id']
+    
+    def __str__(self):
+        return f"Reminder to {self.customer_id} via {self.channel or '-'}: {self.status}"
@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .caching import bump_version, get_version
+from .models import Product, ProductPrice
+
+
+PRICE_KEY = 'billing:price:{}:{}:{}'
+TWO_PLACES = Decimal('0.01')
+
+
+def prices_on(product_ids, day):
+    """{product_id: (price_per_unit, tax_percentage)} in effect on `day`.
+
+    Answers are cached per product and day until any price changes. Misses
+    cost one query, with one index probe on (product, effective_from) per
+    product. A product without history on that day is priced as of today.
+    """
+    product_ids = set(product_ids)
+    version = get_version('price')
+    keys = {PRICE_KEY.format(version, day.isoformat(), pk): pk for pk in product_ids}
+    prices = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+    missing = product_ids - prices.keys()
+    if missing:
+        history = ProductPrice.objects.filter(product=OuterRef('pk'), effective_from__lte=day).order_by('-effective_from')
+        rows = (Product.objects.filter(pk__in=missing)
+                .annotate(dated_price=Subquery(history.values('price_per_unit')[:1]),
+                          dated_tax=Subquery(history.values('tax_percentage')[:1]))
+                .values_list('pk', 'dated_price', 'dated_tax', 'price_per_unit', 'tax_percentage'))
+        found = {}
+        for pk, dated_price, dated_tax, price, tax in rows:
+            if dated_price is not None:
+                # Subquery values skip the column's rounding on some backends
+                price, tax = dated_price.quantize(TWO_PLACES), dated_tax.quantize(TWO_PLACES)
+            found[pk] = (price, tax)
+        cache.set_many({PRICE_KEY.format(version, day.isoformat(), pk): value for pk, value in found.items()},
+                       settings.PRICE_CACHE_TIMEOUT)
+        prices.update(found)
+    return prices
+
+
+def price_on(product_id, day):
+    """(price_per_unit, tax_percentage) of one product on `day`"""
+    return prices_on([product_id], day)[product_id]
+
+
+def apply_prices(products=None):
+    """Bring products' current price and tax up to date with their history; returns how many changed"""
+    products = Product.objects.filter(prices__isnull=False).distinct() if products is None else products
+    today = timezone.localdate()
+    current = {pk: (price, tax) for pk, price, tax in products.values_list('pk', 'price_per_unit', 'tax_percentage')}
+    changed = 0
+    for pk, (price, tax) in prices_on(current, today).items():
+        if current[pk] != (price, tax):
+            # update() leaves the stock column alone, like Product.save()
+            changed += Product.objects.filter(pk=pk).update(price_per_unit=price, tax_percentage=tax)
+    if changed:
+        bump_version('product')
+    return changed
+
+
+def set_price(product, price_per_unit, tax_percentage, effective_from=None):
+    """Record a price and tax for `product` from `effective_from` (default today) onwards.
+
+    Invoices dated before that keep the old price; a date in the future is
+    picked up by the daily `apply_prices` job.
+    """
+    effective_from = effective_from or timezone.localdate()
+    entry, _ = ProductPrice.objects.update_or_create(
+        product=product, effective_from=effective_from,
+        defaults={'price_per_unit': price_per_unit, 'tax_percentage': tax_percentage},
+    )
+    # The save signal only bumps once the transaction commits; don't let
+    # apply_prices read a price cached before this entry
+    bump_version('price')
+    apply_prices(Product.objects.filter(pk=product.pk))
+    return entry
@@ -0,0 +1,224 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Customer, Invoice, ReminderMessage, ReminderRun
+from .renderers import company_details
+from .statements import render_statement, statement_filename
+from .utils import build_email, email_connection, send_whatsapp_text
+
+
+def reminder_cutoffs(today):
+    """(stage, latest invoice date that has reached it), highest stage first"""
+    stages = enumerate(sorted(settings.REMINDER_STAGES), 1)
+    return [(stage, today - timedelta(days=days)) for stage, days in reversed(list(stages))]
+
+
+def due_for_reminder(today=None):
+    """Unpaid invoices past a reminder stage they haven't had yet, annotated with that `stage`.
+
+    The date filter plus `due_balance > 0` is answered by the partial
+    `invoice_unpaid_date` index, so paid history is never scanned.
+    """
+    cutoffs = reminder_cutoffs(today or timezone.localdate())
+    if not cutoffs:
+        return Invoice.objects.none()
+    stage = Case(*[When(invoice_date__lte=cutoff, then=Value(n)) for n, cutoff in cutoffs],
+                 default=Value(0), output_field=IntegerField())
+    return (Invoice.objects.filter(due_balance__gt=0, invoice_date__lte=cutoffs[-1][1])
+            .annotate(stage=stage).filter(stage__gt=F('reminder_stage')))
+
+
+def reminder_text(customer, invoices, total, attached=False):
+    """One consolidated reminder listing every unpaid invoice of the customer, signed by their branch"""
+    lines = '\n'.join(
+        f"- Invoice #{inv.invoice_number} dated {inv.invoice_date.strftime('%d %B %Y')}: Rs. {inv.due_balance} due"
+        for inv in invoices
+    )
+    statement = "Your statement of account is attached.\n\n" if attached else ''
+    return f"""
+Dear {customer.name},
+
+This is a friendly reminder that the following invoices are still unpaid:
+
+{lines}
+
+Total Due: Rs. {total}
+
+{statement}Please ignore this message if you have already paid. Thank you for your business!
+
+Best regards,
+{company_details(customer.branch)['name']} Team
+"""
+
+
+class EmailChannel:
+    """Reminders by email with the statement PDF; one SMTP session per batch"""
+    name = 'email'
+
+    def __init__(self):
+        self.server = None
+
+    def can_reach(self, customer):
+        return bool(customer.email)
+
+    def open(self):
+        self.server = email_connection()
+        return self.server is not None
+
+    def send(self, customer, invoices, total, today):
+        pdf = render_statement(customer, invoices, today).getvalue()
+        self.server.send_message(build_email(
+            customer.email,
+            f"Payment reminder: Rs. {total} due to {company_details(customer.branch)['name']}",
+            reminder_text(customer, invoices, total, attached=True),
+            [(statement_filename(customer, today), pdf)],
+        ))
+        return True
+
+    def close(self):
+        if self.server is not None:
+            self.server.quit()
+            self.server = None
+
+
+class WhatsAppChannel:
+    """Reminders as WhatsApp text messages, sharing one HTTP session per batch"""
+    name = 'whatsapp'
+
+    def __init__(self):
+        self.session = None
+
+    def can_reach(self, customer):
+        return bool(customer.phone)
+
+    def open(self):
+        if not (settings.WHATSAPP_PHONE_NUMBER_ID and settings.WHATSAPP_ACCESS_TOKEN):
+            return False
+        import requests
+        self.session = requests.Session()
+        return True
+
+    def send(self, customer, invoices, total, today):
+        return send_whatsapp_text(customer.phone, reminder_text(customer, invoices, total).strip(), self.session)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
+CHANNELS = {'email': EmailChannel, 'whatsapp': WhatsAppChannel}
+
+
+class Throttle:
+    """Spaces calls to at most `per_minute` (0 = unlimited)"""
+
+    def __init__(self, per_minute):
+        self.interval = 60 / per_minute if per_minute else 0
+        self.next_at = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def run_reminders(today=None, dry_run=False, limit=None, channels=None, log=None):
+    """Send one consolidated reminder per customer with invoices due for one; returns the ReminderRun.
+
+    Customers are handled in batches of REMINDER_BATCH_SIZE, each reusing one
+    connection per channel, at most REMINDER_PER_MINUTE messages a minute. An
+    invoice's stage only moves when its reminder was sent, so failures are
+    retried on the next run. A dry run renders everything but sends nothing.
+    """
+    today = today or timezone.localdate()
+    started = time.perf_counter()
+    run = ReminderRun.objects.create(dry_run=dry_run)
+
+    triggers = defaultdict(list)
+    for pk, customer_id, stage in due_for_reminder(today).order_by('customer_id').values_list('pk', 'customer_id', 'stage'):
+        if limit is None or customer_id in triggers or len(triggers) < limit:
+            triggers[customer_id].append((pk, stage))
+
+    customer_ids = list(triggers)
+    # Each customer's branch names the company in their reminder
+    customers = Customer.objects.select_related('branch').in_bulk(customer_ids)
+    unpaid = defaultdict(list)
+    for invoice in Invoice.objects.filter(customer_id__in=customer_ids, due_balance__gt=0).order_by('invoice_date', 'invoice_number'):
+        unpaid[invoice.customer_id].append(invoice)
+
+    order = [CHANNELS[name]() for name in (channels or settings.REMINDER_CHANNELS)]
+    throttle = Throttle(settings.REMINDER_PER_MINUTE)
+    counts = {'sent': 0, 'failed': 0, 'skipped': 0}
+    batch_size = settings.REMINDER_BATCH_SIZE
+
+    for start in range(0, len(customer_ids), batch_size):
+        opened = {}
+        messages, advanced = [], defaultdict(list)
+        for customer_id in customer_ids[start:start + batch_size]:
+            customer, invoices = customers[customer_id], unpaid[customer_id]
+            stage = max(s for _, s in triggers[customer_id])
+            total = sum((inv.due_balance for inv in invoices), Decimal('0'))
+            status, channel_name, error = 'skipped', '', 'No reachable channel'
+
+            for channel in order:
+                if not channel.can_reach(customer):
+                    continue
+                if channel.name not in opened:
+                    try:
+                        opened[channel.name] = dry_run or channel.open()
+                    except Exception as e:
+                        opened[channel.name] = False
+                        error = f"Could not connect to {channel.name}: {e}"
+                if not opened[channel.name]:
+                    continue
+                channel_name = channel.name
+                if dry_run:
+                    if channel.name == 'email':
+                        render_statement(customer, invoices, today)
+                    error = 'Dry run'
+                    break
+                throttle.wait()
+                try:
+                    ok = channel.send(customer, invoices, total, today)
+                    status, error = ('sent', '') if ok else ('failed', 'Rejected by provider')
+                except Exception as e:
+                    status, error = 'failed', f"{type(e).__name__}: {e}"
+                break
+
+            counts[status] += 1
+            messages.append(ReminderMessage(
+                run=run, customer_id=customer_id, channel=channel_name, stage=stage,
+                invoice_count=len(invoices), amount_due=total, status=status, error=error,
+            ))
+            if status == 'sent':
+                for pk, invoice_stage in triggers[customer_id]:
+                    advanced[invoice_stage].append(pk)
+
+        for channel in order:
+            if opened.get(channel.name) and not dry_run:
+                channel.close()
+        ReminderMessage.objects.bulk_create(messages)
+        now = timezone.now()
+        for stage, pks in advanced.items():
+            Invoice.objects.filter(pk__in=pks).update(reminder_stage=stage, last_reminded_at=now)
+        if log:
+            log(f"Batch {start // batch_size + 1}: {len(messages)} customers, "
+                f"{counts['sent']} sent / {counts['failed']} failed so far")
+
+    ReminderRun.objects.filter(pk=run.pk).update(
+        finished_at=timezone.now(),
+        customers=len(customer_ids),
+        invoices=sum(len(v) for v in triggers.values()),
+        seconds=time.perf_counter() - started,
+        **counts,
+    )
+    run.refresh_from_db()
+    return run
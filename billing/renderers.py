@@ -0,0 +1,484 @@
+import textwrap
+import time
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# ReportLab is imported inside the render methods (see billing.utils) so the
+# renderer registry itself costs nothing at startup.
+
+
+class RendererError(Exception):
+    """Raised for an unknown renderer name"""
+
+
+def company_details(branch=None):
+    """Header details for documents: the branch's own, or the COMPANY_* settings"""
+    if branch is not None:
+        return {
+            'name': branch.name,
+            'address': branch.address,
+            'phone': branch.phone,
+            'gstin': branch.gstin,
+            'pan': branch.pan,
+        }
+    return {
+        'name': getattr(settings, 'COMPANY_NAME', 'Vishubh BizBilling'),
+        'address': getattr(settings, 'COMPANY_ADDRESS', '40 Feet road, Pune, Maharashtra 411001'),
+        'phone': getattr(settings, 'COMPANY_PHONE', '+91 9890691272'),
+        'gstin': getattr(settings, 'COMPANY_GSTIN', '08AALCR2857A1ZD'),
+        'pan': getattr(settings, 'COMPANY_PAN', 'AVHPC9999A'),
+    }
+
+
+DEFAULT_NOTES = '1. No return deal'
+TERMS = ['1. Customer will pay the GST', '2. Customer will pay the Delivery charges',
+         '3. Pay due amount within 15 days']
+
+
+class InvoiceRenderer:
+    """Turns an invoice (or archived invoice) into a downloadable document"""
+
+    content_type = 'application/pdf'
+    extension = 'pdf'
+
+    def render(self, invoice):
+        """Return a BytesIO positioned at the start of the document"""
+        raise NotImplementedError
+
+    def filename(self, invoice):
+        return f"Invoice_{invoice.invoice_number}.{self.extension}"
+
+
+class PlatypusRenderer(InvoiceRenderer):
+    """The full A4 tax invoice laid out with ReportLab platypus flowables"""
+
+    def render(self, invoice):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.enums import TA_CENTER
+
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+
+        elements = []
+        styles = getSampleStyleSheet()
+
+        company_style = ParagraphStyle(
+            'Company',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+        )
+
+        # Title
+        elements.append(Paragraph("TAX INVOICE", styles['Heading2']))
+        elements.append(Spacer(1, 0.2*inch))
+
+        # Company details
+        company = company_details(getattr(invoice, 'branch', None))
+        elements.append(Paragraph(f"<b><font color='#00D9A5' size='16'>{company['name']}</font></b>", company_style))
+        elements.append(Paragraph(company['address'], company_style))
+        elements.append(Paragraph(f"Phone: {company['phone']} &nbsp;&nbsp; GSTIN: {company['gstin']} &nbsp;&nbsp; PAN Number: {company['pan']}", company_style))
+        elements.append(Spacer(1, 0.3*inch))
+
+        # Customer and invoice details
+        customer = invoice.customer
+        customer_invoice_data = [
+            [
+                Paragraph(f"<b>BILL TO</b><br/>{customer.name}<br/>{customer.get_full_address()}<br/>Phone: {customer.phone}<br/>PAN Number: {customer.pan_number}<br/>GSTIN: {customer.gstin}<br/>Place of Supply: {customer.place_of_supply}", styles['Normal']),
+                Paragraph(f"<b>Invoice No</b><br/>{invoice.invoice_number}<br/><br/><b>Invoice Date</b><br/>{invoice.invoice_date.strftime('%d %B %Y')}", styles['Normal'])
+            ]
+        ]
+
+        customer_invoice_table = Table(customer_invoice_data, colWidths=[4*inch, 2*inch])
+        customer_invoice_table.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        elements.append(customer_invoice_table)
+        elements.append(Spacer(1, 0.2*inch))
+
+        # Invoice items table
+        items = list(invoice.items.all())
+        items_data = [
+            ['Sr. No.', 'Items', 'Quantity', 'Price / Unit', 'Tax / Unit', 'Amount']
+        ]
+
+        for idx, item in enumerate(items, 1):
+            items_data.append([
+                str(idx),
+                item.product_name,
+                f"{item.quantity} {item.product_unit}",
+                f"Rs. {item.price_per_unit:.2f}",
+                f"Rs. {item.tax_amount/item.quantity:.2f} ({item.tax_percentage}%)",
+                f"Rs. {item.amount:.2f}"
+            ])
+
+        # Add discount row
+        items_data.append(['', '', '', '', 'Discount', f"Rs. {invoice.discount:.2f}"])
+
+        # Add total row
+        total_qty = sum(item.quantity for item in items)
+        items_data.append(['', 'Total', f"{total_qty:.0f}", '', f"Rs. {invoice.total_tax:.2f}", f"Rs. {invoice.grand_total:.2f}"])
+
+        # Add received and due balance
+        items_data.append(['', '', 'Received Amount', '', '', f"Rs. {invoice.received_amount:.2f}"])
+        items_data.append(['', '', 'Due Balance', '', '', f"Rs. {invoice.due_balance:.2f}"])
+
+        items_table = Table(items_data, colWidths=[0.5*inch, 2*inch, 1*inch, 1*inch, 1.2*inch, 1*inch])
+        items_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#00D9A5')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, len(items_data)-3), (-1, len(items_data)-3), colors.HexColor('#00D9A5')),
+            ('TEXTCOLOR', (0, len(items_data)-3), (-1, len(items_data)-3), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]))
+        elements.append(items_table)
+        elements.append(Spacer(1, 0.3*inch))
+
+        # Notes and Terms
+        notes_terms_data = [
+            [
+                Paragraph(f"<b>Notes</b><br/>{invoice.notes or DEFAULT_NOTES}", styles['Normal']),
+                Paragraph("<b>Terms & Conditions</b><br/>" + "<br/>".join(TERMS), styles['Normal']),
+                Paragraph("<b>Authorised Signatory For</b><br/>" + company['name'], styles['Normal'])
+            ]
+        ]
+
+        notes_terms_table = Table(notes_terms_data, colWidths=[2*inch, 2.5*inch, 2*inch])
+        notes_terms_table.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        elements.append(notes_terms_table)
+
+        doc.build(elements)
+        buffer.seek(0)
+        return buffer
+
+
+@lru_cache(maxsize=None)
+def _canvas_layout():
+    """Fixed A4 coordinates and font metrics, computed once per process"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.colors import HexColor
+    from reportlab.pdfbase import pdfmetrics
+
+    page_width, page_height = A4
+    widths = [36, 144, 72, 72, 86.4, 72]  # same column widths as the platypus table
+    left = (page_width - sum(widths)) / 2
+    edges = [left]
+    for width in widths:
+        edges.append(edges[-1] + width)
+
+    # Looking the fonts up here loads their metrics before the first page is drawn
+    for font in ('Helvetica', 'Helvetica-Bold'):
+        pdfmetrics.getFont(font)
+
+    return {
+        'page_size': A4,
+        'page_width': page_width,
+        'top': page_height - 36,
+        'bottom': 48,
+        'left': left,
+        'right': edges[-1],
+        'edges': edges,
+        'centers': [(a + b) / 2 for a, b in zip(edges, edges[1:])],
+        'widths': widths,
+        'row_height': 16,
+        'header_height': 22,
+        'accent': HexColor('#00D9A5'),
+        'string_width': pdfmetrics.stringWidth,
+    }
+
+
+class CanvasRenderer(InvoiceRenderer):
+    """The same tax invoice drawn straight onto a canvas at fixed coordinates.
+
+    Skips platypus' flowable wrapping and table layout passes, which is most
+    of the cost of a one-page invoice.
+    """
+
+    def _fit(self, text, font, size, width):
+        """Truncate `text` to fit `width` points; returns (text, drawn width)"""
+        string_width = self.layout['string_width']
+        text_width = string_width(text, font, size)
+        if text_width <= width:
+            return text, text_width
+        while text and string_width(text + '…', font, size) > width:
+            text = text[:-1]
+        return text + '…', string_width(text + '…', font, size)
+
+    def _wrap(self, text, font, size, width):
+        from reportlab.lib.utils import simpleSplit
+        return simpleSplit(text, font, size, width)
+
+    def _row(self, c, y, cells, height=None, fill=None, bold=False):
+        """Draw one table row with its top edge at `y`; returns the next row's top.
+
+        Only the bottom rule is drawn here; `_columns` draws the vertical rules
+        for a whole run of rows in one go.
+        """
+        layout = self.layout
+        height = height or layout['row_height']
+        if fill is not None:
+            c.setFillColor(fill)
+            c.rect(layout['left'], y - height, layout['right'] - layout['left'], height, stroke=0, fill=1)
+            c.setFillColorRGB(1, 1, 1)
+        font = 'Helvetica-Bold' if bold else 'Helvetica'
+        c.setFont(font, 9)
+        baseline = y - height / 2 - 3
+        for text, center, width in zip(cells, layout['centers'], layout['widths']):
+            if text:
+                text, text_width = self._fit(text, font, 9, width - 6)
+                c.drawString(center - text_width / 2, baseline, text)
+        if fill is not None:
+            c.setFillColorRGB(0, 0, 0)
+        c.line(layout['left'], y - height, layout['right'], y - height)
+        return y - height
+
+    def _columns(self, c, top, bottom):
+        c.lines([(x, top, x, bottom) for x in self.layout['edges']])
+
+    def _table_header(self, c, y):
+        c.line(self.layout['left'], y, self.layout['right'], y)
+        return self._row(c, y, ['Sr. No.', 'Items', 'Quantity', 'Price / Unit', 'Tax / Unit', 'Amount'],
+                         height=self.layout['header_height'], fill=self.layout['accent'], bold=True)
+
+    def render(self, invoice):
+        from reportlab.pdfgen.canvas import Canvas
+
+        self.layout = layout = _canvas_layout()
+        company = company_details(getattr(invoice, 'branch', None))
+        customer = invoice.customer
+        items = list(invoice.items.all())
+
+        buffer = BytesIO()
+        c = Canvas(buffer, pagesize=layout['page_size'])
+        c.setTitle(f"Invoice {invoice.invoice_number}")
+        c.setLineWidth(1)
+        mid = layout['page_width'] / 2
+        left, right = layout['left'], layout['right']
+
+        # Title and company block
+        y = layout['top']
+        c.setFont('Helvetica-Bold', 14)
+        c.drawString(left, y - 14, "TAX INVOICE")
+        c.setFillColor(layout['accent'])
+        c.setFont('Helvetica-Bold', 16)
+        c.drawCentredString(mid, y - 40, company['name'])
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont('Helvetica', 10)
+        c.drawCentredString(mid, y - 54, company['address'])
+        c.drawCentredString(mid, y - 68,
+                            f"Phone: {company['phone']}   GSTIN: {company['gstin']}   PAN Number: {company['pan']}")
+
+        # Bill-to and invoice number boxes
+        y -= 90
+        split = left + (right - left) * 2 / 3
+        bill_to = [
+            customer.name, customer.get_full_address(), f"Phone: {customer.phone}",
+            f"PAN Number: {customer.pan_number}", f"GSTIN: {customer.gstin}",
+            f"Place of Supply: {customer.place_of_supply}",
+        ]
+        box_height = 12 * (len(bill_to) + 1) + 10
+        c.rect(left, y - box_height, right - left, box_height)
+        c.line(split, y, split, y - box_height)
+        c.setFont('Helvetica-Bold', 10)
+        c.drawString(left + 6, y - 14, "BILL TO")
+        c.drawString(split + 6, y - 14, "Invoice No")
+        c.drawString(split + 6, y - 50, "Invoice Date")
+        c.setFont('Helvetica', 10)
+        for i, line in enumerate(bill_to, 2):
+            c.drawString(left + 6, y - 12 * i - 2, self._fit(str(line), 'Helvetica', 10, split - left - 12)[0])
+        c.drawString(split + 6, y - 26, invoice.invoice_number)
+        c.drawString(split + 6, y - 62, invoice.invoice_date.strftime('%d %B %Y'))
+
+        # Items table, continued on new pages when it runs past the bottom margin
+        top = y - box_height - 14
+        y = self._table_header(c, top)
+        for idx, item in enumerate(items, 1):
+            if y - layout['row_height'] < layout['bottom']:
+                self._columns(c, top, y)
+                c.showPage()
+                c.setLineWidth(1)
+                top = layout['top']
+                y = self._table_header(c, top)
+            y = self._row(c, y, [
+                str(idx),
+                item.product_name,
+                f"{item.quantity} {item.product_unit}",
+                f"Rs. {item.price_per_unit:.2f}",
+                f"Rs. {item.tax_amount/item.quantity:.2f} ({item.tax_percentage}%)",
+                f"Rs. {item.amount:.2f}",
+            ])
+
+        # Totals (4 rows) and notes (80pt) are kept together with the last lines
+        if y - 4 * layout['row_height'] - 14 - 80 < layout['bottom']:
+            self._columns(c, top, y)
+            c.showPage()
+            c.setLineWidth(1)
+            top = y = layout['top']
+            c.line(left, y, right, y)
+        total_qty = sum(item.quantity for item in items)
+        y = self._row(c, y, ['', '', '', '', 'Discount', f"Rs. {invoice.discount:.2f}"])
+        y = self._row(c, y, ['', 'Total', f"{total_qty:.0f}", '', f"Rs. {invoice.total_tax:.2f}",
+                             f"Rs. {invoice.grand_total:.2f}"], fill=layout['accent'])
+        y = self._row(c, y, ['', '', 'Received Amount', '', '', f"Rs. {invoice.received_amount:.2f}"])
+        y = self._row(c, y, ['', '', 'Due Balance', '', '', f"Rs. {invoice.due_balance:.2f}"])
+        self._columns(c, top, y)
+
+        # Notes, terms and signatory
+        y -= 14
+        columns = [
+            ('Notes', self._wrap(invoice.notes or DEFAULT_NOTES, 'Helvetica', 9, 132)),
+            ('Terms & Conditions', [line for term in TERMS for line in self._wrap(term, 'Helvetica', 9, 168)]),
+            ('Authorised Signatory For', self._wrap(company['name'], 'Helvetica', 9, 132)),
+        ]
+        widths = [144, 180, right - left - 324]
+        height = 80
+        c.rect(left, y - height, right - left, height)
+        x = left
+        for (title, lines), width in zip(columns, widths):
+            if x > left:
+                c.line(x, y, x, y - height)
+            c.setFont('Helvetica-Bold', 9)
+            c.drawString(x + 6, y - 12, title)
+            c.setFont('Helvetica', 9)
+            for i, line in enumerate(lines[:5], 2):
+                c.drawString(x + 6, y - 11 * i - 1, line)
+            x += width
+
+        c.save()
+        buffer.seek(0)
+        return buffer
+
+
+def _number(value):
+    """2.50 -> '2.5', 10.00 -> '10'"""
+    return f"{value.normalize():f}"
+
+
+class ThermalRenderer(InvoiceRenderer):
+    """Plain-text receipt for 58/80 mm POS printers (THERMAL_RECEIPT_WIDTH columns)"""
+
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def __init__(self, width=None):
+        self.width = width or getattr(settings, 'THERMAL_RECEIPT_WIDTH', 42)
+
+    def _pair(self, label, value):
+        gap = max(self.width - len(label) - len(value), 1)
+        return f"{label}{' ' * gap}{value}"
+
+    def render(self, invoice):
+        w = self.width
+        company = company_details(getattr(invoice, 'branch', None))
+        rule = '-' * w
+        lines = []
+
+        lines.append(company['name'].upper().center(w).rstrip())
+        for line in textwrap.wrap(company['address'], w):
+            lines.append(line.center(w).rstrip())
+        lines.append(f"Ph: {company['phone']}".center(w).rstrip())
+        lines.append(f"GSTIN: {company['gstin']}".center(w).rstrip())
+        lines.append(rule)
+        lines.append("TAX INVOICE".center(w).rstrip())
+        lines.append(self._pair(f"No: {invoice.invoice_number}", invoice.invoice_date.strftime('%d-%m-%Y')))
+        lines.extend(textwrap.wrap(f"Customer: {invoice.customer.name}", w))
+        if invoice.customer.phone:
+            lines.append(f"Phone: {invoice.customer.phone}")
+        if invoice.customer.gstin:
+            lines.append(f"GSTIN: {invoice.customer.gstin}")
+        lines.append(rule)
+        lines.append(self._pair("Item", "Amount"))
+        lines.append(rule)
+
+        for item in invoice.items.all():
+            lines.extend(textwrap.wrap(item.product_name, w) or [''])
+            detail = f"  {_number(item.quantity)} {item.product_unit} x {item.price_per_unit:.2f} +{_number(item.tax_percentage)}%"
+            lines.append(self._pair(detail, f"{item.amount:.2f}"))
+
+        lines.append(rule)
+        lines.append(self._pair("Subtotal", f"{invoice.subtotal:.2f}"))
+        lines.append(self._pair("Tax", f"{invoice.total_tax:.2f}"))
+        if invoice.discount:
+            lines.append(self._pair("Discount", f"-{invoice.discount:.2f}"))
+        lines.append(self._pair("TOTAL Rs.", f"{invoice.grand_total:.2f}"))
+        lines.append(self._pair("Received", f"{invoice.received_amount:.2f}"))
+        if invoice.due_balance:
+            lines.append(self._pair("Due", f"{invoice.due_balance:.2f}"))
+        lines.append(rule)
+        if invoice.notes:
+            lines.extend(textwrap.wrap(invoice.notes, w))
+        lines.append("Thank you! Visit again.".center(w).rstrip())
+        # Blank lines feed the paper past the cutter
+        lines.extend(['', '', ''])
+
+        return BytesIO('\n'.join(lines).encode('utf-8'))
+
+
+RENDERERS = {
+    'platypus': PlatypusRenderer,
+    'canvas': CanvasRenderer,
+    'thermal': ThermalRenderer,
+}
+
+
+def get_renderer(name=None):
+    """Renderer by name; defaults to settings.INVOICE_RENDERER.
+
+    Names come from RENDERERS only, since they can arrive in a request. A
+    dotted path to an InvoiceRenderer subclass is accepted from the setting.
+    """
+    if name:
+        if name not in RENDERERS:
+            raise RendererError(f"Unknown invoice renderer '{name}'. Choose from: {', '.join(RENDERERS)}")
+        return RENDERERS[name]()
+
+    name = getattr(settings, 'INVOICE_RENDERER', 'platypus')
+    if name in RENDERERS:
+        return RENDERERS[name]()
+    try:
+        renderer = import_string(name)
+    except ImportError as e:
+        raise RendererError(f"INVOICE_RENDERER: {e}")
+    if not (isinstance(renderer, type) and issubclass(renderer, InvoiceRenderer)):
+        raise RendererError(f"INVOICE_RENDERER '{name}' is not an InvoiceRenderer subclass")
+    return renderer()
+
+
+def benchmark(invoice, names=None, repeat=50):
+    """Time each renderer on `invoice`.
+
+    Returns {name: (first_render_seconds, best_seconds, size_bytes)}; the first
+    render includes the one-off imports and font loading.
+    """
+    results = {}
+    for name in names or RENDERERS:
+        renderer = get_renderer(name)
+        started = time.perf_counter()
+        size = len(renderer.render(invoice).getvalue())
+        first = time.perf_counter() - started
+        best = first
+        for _ in range(repeat):
+            started = time.perf_counter()
+            renderer.render(invoice)
+            best = min(best, time.perf_counter() - started)
+        results[name] = (first, best, size)
+    return results
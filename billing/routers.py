@@ -0,0 +1,121 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_pin'
+
+# Per request/command: may billing reads go to the replica, must they stay on
+# the primary (this browser wrote recently), has anything been written so far,
+# and did any read actually hit the replica?
+_replica_allowed = ContextVar('replica_allowed', default=False)
+_pinned = ContextVar('pinned', default=False)
+_wrote = ContextVar('wrote', default=False)
+_replica_used = ContextVar('replica_used', default=False)
+
+_lag_checked = {'at': 0.0, 'lag': None}
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def replica_lag():
+    """Seconds the replica is behind the primary, or None if it can't be told"""
+    connection = connections[REPLICA]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())")
+            lag = cursor.fetchone()[0]
+        # NULL means the server is not a standby (e.g. a second local instance)
+        return 0.0 if lag is None else max(float(lag), 0.0)
+    if connection.vendor == 'sqlite':
+        # A SQLite replica is a copy refreshed by `sync_replica`; its age is the lag
+        return max(time.time() - os.path.getmtime(connection.settings_dict['NAME']), 0.0)
+    return None
+
+
+def replica_fresh():
+    """True if the replica is within REPLICA_MAX_LAG; re-checked every few seconds"""
+    now = time.monotonic()
+    if now - _lag_checked['at'] > settings.REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            lag = replica_lag()
+        except (DatabaseError, OSError):
+            lag = None
+        _lag_checked.update(at=now, lag=lag)
+    lag = _lag_checked['lag']
+    return lag is not None and lag <= settings.REPLICA_MAX_LAG
+
+
+@contextmanager
+def replica_reads():
+    """Let billing reads in this view, command or block go to the replica.
+
+    Only for read-only reporting code: anything that reads and then writes
+    must stay on the primary. Usable as `@replica_reads()` or `with`.
+    """
+    token = _replica_allowed.set(True)
+    try:
+        yield
+    finally:
+        _replica_allowed.reset(token)
+
+
+@contextmanager
+def primary_pinned(pinned=True):
+    """Keep reads inside this block on the primary, even under `replica_reads`.
+
+    Yields a callable telling whether anything was written inside the block.
+    """
+    tokens = (_pinned.set(pinned), _wrote.set(False))
+    try:
+        yield _wrote.get
+    finally:
+        _pinned.reset(tokens[0])
+        _wrote.reset(tokens[1])
+
+
+@contextmanager
+def track_replica():
+    """Yields a callable telling whether any read inside the block used the replica"""
+    token = _replica_used.set(False)
+    try:
+        yield _replica_used.get
+    finally:
+        _replica_used.reset(token)
+
+
+class ReplicaRouter:
+    """Routes billing reads inside `replica_reads` to the replica.
+
+    Everything else - writes, auth/sessions, reads inside a transaction or
+    after this request (or, via ReplicaPinMiddleware, this browser) recently
+    wrote - uses the primary, as do all reads while the replica is too far
+    behind or unreachable.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (not _replica_allowed.get() or _pinned.get() or _wrote.get()
+                or model._meta.app_label != 'billing' or not replica_configured()
+                or connections['default'].in_atomic_block or not replica_fresh()):
+            return None
+        _replica_used.set(True)
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema from replication (or sync_replica), never from migrate
+        return db != REPLICA
@@ -0,0 +1,222 @@
+import threading
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .jobs import HANDLERS, claim_next, requeue_stale, run_job
+from .models import Job, Schedule
+
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+
+# (low, high) for minute, hour, day of month, month, day of week (0 or 7 = Sunday)
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        spec, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if spec == '*':
+            start, end = low, high
+        elif '-' in spec:
+            start, end = (int(v) for v in spec.split('-', 1))
+        else:
+            start = int(spec)
+            end = high if step > 1 else start
+        if not (low <= start <= end <= high) or step < 1:
+            raise ValueError(f"'{part}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """A standard five-field cron expression, evaluated in local time (TIME_ZONE)"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"'{expression}' needs five fields: minute hour day month weekday")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            sorted(_parse_field(text, low, high)) for text, (low, high) in zip(fields, FIELD_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        # As in cron, a restricted day of month and day of week match either
+        self.either_day = fields[2] != '*' and fields[4] != '*'
+
+    def matches_day(self, day):
+        if day.month not in self.months:
+            return False
+        by_date = day.day in self.days
+        by_weekday = (day.weekday() + 1) % 7 in self.weekdays
+        return by_date or by_weekday if self.either_day else by_date and by_weekday
+
+    def next_after(self, moment):
+        """First firing time strictly after the aware datetime `moment`"""
+        local = timezone.localtime(moment).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        day = local.date()
+        # Five years covers every valid expression, including 29 February
+        for _ in range(5 * 366):
+            if self.matches_day(day):
+                earliest = local.time() if day == local.date() else time(0, 0)
+                for hour in self.hours:
+                    if hour < earliest.hour:
+                        continue
+                    for minute in self.minutes:
+                        if hour == earliest.hour and minute < earliest.minute:
+                            continue
+                        return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+            day += timedelta(days=1)
+        raise ValueError(f"'{self.expression}' never fires")
+
+
+def load_schedules():
+    """settings.SCHEDULES parsed and checked: {name: (Cron, kind, payload)}"""
+    schedules = {}
+    for name, spec in settings.SCHEDULES.items():
+        if spec['kind'] not in HANDLERS:
+            raise ValueError(f"Schedule '{name}': unknown job kind '{spec['kind']}'")
+        try:
+            cron = Cron(spec['cron'])
+        except ValueError as e:
+            raise ValueError(f"Schedule '{name}': {e}")
+        schedules[name] = (cron, spec['kind'], spec.get('payload', {}))
+    return schedules
+
+
+def enqueue_due(schedules, now=None):
+    """Queue a job for every schedule that is due; returns the created jobs.
+
+    Safe to run on several nodes at once: advancing `next_run_at` is a
+    conditional UPDATE, so exactly one node wins each firing. Runs missed
+    while no scheduler was up collapse into one, and a firing is skipped
+    while the previous run of the same schedule is still queued or running.
+    """
+    now = now or timezone.now()
+    created = []
+    for name, (cron, kind, payload) in schedules.items():
+        schedule, _ = Schedule.objects.get_or_create(
+            name=name, defaults={'cron': cron.expression, 'next_run_at': cron.next_after(now)},
+        )
+        if schedule.cron != cron.expression:
+            # The expression was edited in settings; start over from now
+            Schedule.objects.filter(pk=schedule.pk, cron=schedule.cron).update(
+                cron=cron.expression, next_run_at=cron.next_after(now),
+            )
+            continue
+        if schedule.next_run_at > now:
+            continue
+        won = Schedule.objects.filter(pk=schedule.pk, next_run_at=schedule.next_run_at).update(
+            next_run_at=cron.next_after(now), last_run_at=now,
+        )
+        if not won:
+            continue
+        if Job.objects.filter(pk=schedule.last_job_id, status__in=[Job.QUEUED, Job.RUNNING]).exists():
+            Schedule.objects.filter(pk=schedule.pk).update(skipped=F('skipped') + 1)
+            continue
+        job = Job.objects.create(kind=kind, payload=payload, requested_by=f'scheduler:{name}')
+        Schedule.objects.filter(pk=schedule.pk).update(last_job=job)
+        created.append(job)
+    return created
+
+
+def _run_in_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        # Worker threads get their own connection; don't leak it
+        connection.close()
+
+
+class Scheduler:
+    """Queues due schedules and runs queued jobs with at most `concurrency` at once"""
+
+    def __init__(self, concurrency=None, tick=None, stale_after=30):
+        self.concurrency = concurrency or settings.SCHEDULER_CONCURRENCY
+        self.tick = tick or settings.SCHEDULER_TICK
+        self.stale_after = stale_after
+        self.schedules = load_schedules()
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job')
+        self.running = set()
+        self.lock = threading.Lock()
+
+    def _done(self, future):
+        with self.lock:
+            self.running.discard(future)
+
+    def dispatch(self):
+        """Claim and start queued jobs until the concurrency limit is reached"""
+        started = []
+        while len(self.running) < self.concurrency:
+            job = claim_next()
+            if job is None:
+                break
+            future = self.pool.submit(_run_in_thread, job)
+            with self.lock:
+                self.running.add(future)
+            future.add_done_callback(self._done)
+            started.append(job)
+        return started
+
+    def run_once(self):
+        requeue_stale(self.stale_after)
+        queued = enqueue_due(self.schedules)
+        return queued, self.dispatch()
+
+    def run_forever(self, log=print):
+        try:
+            while True:
+                queued, started = self.run_once()
+                for job in queued:
+                    log(f"Queued {job} ({job.requested_by})")
+                for job in started:
+                    log(f"Started {job}")
+                clock.sleep(self.tick)
+        finally:
+            self.pool.shutdown(wait=True)
+
+    def drain(self):
+        """Run everything queued now, then wait for it to finish"""
+        self.run_once()
+        while self.running or self.dispatch():
+            clock.sleep(0.05)
+        self.pool.shutdown(wait=True)
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def job_stats(since):
+    """Per job kind: runs, failures and duration percentiles (seconds) since `since`"""
+    durations, failures = {}, {}
+    finished = Job.objects.filter(finished_at__gte=since, started_at__isnull=False)
+    for kind, status, started_at, finished_at in finished.values_list('kind', 'status', 'started_at', 'finished_at'):
+        durations.setdefault(kind, []).append((finished_at - started_at).total_seconds())
+        failures[kind] = failures.get(kind, 0) + (status == Job.FAILED)
+
+    stats = []
+    for kind, values in sorted(durations.items()):
+        values.sort()
+        stats.append({
+            'kind': kind,
+            'runs': len(values),
+            'failed': failures[kind],
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'max': values[-1],
+            'total': sum(values),
+        })
+    return stats
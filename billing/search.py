@@ -0,0 +1,157 @@
+import re
+
+from django.db import connection, connections, router
+from django.db.models.signals import post_save, post_delete
+
+from .models import Customer, Invoice
+from .customers import normalize_phone
+
+
+SQLITE_TABLE = 'billing_invoice_fts'
+POSTGRES_TABLE = 'billing_invoice_search'
+
+DOCUMENT_FIELDS = [
+    'pk', 'invoice_number', 'customer__name', 'customer__phone', 'customer__email',
+    'customer__gstin', 'notes',
+]
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def backend(conn=None):
+    """'sqlite', 'postgresql' or None when the database has no search index"""
+    vendor = (conn or connection).vendor
+    return vendor if vendor in ('sqlite', 'postgresql') else None
+
+
+def _documents(invoice_ids):
+    for pk, number, name, phone, email, gstin, notes in (
+            Invoice.objects.filter(pk__in=invoice_ids).values_list(*DOCUMENT_FIELDS)):
+        # Index the digits-only phone too, so "9890691272" finds "+91 98906 91272"
+        phone = f"{phone} {normalize_phone(phone)}".strip()
+        yield pk, number, name, phone, email or '', gstin, notes
+
+
+def index_invoices(invoice_ids, chunk_size=500):
+    """Add or refresh the search documents for these invoices"""
+    vendor = backend()
+    if vendor is None:
+        return
+    invoice_ids = list(invoice_ids)
+
+    with connection.cursor() as cursor:
+        for i in range(0, len(invoice_ids), chunk_size):
+            chunk = invoice_ids[i:i + chunk_size]
+            docs = list(_documents(chunk))
+            if vendor == 'sqlite':
+                placeholders = ','.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})", chunk)
+                cursor.executemany(
+                    f"INSERT INTO {SQLITE_TABLE} "
+                    "(rowid, invoice_number, customer_name, phone, email, gstin, notes) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    docs,
+                )
+            else:
+                cursor.executemany(
+                    f"INSERT INTO {POSTGRES_TABLE} (invoice_id, document) VALUES (%s, "
+                    "setweight(to_tsvector('simple', %s), 'A') || "
+                    "setweight(to_tsvector('simple', %s || ' ' || %s || ' ' || %s || ' ' || %s), 'B') || "
+                    "setweight(to_tsvector('simple', %s), 'C')) "
+                    "ON CONFLICT (invoice_id) DO UPDATE SET document = EXCLUDED.document",
+                    docs,
+                )
+
+
+def remove_invoices(invoice_ids):
+    vendor = backend()
+    invoice_ids = list(invoice_ids)
+    if vendor is None or not invoice_ids:
+        return
+    placeholders = ','.join(['%s'] * len(invoice_ids))
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})", invoice_ids)
+        else:
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE invoice_id IN ({placeholders})", invoice_ids)
+
+
+def rebuild_index(chunk_size=2000):
+    """Re-index every invoice; returns the number indexed"""
+    vendor = backend()
+    if vendor is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE if vendor == 'sqlite' else POSTGRES_TABLE}")
+
+    count = 0
+    chunk = []
+    for pk in Invoice.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) >= chunk_size:
+            index_invoices(chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        index_invoices(chunk)
+        count += len(chunk)
+    return count
+
+
+def search_invoice_ids(query, limit=200, branch=None):
+    """Invoice ids matching every word of `query` as a prefix, best match first.
+
+    With `branch`, only that branch's invoices are matched, before the limit
+    is applied, so one branch's results are never crowded out by another's.
+    Returns None when the database has no search index, so callers can fall
+    back to a plain filter.
+    """
+    # Read from wherever invoices are read from, so ids and rows agree
+    conn = connections[router.db_for_read(Invoice)]
+    vendor = backend(conn)
+    if vendor is None:
+        return None
+    tokens = TOKEN.findall(query.lower())
+    if not tokens:
+        return []
+
+    invoice_table = Invoice._meta.db_table
+    branch_id = branch.pk if branch is not None else None
+    with conn.cursor() as cursor:
+        if vendor == 'sqlite':
+            match = ' AND '.join(f'"{token}"*' for token in tokens)
+            cursor.execute(
+                f"SELECT {SQLITE_TABLE}.rowid FROM {SQLITE_TABLE} "
+                f"JOIN {invoice_table} ON {invoice_table}.id = {SQLITE_TABLE}.rowid "
+                f"WHERE {SQLITE_TABLE} MATCH %s AND (%s IS NULL OR {invoice_table}.branch_id = %s) "
+                # Weight invoice number and customer name above the other columns
+                f"ORDER BY bm25({SQLITE_TABLE}, 10.0, 5.0, 2.0, 2.0, 2.0, 1.0), {SQLITE_TABLE}.rowid DESC LIMIT %s",
+                [match, branch_id, branch_id, limit],
+            )
+        else:
+            match = ' & '.join(f'{token}:*' for token in tokens)
+            cursor.execute(
+                f"SELECT s.invoice_id FROM {POSTGRES_TABLE} s JOIN {invoice_table} i ON i.id = s.invoice_id "
+                "WHERE s.document @@ to_tsquery('simple', %s) AND (%s::bigint IS NULL OR i.branch_id = %s) "
+                "ORDER BY ts_rank(s.document, to_tsquery('simple', %s)) DESC, s.invoice_id DESC LIMIT %s",
+                [match, branch_id, branch_id, match, limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _invoice_saved(sender, instance, **kwargs):
+    index_invoices([instance.pk])
+
+
+def _invoice_deleted(sender, instance, **kwargs):
+    remove_invoices([instance.pk])
+
+
+def _customer_saved(sender, instance, created, **kwargs):
+    if not created:
+        index_invoices(instance.invoices.values_list('pk', flat=True))
+
+
+post_save.connect(_invoice_saved, sender=Invoice, dispatch_uid='billing_search_invoice_save')
+post_delete.connect(_invoice_deleted, sender=Invoice, dispatch_uid='billing_search_invoice_delete')
+post_save.connect(_customer_saved, sender=Customer, dispatch_uid='billing_search_customer_save')
@@ -0,0 +1,289 @@
+import calendar
+import hashlib
+import heapq
+import os
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Invoice, Payment
+from .renderers import company_details
+
+
+# Open-items statement (sent with payment reminders): (heading, width, right-aligned)
+COLUMNS = [
+    ('Invoice No.', 110, False),
+    ('Date', 80, False),
+    ('Age (days)', 60, True),
+    ('Total', 85, True),
+    ('Received', 85, True),
+    ('Due', 85, True),
+]
+
+# Ledger statement for a period
+LEDGER_COLUMNS = [
+    ('Date', 65, False),
+    ('Particulars', 185, False),
+    ('Debit', 85, True),
+    ('Credit', 85, True),
+    ('Balance', 85, True),
+]
+
+# Rows fetched per round trip while streaming a ledger
+CHUNK_SIZE = 2000
+
+
+class StatementCanvas:
+    """A4 pages with the company header, a customer block and a table that
+    continues over as many pages as needed.
+
+    Rows are drawn as they arrive and each finished page is handed to
+    ReportLab straight away, so nothing here keeps the rows themselves.
+    """
+
+    def __init__(self, target, customer, title, subtitle, columns):
+        from reportlab.lib.colors import HexColor
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfgen import canvas
+
+        self.customer = customer
+        self.title = title
+        self.subtitle = subtitle
+        self.columns = columns
+        self.accent = HexColor('#00D9A5')
+        self.string_width = pdfmetrics.stringWidth
+        self.page_width, self.page_height = A4
+        self.left = (self.page_width - sum(width for _, width, _ in columns)) / 2
+        self.right = self.page_width - self.left
+        self.bottom = 60
+        self.page = 0
+
+        self.c = canvas.Canvas(target, pagesize=A4, pageCompression=1)
+        self.c.setTitle(f"{title} - {customer.name}")
+        self.y = self.new_page()
+
+    def new_page(self):
+        c, company = self.c, company_details(self.customer.branch)
+        if self.page:
+            c.showPage()
+        self.page += 1
+
+        y = self.page_height - 50
+        c.setFont('Helvetica-Bold', 16)
+        c.drawString(self.left, y, company['name'])
+        c.setFont('Helvetica', 9)
+        c.drawString(self.left, y - 14, company['address'])
+        c.drawString(self.left, y - 26, f"Phone: {company['phone']}  GSTIN: {company['gstin']}")
+        c.setFont('Helvetica-Bold', 13)
+        c.drawRightString(self.right, y, self.title)
+        c.setFont('Helvetica', 9)
+        c.drawRightString(self.right, y - 14, self.subtitle)
+        c.drawRightString(self.right, y - 26, f"Page {self.page}")
+
+        y -= 56
+        customer = self.customer
+        c.setFont('Helvetica-Bold', 10)
+        c.drawString(self.left, y, customer.name)
+        c.setFont('Helvetica', 9)
+        for line in filter(None, [customer.phone, customer.email, customer.gstin and f"GSTIN: {customer.gstin}"]):
+            y -= 12
+            c.drawString(self.left, y, line)
+
+        y -= 24
+        c.setFillColor(self.accent)
+        c.rect(self.left, y - 6, self.right - self.left, 20, stroke=0, fill=1)
+        c.setFillColorRGB(1, 1, 1)
+        self.cells(y, [heading for heading, _, _ in self.columns], 'Helvetica-Bold')
+        c.setFillColorRGB(0, 0, 0)
+        c.setStrokeColorRGB(0.85, 0.85, 0.85)
+        c.setFont('Helvetica', 9)
+        return y - 20
+
+    def cells(self, y, cells, font='Helvetica'):
+        # One text object per row, and each string measured once: drawString
+        # and drawRightString would build and measure a text object per cell
+        text_object = self.c.beginText()
+        text_object.setFont(font, 9)
+        x = self.left
+        for text, (_, width, right_aligned) in zip(cells, self.columns):
+            text_width = self.string_width(text, font, 9)
+            if text_width > width - 12:
+                while text and self.string_width(text + '…', font, 9) > width - 12:
+                    text = text[:-1]
+                text += '…'
+                text_width = self.string_width(text, font, 9)
+            text_object.setTextOrigin(x + width - 6 - text_width if right_aligned else x + 6, y)
+            text_object.textOut(text)
+            x += width
+        self.c.drawText(text_object)
+
+    def row(self, cells, bold=False):
+        if self.y < self.bottom + 40:
+            self.y = self.new_page()
+        self.cells(self.y, cells, 'Helvetica-Bold' if bold else 'Helvetica')
+        self.c.line(self.left, self.y - 6, self.right, self.y - 6)
+        self.y -= 18
+
+    def total(self, label, amount):
+        c = self.c
+        if self.y < self.bottom + 40:
+            self.y = self.new_page()
+        c.setFont('Helvetica-Bold', 10)
+        c.drawString(self.left + 6, self.y - 4, label)
+        c.drawRightString(self.right - 6, self.y - 4, f"Rs. {amount:,.2f}")
+        self.y -= 20
+
+    def finish(self, note):
+        self.c.setFont('Helvetica', 8)
+        self.c.drawString(self.left, self.bottom - 20, note)
+        self.c.showPage()
+        self.c.save()
+
+
+def _money(value):
+    return f"{value:,.2f}" if value else ''
+
+
+def statement_filename(customer, as_of=None):
+    as_of = as_of or timezone.localdate()
+    return f"Statement_{customer.pk}_{as_of:%Y%m%d}.pdf"
+
+
+def render_statement(customer, invoices, as_of=None):
+    """A4 PDF listing `invoices` with their dues, for one customer; returns BytesIO"""
+    as_of = as_of or timezone.localdate()
+    buffer = BytesIO()
+    pdf = StatementCanvas(buffer, customer, 'STATEMENT OF ACCOUNT', f"As of {as_of:%d %B %Y}", COLUMNS)
+    total_due = Decimal('0')
+    for invoice in invoices:
+        pdf.row([
+            invoice.invoice_number,
+            invoice.invoice_date.strftime('%d-%m-%Y'),
+            str((as_of - invoice.invoice_date).days),
+            f"{invoice.grand_total:,.2f}",
+            f"{invoice.received_amount:,.2f}",
+            f"{invoice.due_balance:,.2f}",
+        ])
+        total_due += invoice.due_balance
+    pdf.total('Total outstanding', total_due)
+    pdf.finish('Please ignore this statement if payment has already been made.')
+    buffer.seek(0)
+    return buffer
+
+
+def parse_period(month=None, start=None, end=None):
+    """(start, end) dates from 'YYYY-MM' or two 'YYYY-MM-DD' strings; default last month"""
+    if start or end:
+        if not (start and end):
+            raise ValueError('start and end must be given together')
+        start, end = date.fromisoformat(start), date.fromisoformat(end)
+    else:
+        if month:
+            year, number = (int(part) for part in month.split('-'))
+        else:
+            last_month = timezone.localdate().replace(day=1) - timedelta(days=1)
+            year, number = last_month.year, last_month.month
+        start = date(year, number, 1)
+        end = date(year, number, calendar.monthrange(year, number)[1])
+    if start > end:
+        raise ValueError('start must not be after end')
+    return start, end
+
+
+def opening_balance(customer, start):
+    """Billed minus paid before `start`"""
+    billed = Invoice.objects.filter(customer=customer, invoice_date__lt=start).aggregate(s=Sum('grand_total'))['s']
+    paid = Payment.objects.filter(customer=customer, paid_on__lt=start).aggregate(s=Sum('amount'))['s']
+    return (billed or Decimal('0')) - (paid or Decimal('0'))
+
+
+def ledger_entries(customer, start, end, chunk_size=CHUNK_SIZE):
+    """(date, particulars, debit, credit) for every invoice and payment in the period, by date.
+
+    Invoices and payments are read through two chunked iterators and merged
+    on the fly, so a customer with 100k rows costs two cursors, not 100k objects.
+    """
+    zero = Decimal('0')
+    invoices = (Invoice.objects.filter(customer=customer, invoice_date__range=(start, end))
+                .order_by('invoice_date', 'id')
+                .values_list('invoice_date', 'id', 'invoice_number', 'grand_total')
+                .iterator(chunk_size=chunk_size))
+    payments = (Payment.objects.filter(customer=customer, paid_on__range=(start, end))
+                .order_by('paid_on', 'id')
+                .values_list('paid_on', 'id', 'invoice__invoice_number', 'method', 'reference', 'amount')
+                .iterator(chunk_size=chunk_size))
+    # On the same day an invoice comes before the payments made against it
+    merged = heapq.merge(
+        ((day, 0, pk, f"Invoice #{number}", total, zero) for day, pk, number, total in invoices),
+        ((day, 1, pk, f"Payment ({method}{' ' + reference if reference else ''}) - #{number}", zero, amount)
+         for day, pk, number, method, reference, amount in payments),
+    )
+    for day, _, _, particulars, debit, credit in merged:
+        yield day, particulars, debit, credit
+
+
+def render_ledger_statement(customer, start, end, target):
+    """Statement of account with running balance for a period, written to `target`
+    (a path or file object); returns the closing balance"""
+    pdf = StatementCanvas(target, customer, 'STATEMENT OF ACCOUNT',
+                          f"{start:%d %b %Y} to {end:%d %b %Y}", LEDGER_COLUMNS)
+    balance = opening_balance(customer, start)
+    pdf.row([start.strftime('%d-%m-%Y'), 'Opening balance', '', '', f"{balance:,.2f}"], bold=True)
+
+    billed = paid = Decimal('0')
+    for day, particulars, debit, credit in ledger_entries(customer, start, end):
+        balance += debit - credit
+        billed += debit
+        paid += credit
+        pdf.row([day.strftime('%d-%m-%Y'), particulars, _money(debit), _money(credit), f"{balance:,.2f}"])
+
+    pdf.row([end.strftime('%d-%m-%Y'), 'Closing balance', f"{billed:,.2f}", f"{paid:,.2f}", f"{balance:,.2f}"],
+            bold=True)
+    pdf.total('Amount due' if balance >= 0 else 'Amount in credit', abs(balance))
+    pdf.finish('Balances include every invoice and payment up to the end of the period.')
+    return balance
+
+
+def statement_fingerprint(customer, end):
+    """Changes whenever anything shown on a statement ending at `end` changes"""
+    invoices = Invoice.objects.filter(customer=customer, invoice_date__lte=end).aggregate(
+        n=Count('id'), changed=Max('updated_at'), total=Sum('grand_total'))
+    payments = Payment.objects.filter(customer=customer, paid_on__lte=end).aggregate(
+        n=Count('id'), last=Max('id'), total=Sum('amount'))
+    details = (customer.name, customer.phone, customer.email, customer.gstin, sorted(invoices.items()),
+               sorted(payments.items()), company_details(customer.branch))
+    return hashlib.sha1(repr(details).encode()).hexdigest()[:12]
+
+
+def cached_statement(customer, start, end):
+    """Path to the period's statement PDF under MEDIA_ROOT/statements/, rendered on first use.
+
+    The file name carries a fingerprint of the data behind it, so a late
+    payment or an edited invoice produces a new file instead of a stale one.
+    """
+    folder = Path(settings.MEDIA_ROOT) / 'statements' / str(customer.pk)
+    stem = f"{start:%Y%m%d}-{end:%Y%m%d}"
+    path = folder / f"{stem}-{statement_fingerprint(customer, end)}.pdf"
+    if path.exists():
+        return path
+
+    folder.mkdir(parents=True, exist_ok=True)
+    # Render beside the target and rename, so readers never see half a file
+    partial = folder / f".{path.name}.{os.getpid()}.{threading.get_ident()}"
+    try:
+        render_ledger_statement(customer, start, end, str(partial))
+        os.replace(partial, path)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    for old in folder.glob(f"{stem}-*.pdf"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
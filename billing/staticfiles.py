@@ -0,0 +1,207 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.contrib.staticfiles.utils import matches_patterns
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz files are written
+    brotli = None
+
+
+COMPRESSIBLE = ('*.css', '*.js', '*.svg', '*.html', '*.txt', '*.json', '*.xml', '*.map', '*.ico')
+
+# Compressed copies that save less than this fraction are not worth serving
+MIN_SAVING = 0.05
+
+
+def _skip_string(text, i):
+    """Index just past the string literal starting at text[i]"""
+    quote = text[i]
+    i += 1
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def _skip_regex(text, i):
+    """Index just past the regex literal (and its flags) starting at text[i]"""
+    i += 1
+    in_class = False
+    while i < len(text) and text[i] != '\n':
+        ch = text[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            i += 1
+            while i < len(text) and (text[i].isalnum() or text[i] == '_'):
+                i += 1
+            return i
+        i += 1
+    return i
+
+
+def _append_space(out, space):
+    """Add a whitespace token, merging it with a preceding one ('\\n' wins)"""
+    if not out:
+        return
+    if out[-1] in (' ', '\n'):
+        if space == '\n':
+            out[-1] = '\n'
+        return
+    out.append(space)
+
+
+# A '/' after one of these starts a regex literal rather than a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+
+
+def minify_js(source):
+    """Strip comments and indentation from JavaScript.
+
+    Deliberately conservative: string, template and regex literals are copied
+    untouched and line breaks are kept, so automatic semicolon insertion
+    behaves exactly as before.
+    """
+    out = []
+    last = ''
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        pair = source[i:i + 2]
+        if ch in '\'"`':
+            end = _skip_string(source, i)
+            out.append(source[i:end])
+            last, i = ch, end
+        elif pair == '//':
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+        elif pair == '/*':
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            _append_space(out, '\n' if '\n' in source[i:end] else ' ')
+            i = end
+        elif ch == '/' and (not last or last in REGEX_PRECEDERS):
+            end = _skip_regex(source, i)
+            out.append(source[i:end])
+            last, i = '/', end
+        elif ch.isspace():
+            end = i
+            while end < n and source[end].isspace():
+                end += 1
+            _append_space(out, '\n' if '\n' in source[i:end] else ' ')
+            i = end
+        else:
+            out.append(ch)
+            last = ch
+            i += 1
+
+    # Whitespace either side of a line break is never significant
+    text = ''.join(out)
+    return re.sub(r' ?\n ?', '\n', text).strip() + '\n'
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    out = []
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        if ch in '\'"':
+            end = _skip_string(source, i)
+            out.append(source[i:end])
+            i = end
+        elif source[i:i + 2] == '/*' or ch.isspace():
+            # Comments count as whitespace, which is dropped after punctuation
+            if ch.isspace():
+                while i < n and source[i].isspace():
+                    i += 1
+            else:
+                end = source.find('*/', i + 2)
+                i = n if end == -1 else end + 2
+            if out and out[-1] not in '{};,>':
+                _append_space(out, ' ')
+        elif ch in '{};,>' or (ch == ':' and out and out[-1] != ' '):
+            # Drop spaces around punctuation; a space before ':' is kept
+            # because "a :hover" and "a:hover" are different selectors
+            if out and out[-1] == ' ':
+                out.pop()
+            if ch == '}' and out and out[-1] == ';':
+                out.pop()
+            out.append(ch)
+            i += 1
+            while i < n and source[i].isspace():
+                i += 1
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out).strip() + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def compress_file(storage, name):
+    """Write name.gz (and name.br when brotli is installed) next to `name`"""
+    with storage.open(name) as f:
+        data = f.read()
+    if not data:
+        return
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            if storage.exists(name + suffix):
+                storage.delete(name + suffix)
+            storage._save(name + suffix, ContentFile(compressed))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Static storage for `collectstatic` that minifies, fingerprints and precompresses.
+
+    Our own CSS/JS (STATIC_MINIFY_PATTERNS) is minified before hashing, so the
+    hash matches what is served. Every text asset then gets .gz/.br siblings
+    that StaticFilesMiddleware serves by Accept-Encoding.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        paths = self.minify(paths)
+
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                for target in {name, hashed_name}:
+                    if matches_patterns(target, COMPRESSIBLE):
+                        compress_file(self, target)
+            yield name, hashed_name, processed
+
+    def minify(self, paths):
+        """Replace matching sources with minified copies saved in this storage"""
+        patterns = getattr(settings, 'STATIC_MINIFY_PATTERNS', ['css/*.css', 'js/*.js'])
+        paths = dict(paths)
+        for name, (storage, path) in paths.items():
+            minify = MINIFIERS.get(name[name.rfind('.'):])
+            if minify is None or name.endswith(('.min.js', '.min.css')) or not matches_patterns(name, patterns):
+                continue
+            with storage.open(path) as f:
+                source = f.read().decode('utf-8')
+            if self.exists(name):
+                self.delete(name)
+            self._save(name, ContentFile(minify(source).encode('utf-8')))
+            paths[name] = (self, name)
+        return paths
@@ -0,0 +1,135 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .caching import bump_version_on_commit
+from .models import Product, StockMovement
+
+
+class StockError(Exception):
+    """Raised when a product doesn't have enough stock for a sale"""
+
+
+def _balance(product_id):
+    return Product.objects.filter(pk=product_id).values_list('stock', flat=True).get()
+
+
+def take_stock(invoice, lines):
+    """Take the stock for an invoice's (product, quantity) lines; call inside the invoice transaction.
+
+    Each tracked product is one conditional UPDATE (stock >= quantity), so
+    concurrent checkouts can never sell the same units twice or push stock
+    below zero. Raises StockError for the first product that is short, which
+    rolls the whole invoice back. A negative quantity (a line reduced or
+    removed by an edit) puts the units back.
+    """
+    wanted = defaultdict(Decimal)
+    for product, quantity in lines:
+        if product.track_stock:
+            wanted[product.pk] += Decimal(quantity)
+    wanted = {product_id: quantity for product_id, quantity in wanted.items() if quantity}
+    if not wanted:
+        return []
+
+    movements = []
+    # Always lock products in the same order, so two carts can't deadlock
+    for product_id in sorted(wanted):
+        quantity = wanted[product_id]
+        product = Product.objects.filter(pk=product_id, track_stock=True)
+        if not product.filter(stock__gte=quantity).update(stock=F('stock') - quantity):
+            short = product.values('name', 'unit', 'stock').first()
+            if short is None:
+                # Stopped tracking stock since the cart was loaded
+                continue
+            raise StockError(f"Only {short['stock']} {short['unit']} of {short['name']} left in stock")
+        # Read back after the UPDATE, while this transaction holds the row
+        movements.append(StockMovement(product_id=product_id, kind=StockMovement.SALE, change=-quantity,
+                                       balance=_balance(product_id), invoice=invoice))
+
+    StockMovement.objects.bulk_create(movements)
+    # update() sends no save signals, so invalidate cached product pages once the sale commits
+    bump_version_on_commit('product')
+    return movements
+
+
+def billed_quantities(invoice):
+    """{product id: quantity} billed on an invoice's lines, summed per product"""
+    return dict(invoice.items.filter(product__isnull=False).values('product_id')
+                .annotate(quantity=Sum('quantity')).order_by().values_list('product_id', 'quantity'))
+
+
+def restock_invoice(invoice, before, after=None):
+    """Take or return the stock for a change in an invoice's lines; call inside the invoice transaction.
+
+    `before` and `after` are billed_quantities() from either side of the
+    change; leave `after` out when the invoice is being deleted, to put all
+    of its units back.
+    """
+    after = after or {}
+    change = {pk: after.get(pk, Decimal('0')) - before.get(pk, Decimal('0')) for pk in before.keys() | after.keys()}
+    products = Product.objects.in_bulk([pk for pk, quantity in change.items() if quantity])
+    return take_stock(invoice, [(products[pk], change[pk]) for pk in products])
+
+
+def receive_stock(product, quantity, note=''):
+    """Add received units to a product's stock; returns the movement"""
+    quantity = Decimal(str(quantity))
+    if quantity <= 0:
+        raise StockError("Received quantity must be positive")
+
+    with transaction.atomic():
+        Product.objects.filter(pk=product.pk).update(stock=F('stock') + quantity)
+        movement = StockMovement.objects.create(product=product, kind=StockMovement.RECEIPT, change=quantity,
+                                                balance=_balance(product.pk), note=note)
+    bump_version_on_commit('product')
+    return movement
+
+
+def adjust_stock(product, change, note=''):
+    """Correct a product's stock by `change` (e.g. -2 for breakage); returns the movement"""
+    change = Decimal(str(change))
+    if not change:
+        raise StockError("Adjustment can't be zero")
+
+    with transaction.atomic():
+        # Same guard as a sale: a write-off can't take stock below zero
+        if not Product.objects.filter(pk=product.pk, stock__gte=-change).update(stock=F('stock') + change):
+            raise StockError(f"Only {_balance(product.pk)} {product.unit} of {product.name} in stock")
+        movement = StockMovement.objects.create(product=product, kind=StockMovement.ADJUSTMENT, change=change,
+                                                balance=_balance(product.pk), note=note)
+    bump_version_on_commit('product')
+    return movement
+
+
+def set_stock(product, counted, note='Stock count'):
+    """Set a product's stock to a counted level, recording the difference as an adjustment.
+
+    The UPDATE only applies if the stock is still what was read, so a sale
+    landing in between is retried against the new level instead of lost.
+    """
+    counted = Decimal(str(counted))
+    if counted < 0:
+        raise StockError("Stock can't be negative")
+
+    while True:
+        with transaction.atomic():
+            current = _balance(product.pk)
+            if Product.objects.filter(pk=product.pk, stock=current).update(stock=counted):
+                movement = StockMovement.objects.create(product=product, kind=StockMovement.ADJUSTMENT,
+                                                        change=counted - current, balance=counted, note=note)
+                break
+    bump_version_on_commit('product')
+    return movement
+
+
+def low_stock(branch):
+    """A branch's tracked products at or below their reorder level, emptiest first.
+
+    The filter matches the partial `product_low_stock` index, so only the
+    low products themselves are read.
+    """
+    return (Product.objects
+            .filter(branch=branch, track_stock=True, stock__lte=F('reorder_level'))
+            .order_by('stock', 'name'))
@@ -1,3 +1,514 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import reminders
+from .analytics import rebuild_rollups, sales_report
+from .archive import archive_financial_year, get_year
+from .caching import get_version
+from .catalogue import ProductImporter, parse_csv as parse_catalogue
+from .customers import customer_identity_key, resolve_customer
+from .editing import EditError, StaleInvoiceError, edit_invoice
+from .gst import gst_report
+from .importers import InvoiceImporter, parse_ndjson
+from .ledger import PaymentError, record_invoice, record_payment, rebuild_customer_balances
+from .models import (Branch, Customer, CustomerBalance, DailyCustomerSales, DailyProductSales, DailySales, Invoice,
+                     InvoiceItem, Job, Product, ProductPrice, Schedule, StockMovement)
+from .pricing import prices_on, set_price
+from .scheduler import Cron, enqueue_due
+from .search import search_invoice_ids
+from .stock import StockError, take_stock
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+def make_invoice(number, customer, product, quantity='1', **fields):
+    fields.setdefault('invoice_date', timezone.localdate())
+    invoice = Invoice.objects.create(invoice_number=number, customer=customer, **fields)
+    InvoiceItem.objects.create(invoice=invoice, product=product, quantity=Decimal(quantity))
+    invoice.calculate_totals()
+    return invoice
+
+
+class BillingTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.get_default()
+        cls.customer = Customer.objects.create(name='Test Customer', phone='9000000001', address='-', city='-',
+                                               state='Rajasthan', pincode='302001', place_of_supply='Rajasthan')
+        cls.product = Product.objects.create(name='Rice', unit='KG', price_per_unit=Decimal('50.00'),
+                                             tax_percentage=Decimal('5.00'), track_stock=True, stock=Decimal('1'))
+
+    def setUp(self):
+        # Cached prices and versions would otherwise outlive each test's rolled-back rows
+        cache.clear()
+
+    def checkout(self, product, quantity=1, client=None, **customer):
+        customer = {'name': 'Walk-in', 'phone': '9000000002', **customer}
+        return (client or self.client).post('/invoice/generate/', json.dumps({
+            'customer': customer,
+            'items': [{'product_id': product.pk, 'quantity': quantity}],
+        }), content_type='application/json')
+
+
+class ImportTimeTests(SimpleTestCase):
+    def test_startup_imports_within_budget(self):
+        # Fails with CommandError if over IMPORT_TIME_BUDGET_MS or a lazy module is imported eagerly
+        out = StringIO()
+        call_command('check_import_time', runs=1, top=0, stdout=out)
+        self.assertIn('Startup imports', out.getvalue())
+
+
+class TakeStockTests(BillingTestCase):
+    def test_two_sales_racing_on_the_last_unit(self):
+        # Both checkouts loaded the product while one unit was left
+        first_cart = Product.objects.get(pk=self.product.pk)
+        second_cart = Product.objects.get(pk=self.product.pk)
+        today = timezone.localdate()
+        first = Invoice.objects.create(invoice_number='T01', customer=self.customer, invoice_date=today)
+        second = Invoice.objects.create(invoice_number='T02', customer=self.customer, invoice_date=today)
+
+        take_stock(first, [(first_cart, Decimal('1'))])
+        with self.assertRaises(StockError):
+            take_stock(second, [(second_cart, Decimal('1'))])
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, Decimal('0'))
+        sales = StockMovement.objects.filter(product=self.product, kind=StockMovement.SALE)
+        self.assertEqual(list(sales.values_list('invoice_id', 'change')), [(first.pk, Decimal('-1'))])
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    # Keep the default branch created by the migrations for the tests that run after this one
+    serialized_rollback = True
+
+    def test_parallel_checkouts_never_oversell(self):
+        cache.clear()
+        product = Product.objects.create(name='Sugar', unit='KG', price_per_unit=Decimal('40.00'),
+                                         track_stock=True, stock=Decimal('5'))
+        statuses = []
+
+        def checkout(n):
+            try:
+                response = Client().post('/invoice/generate/', json.dumps({
+                    'customer': {'name': f'Till {n}', 'phone': f'90000001{n:02d}'},
+                    'items': [{'product_id': product.pk, 'quantity': 1}],
+                }), content_type='application/json')
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(n,)) for n in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sold = statuses.count(200)
+        self.assertEqual(sold, 5)
+        self.assertEqual(statuses.count(409), 7)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, Decimal('5') - sold)
+        sales = StockMovement.objects.filter(product=product, kind=StockMovement.SALE)
+        self.assertEqual(sales.count(), sold)
+        self.assertEqual(Invoice.objects.count(), sold)
+        self.assertFalse(Product.objects.filter(stock__lt=0).exists())
+
+
+class EditInvoiceTests(BillingTestCase):
+    def test_stale_version_is_refused(self):
+        Product.objects.filter(pk=self.product.pk).update(track_stock=False)
+        invoice = make_invoice('T01', self.customer, self.product)
+        item = invoice.items.get()
+        stale_version = invoice.version
+
+        edit_invoice(Invoice.objects.get(pk=invoice.pk), stale_version, update=[(item.pk, 2)])
+        edited = Invoice.objects.get(pk=invoice.pk)
+        self.assertEqual(edited.version, stale_version + 1)
+        self.assertEqual(edited.grand_total, Decimal('105.00'))
+
+        # A second edit made against the version the first one replaced
+        with self.assertRaises(StaleInvoiceError):
+            edit_invoice(invoice, stale_version, update=[(item.pk, 5)])
+
+        unchanged = Invoice.objects.get(pk=invoice.pk)
+        self.assertEqual(unchanged.version, stale_version + 1)
+        self.assertEqual(unchanged.grand_total, Decimal('105.00'))
+        self.assertEqual(unchanged.items.get().quantity, Decimal('2'))
+
+    def test_new_lines_need_an_active_product_of_the_branch(self):
+        Product.objects.filter(pk=self.product.pk).update(track_stock=False)
+        invoice = make_invoice('T01', self.customer, self.product)
+        other_branch = Branch.objects.create(code='OTHER', name='Other Branch')
+        inactive = Product.objects.create(name='Old Rice', unit='KG', price_per_unit=Decimal('40.00'), is_active=False)
+        foreign = Product.objects.create(name='Wheat', unit='KG', price_per_unit=Decimal('30.00'), branch=other_branch)
+
+        for product in (inactive, foreign):
+            with self.assertRaises(EditError):
+                edit_invoice(Invoice.objects.get(pk=invoice.pk), invoice.version, add=[(product.pk, 1)])
+
+        # The line whose product was deactivated after billing can still be changed
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+        edited = edit_invoice(Invoice.objects.get(pk=invoice.pk), invoice.version, update=[(invoice.items.get().pk, 3)])
+        self.assertEqual(edited.items.count(), 1)
+        self.assertEqual(edited.grand_total, Decimal('157.50'))
+
+
+class ArchiveTests(BillingTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        archive_root = override_settings(ARCHIVE_ROOT=root.name)
+        archive_root.enable()
+        self.addCleanup(archive_root.disable)
+
+    def make_paid_invoice(self, number, quantity):
+        # 50.00 + 5% tax per unit, paid in full
+        return make_invoice(number, self.customer, self.product, quantity, invoice_date=date(2023, 6, 1),
+                            received_amount=Decimal('52.50') * quantity)
+
+    def test_rerunning_a_year_keeps_its_columns_aligned(self):
+        self.make_paid_invoice('T01', 2)
+        self.assertEqual(archive_financial_year(2023)['total'], 1)
+
+        # Nothing new: the year is rewritten unchanged
+        self.assertEqual(archive_financial_year(2023)['total'], 1)
+        year = get_year('2023-24')
+        self.assertEqual(len(year.invoices('item_start')), 1)
+
+        self.make_paid_invoice('T02', 3)
+        self.assertEqual(archive_financial_year(2023)['total'], 2)
+        year = get_year('2023-24')
+        self.assertEqual(list(year.invoices('item_start')), [0, 1])
+        self.assertEqual(list(year.invoices('item_count')), [1, 1])
+
+        invoice = year.invoice(year.find('T02'))
+        self.assertEqual(invoice.grand_total, Decimal('157.50'))
+        self.assertEqual([item.quantity for item in invoice.items.all()], [Decimal('3')])
+
+    def test_archived_invoice_keeps_its_branch_and_renders_as_pdf(self):
+        other = Branch.objects.create(code='NSK', name='Nashik Traders', gstin='27AAAAA0000A1Z5')
+        customer = Customer.objects.create(name='Nashik Customer', phone='9000000009', address='-', city='-',
+                                           state='Maharashtra', pincode='422001', place_of_supply='Maharashtra',
+                                           branch=other)
+        product = Product.objects.create(name='Jowar', unit='KG', price_per_unit=Decimal('50.00'),
+                                         tax_percentage=Decimal('5.00'), branch=other)
+        make_invoice('S01', customer, product, invoice_date=date(2023, 6, 1), received_amount=Decimal('52.50'),
+                     branch=other)
+        archive_financial_year(2023)
+
+        year = get_year('2023-24')
+        self.assertIsNone(year.find('S01', self.branch.pk))
+        self.assertEqual(year.invoice(year.find('S01', other.pk)).branch, other)
+
+        response = self.client.get('/archive/2023-24/S01/pdf/', HTTP_X_BRANCH='NSK')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(self.client.get('/archive/2023-24/S01/pdf/').status_code, 404)
+
+
+class InvoiceImporterTests(BillingTestCase):
+    def test_bad_records_are_reported_and_the_rest_imported(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=Decimal('10'))
+        lines = [
+            {'customer': {'name': 'Asha', 'phone': '9000000011'}, 'items': [{'product_id': self.product.pk, 'quantity': 2}]},
+            '{not json',
+            {'customer': {'name': 'No Contact'}, 'items': [{'product_id': self.product.pk, 'quantity': 1}]},
+            {'customer': {'name': 'Ravi', 'phone': '9000000012'}, 'items': [{'product_id': 999999, 'quantity': 1}]},
+            {'customer': {'name': 'Meena', 'phone': '9000000013'}, 'items': [{'product_id': self.product.pk, 'quantity': 20}]},
+        ]
+        stream = StringIO('\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines))
+        result = InvoiceImporter(branch=self.branch).run(parse_ndjson(stream))
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error['record'] for error in result.errors], [2, 3, 4, 5])
+        self.assertIn('Invalid JSON', result.errors[0]['error'])
+        self.assertIn('left in stock', result.errors[3]['error'])
+        invoice = Invoice.objects.get(invoice_number=result.invoice_numbers[0])
+        self.assertEqual(invoice.grand_total, Decimal('105.00'))
+        # Failed records leave no customer behind and no gap in the series
+        self.assertFalse(Customer.objects.filter(phone__in=['9000000012', '9000000013']).exists())
+        self.assertEqual(result.invoice_numbers, ['S01'])
+
+
+class CustomerIdentityTests(BillingTestCase):
+    def test_identity_key_prefers_email_then_normalised_phone(self):
+        self.assertEqual(customer_identity_key(' Asha@Example.com ', '9000000001'), 'e:asha@example.com')
+        self.assertEqual(customer_identity_key('', '+91 98906-91272'), 'p:9890691272')
+        self.assertEqual(customer_identity_key(None, '098906 91272'), 'p:9890691272')
+        self.assertIsNone(customer_identity_key('', ''))
+
+    def test_checkout_finds_the_same_customer_however_the_phone_is_written(self):
+        with transaction.atomic():
+            first = resolve_customer({'name': 'Asha', 'phone': '+91 98906 91272'}, self.branch)
+        second = resolve_customer({'name': 'Asha K', 'phone': '09890691272'}, self.branch)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Customer.objects.filter(identity_key='p:9890691272').count(), 1)
+
+    def test_a_clashing_phone_is_refused(self):
+        clash = Customer(name='Someone Else', phone='+91 9000000001', address='-', city='-', state='-',
+                         pincode='000000', place_of_supply='-')
+        with self.assertRaises(ValidationError) as raised:
+            clash.full_clean()
+        self.assertIn('phone', raised.exception.message_dict)
+        with self.assertRaises(ValidationError):
+            clash.save()
+
+
+class LedgerTests(BillingTestCase):
+    def test_payments_move_the_invoice_and_balance_and_match_a_rebuild(self):
+        invoice = make_invoice('T01', self.customer, self.product, '2', received_amount=Decimal('5.00'))
+        record_invoice(invoice)
+        record_payment(invoice, '50.00', method='UPI')
+        self.assertEqual(invoice.due_balance, Decimal('50.00'))
+
+        with self.assertRaises(PaymentError):
+            record_payment(invoice, '50.01')
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.received_amount, Decimal('55.00'))
+        self.assertEqual(sum(invoice.payments.values_list('amount', flat=True)), invoice.received_amount)
+
+        balance = CustomerBalance.objects.get(customer=self.customer)
+        self.assertEqual((balance.total_billed, balance.total_paid, balance.outstanding),
+                         (Decimal('105.00'), Decimal('55.00'), Decimal('50.00')))
+        rebuild_customer_balances([self.customer.pk])
+        rebuilt = CustomerBalance.objects.get(customer=self.customer)
+        self.assertEqual((rebuilt.total_billed, rebuilt.total_paid, rebuilt.outstanding),
+                         (balance.total_billed, balance.total_paid, balance.outstanding))
+
+
+class RollupTests(BillingTestCase):
+    def rollups(self):
+        return (
+            sorted(DailySales.objects.values_list('branch', 'date', 'invoice_count', 'subtotal', 'tax', 'discount',
+                                                  'revenue')),
+            sorted(DailyProductSales.objects.values_list('branch', 'date', 'product', 'quantity', 'revenue')),
+            sorted(DailyCustomerSales.objects.values_list('branch', 'date', 'customer', 'invoice_count', 'revenue')),
+        )
+
+    def test_incremental_buckets_match_a_rebuild(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=Decimal('10'))
+        self.assertEqual(self.checkout(self.product, 2).status_code, 200)
+        self.assertEqual(self.checkout(self.product, 1, phone='9000000003').status_code, 200)
+        invoice = Invoice.objects.get(invoice_number='S01')
+        edit_invoice(invoice, invoice.version, update=[(invoice.items.get().pk, 3)], discount=Decimal('5'))
+
+        incremental = self.rollups()
+        self.assertEqual(incremental[0][0][2:], (2, Decimal('200.00'), Decimal('10.00'), Decimal('5.00'),
+                                                 Decimal('205.00')))
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_reports_are_kept_per_branch(self):
+        other = Branch.objects.create(code='NSK', name='Nashik')
+        wheat = Product.objects.create(name='Wheat', unit='KG', price_per_unit=Decimal('30.00'), branch=other)
+        Product.objects.filter(pk=self.product.pk).update(stock=Decimal('10'))
+        self.checkout(self.product, 2)
+        self.checkout(wheat, 1, client=Client(HTTP_X_BRANCH='NSK'))
+
+        today = timezone.localdate()
+        here = sales_report(self.branch, today, today)
+        there = sales_report(other, today, today)
+        self.assertEqual(here['totals']['revenue'], 105.0)
+        self.assertEqual([p['name'] for p in here['top_products']], ['Rice'])
+        self.assertEqual(there['totals']['revenue'], 31.5)
+        self.assertEqual([c['name'] for c in there['top_customers']], ['Walk-in'])
+
+
+class CacheInvalidationTests(BillingTestCase):
+    def test_versions_move_only_when_the_change_commits(self):
+        version = get_version('product')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Rice (Basmati)'
+            self.product.save()
+            self.assertEqual(get_version('product'), version)
+        self.assertNotEqual(get_version('product'), version)
+
+    def test_cached_page_is_replaced_after_a_save(self):
+        self.assertContains(self.client.get('/products/'), 'Rice')
+        # update() sends no signal, so the cached page is still served
+        Product.objects.filter(pk=self.product.pk).update(name='Brown Rice')
+        self.assertNotContains(self.client.get('/products/'), 'Brown Rice')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.product.pk).save()
+        self.assertContains(self.client.get('/products/'), 'Brown Rice')
+
+
+class GstReportTests(BillingTestCase):
+    def test_tax_is_split_by_place_of_supply(self):
+        Branch.objects.filter(pk=self.branch.pk).update(state='Maharashtra')
+        branch = Branch.objects.get(pk=self.branch.pk)
+        local = Customer.objects.create(name='Local Customer', phone='9000000004', gstin='27AAAAA0000A1Z5',
+                                        address='-', city='-', state='Maharashtra', pincode='411001',
+                                        place_of_supply='Maharashtra')
+        make_invoice('T01', local, self.product, '2', invoice_date=date(2026, 9, 5))
+        make_invoice('T02', self.customer, self.product, '2', invoice_date=date(2026, 9, 6))
+        make_invoice('T03', self.customer, self.product, '2', invoice_date=date(2026, 10, 1))
+
+        report = gst_report(2026, 9, branch=branch)
+        self.assertEqual(report['totals'], {'taxable': 200.0, 'cgst': 2.5, 'sgst': 2.5, 'igst': 5.0,
+                                            'lines': 2, 'total_tax': 10.0})
+        self.assertEqual([(row['place_of_supply'], row['intra_state']) for row in report['by_state']],
+                         [('Maharashtra', True), ('Rajasthan', False)])
+        self.assertEqual(report['by_rate'][0]['b2b_taxable'], 100.0)
+        self.assertEqual(report['by_rate'][0]['b2c_taxable'], 100.0)
+
+
+class SearchTests(BillingTestCase):
+    def test_prefix_words_match_within_the_branch(self):
+        invoice = make_invoice('T01', self.customer, self.product)
+        other = Branch.objects.create(code='NSK', name='Nashik')
+        elsewhere = Customer.objects.create(name='Test Customer', phone='9000000001', address='-', city='-',
+                                            state='-', pincode='000000', place_of_supply='-', branch=other)
+        foreign = make_invoice('T01', elsewhere, self.product, branch=other)
+
+        self.assertEqual(search_invoice_ids('test cust', branch=self.branch), [invoice.pk])
+        self.assertEqual(search_invoice_ids('9000000001', branch=other), [foreign.pk])
+        self.assertEqual(sorted(search_invoice_ids('cust')), sorted([invoice.pk, foreign.pk]))
+        self.assertEqual(search_invoice_ids('nobody', branch=self.branch), [])
+
+
+class SchedulerTests(TestCase):
+    def test_cron_fields(self):
+        weekdays = Cron('*/15 9-17 * * 1-5')
+        self.assertEqual(weekdays.next_after(aware(2026, 10, 19, 9, 7)), aware(2026, 10, 19, 9, 15))
+        # Friday evening to Monday morning
+        self.assertEqual(weekdays.next_after(aware(2026, 10, 23, 17, 50)), aware(2026, 10, 26, 9, 0))
+        self.assertEqual(Cron('@monthly').next_after(aware(2026, 10, 19, 0, 0)), aware(2026, 11, 1, 0, 0))
+        for bad in ['61 * * * *', '* * *', '0 0 30 2 *']:
+            with self.assertRaises(ValueError):
+                Cron(bad).next_after(aware(2026, 10, 19, 0, 0))
+
+    def test_enqueue_due_queues_each_firing_once(self):
+        schedules = {'nightly': (Cron('0 2 * * *'), 'refresh_rollups', {})}
+        self.assertEqual(enqueue_due(schedules, aware(2026, 10, 19, 1, 0)), [])
+
+        jobs = enqueue_due(schedules, aware(2026, 10, 19, 2, 1))
+        self.assertEqual([job.kind for job in jobs], ['refresh_rollups'])
+        self.assertEqual(enqueue_due(schedules, aware(2026, 10, 19, 2, 2)), [])
+
+        # Next night the first job is still queued, so that firing is skipped
+        self.assertEqual(enqueue_due(schedules, aware(2026, 10, 20, 2, 5)), [])
+        schedule = Schedule.objects.get(name='nightly')
+        self.assertEqual(schedule.skipped, 1)
+        self.assertEqual(schedule.next_run_at, aware(2026, 10, 21, 2, 0))
+        self.assertEqual(Job.objects.count(), 1)
+
+
+class FakeChannel:
+    name = 'fake'
+    sent = []
+
+    def can_reach(self, customer):
+        return True
+
+    def open(self):
+        return True
+
+    def send(self, customer, invoices, total, today):
+        self.sent.append((customer.pk, [invoice.invoice_number for invoice in invoices], total))
+        return True
+
+    def close(self):
+        pass
+
+
+class ReminderTests(BillingTestCase):
+    def test_one_reminder_per_customer_advances_only_the_overdue_invoices(self):
+        today = timezone.localdate()
+        overdue = make_invoice('T01', self.customer, self.product, invoice_date=today - timedelta(days=10))
+        recent = make_invoice('T02', self.customer, self.product, invoice_date=today - timedelta(days=2))
+        FakeChannel.sent = []
+
+        with mock.patch.dict(reminders.CHANNELS, {'fake': FakeChannel}), \
+                override_settings(REMINDER_STAGES=[7, 30], REMINDER_PER_MINUTE=0):
+            run = reminders.run_reminders(today, channels=['fake'])
+            self.assertEqual((run.customers, run.sent), (1, 1))
+            self.assertEqual(FakeChannel.sent, [(self.customer.pk, ['T01', 'T02'], Decimal('105.00'))])
+            # Nothing new is due until the next stage
+            self.assertEqual(reminders.run_reminders(today, channels=['fake']).customers, 0)
+
+        overdue.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((overdue.reminder_stage, recent.reminder_stage), (1, 0))
+
+    def test_reminder_is_signed_by_the_customers_branch(self):
+        Branch.objects.filter(pk=self.branch.pk).update(name='Nashik Traders')
+        customer = Customer.objects.select_related('branch').get(pk=self.customer.pk)
+        self.assertIn('Nashik Traders Team', reminders.reminder_text(customer, [], Decimal('0')))
+
+
+class BranchIsolationTests(BillingTestCase):
+    def test_products_and_checkout_stay_in_their_branch(self):
+        Branch.objects.create(code='NSK', name='Nashik')
+        wheat = Product.objects.create(name='Rice Flour', unit='KG', price_per_unit=Decimal('30.00'),
+                                       branch=Branch.objects.get(code='NSK'))
+
+        here = self.client.get('/api/search-products/?q=rice').json()['products']
+        there = self.client.get('/api/search-products/?q=rice', HTTP_X_BRANCH='NSK').json()['products']
+        self.assertEqual([p['name'] for p in here], ['Rice'])
+        self.assertEqual([p['name'] for p in there], ['Rice Flour'])
+
+        self.assertEqual(self.checkout(wheat).status_code, 400)
+        self.assertFalse(Invoice.objects.exists())
+        self.assertFalse(Customer.objects.filter(phone='9000000002').exists())
+
+
+class PriceHistoryTests(BillingTestCase):
+    def test_lines_are_priced_as_of_the_invoice_date(self):
+        set_price(self.product, Decimal('40.00'), Decimal('5.00'), effective_from=date(2025, 1, 1))
+        set_price(self.product, Decimal('60.00'), Decimal('12.00'), effective_from=date(2025, 6, 1))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price_per_unit, Decimal('60.00'))
+
+        self.assertEqual(prices_on([self.product.pk], date(2025, 3, 1))[self.product.pk],
+                         (Decimal('40.00'), Decimal('5.00')))
+        invoice = make_invoice('T01', self.customer, self.product, '2', invoice_date=date(2025, 3, 1))
+        item = invoice.items.get()
+        self.assertEqual((item.price_per_unit, item.tax_percentage), (Decimal('40.00'), Decimal('5.00')))
+        self.assertEqual(invoice.grand_total, Decimal('84.00'))
+
+        # A future price is recorded but not applied yet
+        set_price(self.product, Decimal('70.00'), Decimal('12.00'), effective_from=date(2099, 1, 1))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price_per_unit, Decimal('60.00'))
+
+
+class CatalogueImportTests(BillingTestCase):
+    def run_import(self, text):
+        return ProductImporter(branch=self.branch).run(parse_catalogue(StringIO(text)))
+
+    def test_rows_are_diffed_against_the_catalogue(self):
+        result = self.run_import('name,unit,price_per_unit,tax_percentage\n'
+                                 'Rice,KG,50.00,5\n'
+                                 'Dal,KG,90,5\n')
+        self.assertEqual((result.created, result.updated, result.unchanged, result.failed), (1, 0, 1, 0))
+        self.assertTrue(ProductPrice.objects.filter(product__name='Dal', price_per_unit=Decimal('90.00')).exists())
+
+        result = self.run_import('name,price_per_unit,category\n'
+                                 'Rice,55,\n'
+                                 'Dal,,Pulses\n'
+                                 'Dal,,Grains\n'
+                                 'Salt,12,\n')
+        self.assertEqual((result.created, result.updated, result.unchanged), (1, 2, 0))
+        self.assertEqual([error['record'] for error in result.errors], [4])
+        self.assertIn('Duplicate', result.errors[0]['error'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price_per_unit, Decimal('55.00'))
+        self.assertEqual(self.product.stock, Decimal('1'))
+        self.assertEqual(Product.objects.get(name='Dal').category, 'Pulses')
@@ -5,6 +5,9 @@ urlpatterns = [
     # Landing page
     path('', views.index, name='index'),
     
+    # Branch switcher
+    path('branch/<str:code>/', views.switch_branch, name='switch_branch'),
+    
     # Product search API
     path('api/search-products/', views.search_products, name='search_products'),
     
@@ -13,17 +16,33 @@ urlpatterns = [
     path('products/create/', views.product_create, name='product_create'),
     path('products/<int:pk>/update/', views.product_update, name='product_update'),
     path('products/<int:pk>/delete/', views.product_delete, name='product_delete'),
+    path('products/import/', views.product_import, name='product_import'),
+    path('products/export/', views.product_export, name='product_export'),
+    path('api/low-stock/', views.low_stock_products, name='low_stock_products'),
     
     # Invoice operations
     path('invoice/generate/', views.generate_invoice, name='generate_invoice'),
+    path('api/invoices/import/', views.bulk_import_invoices, name='bulk_import_invoices'),
     path('invoice/<int:pk>/', views.invoice_detail, name='invoice_detail'),
     path('invoice/<int:pk>/pdf/', views.invoice_pdf, name='invoice_pdf'),
     path('invoice/<int:pk>/whatsapp/', views.send_invoice_to_whatsapp, name='send_whatsapp'),
     path('invoice/<int:pk>/email/', views.send_invoice_to_email, name='send_email'),
+    path('invoice/<int:pk>/payments/', views.invoice_payment, name='invoice_payment'),
+    path('api/invoice/<int:pk>/edit/', views.invoice_edit, name='invoice_edit'),
+    
+    # Payments and dues
+    path('api/dues/', views.outstanding_dues, name='outstanding_dues'),
+    path('customer/<int:pk>/statement/', views.customer_statement, name='customer_statement'),
     
     # Invoice search
     path('invoices/search/', views.invoice_search, name='invoice_search'),
     
+    # Archived financial years
+    path('archive/<str:year>/<str:invoice_number>/pdf/', views.archived_invoice_pdf, name='archived_invoice_pdf'),
+    path('api/archive/<str:year>/summary/', views.archive_summary, name='archive_summary'),
+    
     # Statistics
     path('statistics/', views.statistics, name='statistics'),
+    path('api/analytics/', views.analytics_api, name='analytics_api'),
+    path('api/gst-report/', views.gst_report_api, name='gst_report_api'),
 ]
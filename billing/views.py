@@ -1,21 +1,51 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404, FileResponse, StreamingHttpResponse
+from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.http import require_http_methods
+from django.db import transaction
 from django.db.models import Q, Sum, Count
 from django.utils import timezone
+from django.conf import settings
+from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import datetime
 from decimal import Decimal
+import codecs
+import csv
 import json
+import zipfile
 
-from .models import Product, Customer, Invoice, InvoiceItem
-from .utils import generate_invoice_pdf, send_invoice_whatsapp, send_invoice_email
+from .models import Branch, Product, Customer, Invoice, InvoiceItem, InvoiceSequence, Payment, CustomerBalance
+from . import analytics
+from .branches import SESSION_KEY as BRANCH_SESSION_KEY
+from .caching import cache_view
+from .customers import resolve_customer
+from .editing import EditError, StaleInvoiceError, edit_invoice
+from .ledger import PaymentError, record_invoice, record_payment, outstanding_customers
+from .pricing import prices_on, set_price
+from .routers import replica_reads
+from .search import search_invoice_ids
+from .stock import StockError, low_stock, receive_stock, take_stock
+from .renderers import RendererError, company_details, get_renderer
+from .utils import send_invoice_whatsapp, send_invoice_email
 
 
+@ensure_csrf_cookie
 def index(request):
     """Landing page with product search and cart"""
     return render(request, 'billing/index.html')
 
 
+def switch_branch(request, code):
+    """Work in another branch from now on (kept in the session), then go back"""
+    branch = get_object_or_404(Branch, code=code, is_active=True)
+    request.session[BRANCH_SESSION_KEY] = branch.code
+    
+    next_url = request.GET.get('next', '')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = 'index'
+    return redirect(next_url)
+
+
 @require_http_methods(["GET"])
 def search_products(request):
     """AJAX endpoint for searching products"""
@@ -26,6 +56,7 @@ def search_products(request):
     
     products = Product.objects.filter(
         Q(name__icontains=query) | Q(category__icontains=query),
+        branch=request.branch,
         is_active=True
     )[:10]
     
@@ -36,28 +67,55 @@ def search_products(request):
         'unit': p.unit,
         'price_per_unit': float(p.price_per_unit),
         'tax_percentage': float(p.tax_percentage),
+        'stock': float(p.stock) if p.track_stock else None,
     } for p in products]
     
     return JsonResponse({'products': products_data})
 
 
+@cache_view('product')
 def product_list(request):
     """Product CRUD - List view"""
-    products = Product.objects.all()
+    products = Product.objects.filter(branch=request.branch)
     return render(request, 'billing/product_list.html', {'products': products})
 
 
+def _receive_from_form(request, product, note):
+    """Book the form's stock_received quantity as a stock receipt"""
+    quantity = Decimal(request.POST.get('stock_received') or 0)
+    if quantity > 0:
+        receive_stock(product, quantity, note=note)
+
+
+def _sku_taken(product):
+    """Whether another product of the branch already has this product's SKU"""
+    return bool(product.sku) and Product.objects.filter(
+        branch=product.branch_id, sku=product.sku).exclude(pk=product.pk).exists()
+
+
 def product_create(request):
     """Product CRUD - Create view"""
     if request.method == 'POST':
         product = Product(
+            branch=request.branch,
             name=request.POST['name'],
+            sku=request.POST.get('sku', '').strip(),
             category=request.POST.get('category', ''),
+            hsn_code=request.POST.get('hsn_code', '').strip(),
             unit=request.POST['unit'],
             price_per_unit=Decimal(request.POST['price_per_unit']),
             tax_percentage=Decimal(request.POST['tax_percentage']),
+            track_stock='track_stock' in request.POST,
+            reorder_level=Decimal(request.POST.get('reorder_level') or 0),
         )
+        if _sku_taken(product):
+            return render(request, 'billing/product_form.html', {
+                'error': f"SKU {product.sku} is already used by another product",
+                'unit_choices': Product.UNIT_CHOICES
+            })
         product.save()
+        set_price(product, product.price_per_unit, product.tax_percentage)
+        _receive_from_form(request, product, 'Opening stock')
         return redirect('product_list')
     
     return render(request, 'billing/product_form.html', {
@@ -67,26 +125,87 @@ def product_create(request):
 
 def product_update(request, pk):
     """Product CRUD - Update view"""
-    product = get_object_or_404(Product, pk=pk)
+    product = get_object_or_404(Product, pk=pk, branch=request.branch)
     
     if request.method == 'POST':
         product.name = request.POST['name']
+        product.sku = request.POST.get('sku', '').strip()
         product.category = request.POST.get('category', '')
+        product.hsn_code = request.POST.get('hsn_code', '').strip()
         product.unit = request.POST['unit']
-        product.price_per_unit = Decimal(request.POST['price_per_unit'])
-        product.tax_percentage = Decimal(request.POST['tax_percentage'])
+        product.track_stock = 'track_stock' in request.POST
+        product.reorder_level = Decimal(request.POST.get('reorder_level') or 0)
+        if _sku_taken(product):
+            return render(request, 'billing/product_form.html', {
+                'product': product,
+                'error': f"SKU {product.sku} is already used by another product",
+                'prices': product.prices.all()[:10],
+                'unit_choices': Product.UNIT_CHOICES
+            })
         product.save()
+        
+        # Price and tax go into the history instead of overwriting the old ones
+        price_per_unit = Decimal(request.POST['price_per_unit'])
+        tax_percentage = Decimal(request.POST['tax_percentage'])
+        effective_from = request.POST.get('effective_from')
+        effective_from = datetime.strptime(effective_from, '%Y-%m-%d').date() if effective_from else None
+        if effective_from or (price_per_unit, tax_percentage) != (product.price_per_unit, product.tax_percentage):
+            set_price(product, price_per_unit, tax_percentage, effective_from)
+        _receive_from_form(request, product, 'Received')
         return redirect('product_list')
     
     return render(request, 'billing/product_form.html', {
         'product': product,
+        'prices': product.prices.all()[:10],
         'unit_choices': Product.UNIT_CHOICES
     })
 
 
+@require_http_methods(["POST"])
+def product_import(request):
+    """Upsert products from an uploaded CSV or XLSX catalogue, matched by SKU (or name)"""
+    from .catalogue import CatalogueError, ProductImporter, parse_csv, parse_xlsx
+    
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'Upload a CSV or XLSX file as "file"'}, status=400)
+    fmt = request.POST.get('format') or ('xlsx' if upload.name.lower().endswith('.xlsx') else 'csv')
+    if fmt not in ('csv', 'xlsx'):
+        return JsonResponse({'success': False, 'error': f'Unsupported format: {fmt}'}, status=400)
+    
+    try:
+        rows = parse_xlsx(upload) if fmt == 'xlsx' else parse_csv(codecs.iterdecode(upload, 'utf-8-sig'))
+        result = ProductImporter(branch=request.branch, dry_run='dry_run' in request.POST).run(rows)
+    except (CatalogueError, csv.Error, UnicodeDecodeError, zipfile.BadZipFile) as e:
+        return JsonResponse({'success': False, 'error': f'Could not read the file: {e}'}, status=400)
+    
+    return JsonResponse({'success': result.failed == 0, **result.as_dict()})
+
+
+def product_export(request):
+    """Download the branch's catalogue as CSV (streamed) or XLSX"""
+    from .catalogue import CatalogueError, export_csv_lines, export_xlsx
+    
+    fmt = request.GET.get('format', 'csv')
+    filename = f"products-{request.branch.code}-{timezone.localdate():%Y%m%d}.{fmt}"
+    if fmt == 'csv':
+        response = StreamingHttpResponse(export_csv_lines(request.branch), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    if fmt != 'xlsx':
+        return HttpResponse(f'Unsupported format: {fmt}', status=400, content_type='text/plain')
+    
+    try:
+        workbook = export_xlsx(request.branch)
+    except CatalogueError as e:
+        return HttpResponse(str(e), status=501, content_type='text/plain')
+    return FileResponse(workbook, as_attachment=True, filename=filename,
+                        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
 def product_delete(request, pk):
     """Product CRUD - Delete view (Soft Delete)"""
-    product = get_object_or_404(Product, pk=pk)
+    product = get_object_or_404(Product, pk=pk, branch=request.branch)
     
     if request.method == 'POST':
         product.is_active = False
@@ -102,56 +221,58 @@ def generate_invoice(request):
         try:
             data = json.loads(request.body)
             
-            # Get or create customer
-            customer_data = data['customer']
-            customer, created = Customer.objects.get_or_create(
-                email=customer_data['email'],
-                defaults={
-                    'name': customer_data['name'],
-                    'phone': '',
-                    'address': '-',
-                    'city': '-',
-                    'state': 'India',
-                    'pincode': '000000',
-                    'pan_number': '',
-                    'gstin': '',
-                    'place_of_supply': 'India',
-                }
-            )
+            branch = request.branch
             
-            # Generate invoice number
-            last_invoice = Invoice.objects.order_by('-invoice_number').first()
-            if last_invoice and last_invoice.invoice_number.startswith('S'):
-                try:
-                    last_num = int(last_invoice.invoice_number[1:])
-                    invoice_number = f"S{last_num + 1:02d}"
-                except:
-                    invoice_number = f"S01"
-            else:
-                invoice_number = "S01"
+            customer_data = data['customer']
             
-            # Create invoice
-            invoice = Invoice.objects.create(
-                invoice_number=invoice_number,
-                customer=customer,
-                invoice_date=datetime.now().date(),
-                discount=Decimal(data.get('discount', 0)),
-                received_amount=Decimal(data.get('received_amount', 0)),
-                notes=data.get('notes', ''),
-                terms_conditions=data.get('terms_conditions', ''),
-            )
+            # Only this branch's products; checked before anything is written
+            products = [Product.objects.get(id=item_data['product_id'], branch=branch) for item_data in data['items']]
             
-            # Create invoice items
-            for item_data in data['items']:
-                product = Product.objects.get(id=item_data['product_id'])
-                InvoiceItem.objects.create(
-                    invoice=invoice,
-                    product=product,
-                    quantity=Decimal(item_data['quantity']),
+            # The invoice number, customer, invoice, its lines, the stock it
+            # takes and the ledger entries are written together or not at all,
+            # so a refused sale leaves no gap in the series and no customer
+            with transaction.atomic():
+                # Generate invoice number from the branch's own series; its
+                # write comes first so concurrent checkouts queue on it
+                invoice_number = InvoiceSequence.allocate(branch.invoice_prefix, branch=branch)[0]
+                
+                # Get or create customer
+                customer = resolve_customer({
+                    'name': customer_data['name'],
+                    'email': customer_data.get('email'),
+                    'phone': customer_data.get('phone', ''),
+                }, branch)
+                
+                # Create invoice
+                invoice = Invoice.objects.create(
+                    branch=branch,
+                    invoice_number=invoice_number,
+                    customer=customer,
+                    invoice_date=datetime.now().date(),
+                    discount=Decimal(data.get('discount', 0)),
+                    received_amount=Decimal(data.get('received_amount', 0)),
+                    notes=data.get('notes', ''),
+                    terms_conditions=data.get('terms_conditions', ''),
                 )
-            
-            # Calculate totals
-            invoice.calculate_totals()
+                
+                # Create invoice items, priced as of the invoice date
+                lines = [(product, Decimal(item_data['quantity'])) for product, item_data in zip(products, data['items'])]
+                prices = prices_on([product.pk for product in products], invoice.invoice_date)
+                for product, quantity in lines:
+                    price_per_unit, tax_percentage = prices[product.pk]
+                    InvoiceItem.objects.create(
+                        invoice=invoice,
+                        product=product,
+                        quantity=quantity,
+                        price_per_unit=price_per_unit,
+                        tax_percentage=tax_percentage,
+                    )
+                take_stock(invoice, lines)
+                
+                # Calculate totals
+                invoice.calculate_totals()
+                record_invoice(invoice)
+                analytics.record_invoice(invoice)
             
             # Auto-send email
             email_sent = False
@@ -160,7 +281,8 @@ def generate_invoice(request):
                 if email_sent:
                     invoice.email_sent = True
                     invoice.email_sent_at = timezone.now()
-                    invoice.save()
+                    # Only the send flags: totals, balances and version move elsewhere with F()
+                    invoice.save(update_fields=['email_sent', 'email_sent_at', 'updated_at'])
             
             return JsonResponse({
                 'success': True,
@@ -170,52 +292,281 @@ def generate_invoice(request):
                 'customer_email': customer.email
             })
             
+        except StockError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=409)
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=400)
     
     return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
 
 
+@require_http_methods(["POST"])
+def bulk_import_invoices(request):
+    """Bulk import invoices from an NDJSON or CSV request body"""
+    from .importers import InvoiceImporter, parse_ndjson, parse_csv
+    
+    content_type = request.content_type or ''
+    fmt = request.GET.get('format') or ('csv' if 'csv' in content_type else 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return JsonResponse({'success': False, 'error': f'Unsupported format: {fmt}'}, status=400)
+    
+    try:
+        batch_size = int(request.GET.get('batch_size', 500))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'batch_size must be a number'}, status=400)
+    
+    stream = codecs.iterdecode(request, 'utf-8')
+    records = parse_csv(stream) if fmt == 'csv' else parse_ndjson(stream)
+    importer = InvoiceImporter(batch_size=max(1, batch_size), branch=request.branch)
+    try:
+        result = importer.run(records)
+    except UnicodeDecodeError as e:
+        # Batches before the bad bytes are already imported; report them too
+        return JsonResponse({
+            'success': False,
+            'error': f'Request body is not valid UTF-8 ({e.reason})',
+            **importer.result.finish().as_dict(),
+        }, status=400)
+    
+    return JsonResponse({'success': result.failed == 0, **result.as_dict()})
+
+
 def invoice_detail(request, pk):
     """View invoice detail and download PDF"""
-    invoice = get_object_or_404(Invoice, pk=pk)
-    return render(request, 'billing/invoice_detail.html', {'invoice': invoice})
+    invoice = get_object_or_404(Invoice.objects.select_related('customer', 'branch'), pk=pk, branch=request.branch)
+    return render(request, 'billing/invoice_detail.html', {
+        'invoice': invoice,
+        'company': company_details(invoice.branch),
+        # The rendered invoice body is cached until the invoice or its customer changes
+        'cache_timeout': settings.CACHE_VIEW_TIMEOUT,
+    })
 
 
-def invoice_pdf(request, pk):
-    """Generate and download invoice PDF"""
-    invoice = get_object_or_404(Invoice, pk=pk)
-    pdf_buffer = generate_invoice_pdf(invoice)
+def _invoice_document(request, invoice):
+    """Render an invoice with the renderer named in ?renderer= (default: settings.INVOICE_RENDERER)"""
+    try:
+        renderer = get_renderer(request.GET.get('renderer'))
+    except RendererError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+    buffer = renderer.render(invoice)
     
-    response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Invoice_{invoice.invoice_number}.pdf"'
+    response = HttpResponse(buffer.getvalue(), content_type=renderer.content_type)
+    # Receipts are opened in the browser for printing; PDFs are downloaded
+    disposition = 'attachment' if renderer.extension == 'pdf' else 'inline'
+    response['Content-Disposition'] = f'{disposition}; filename="{renderer.filename(invoice)}"'
     
     return response
 
 
+def invoice_pdf(request, pk):
+    """Generate and download invoice PDF (or a thermal receipt with ?renderer=thermal)"""
+    invoice = get_object_or_404(Invoice.objects.select_related('customer', 'branch').prefetch_related('items'),
+                                pk=pk, branch=request.branch)
+    return _invoice_document(request, invoice)
+
+
+@require_http_methods(["GET"])
+@replica_reads()
+def customer_statement(request, pk):
+    """Statement of account PDF for ?month=YYYY-MM (default last month) or ?start=&end="""
+    from .statements import cached_statement, parse_period
+    
+    customer = get_object_or_404(Customer.objects.select_related('branch'), pk=pk, branch=request.branch)
+    try:
+        start, end = parse_period(request.GET.get('month'), request.GET.get('start'), request.GET.get('end'))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Use month=YYYY-MM or start/end=YYYY-MM-DD'}, status=400)
+    
+    # Rendered once per period and data version, then streamed from disk
+    path = cached_statement(customer, start, end)
+    return FileResponse(
+        open(path, 'rb'),
+        content_type='application/pdf',
+        as_attachment=request.GET.get('download') == '1',
+        filename=f"Statement_{customer.name}_{start:%Y%m%d}-{end:%Y%m%d}.pdf",
+    )
+
+
+def _invoice_state(invoice):
+    return {
+        'invoice_id': invoice.id,
+        'invoice_number': invoice.invoice_number,
+        'version': invoice.version,
+        'items': [{
+            'item_id': item.id,
+            'product_id': item.product_id,
+            'product_name': item.product_name,
+            'quantity': float(item.quantity),
+            'price_per_unit': float(item.price_per_unit),
+            'tax_percentage': float(item.tax_percentage),
+            'amount': float(item.amount),
+        } for item in invoice.items.order_by('id')],
+        'subtotal': float(invoice.subtotal),
+        'total_tax': float(invoice.total_tax),
+        'discount': float(invoice.discount),
+        'grand_total': float(invoice.grand_total),
+        'received_amount': float(invoice.received_amount),
+        'due_balance': float(invoice.due_balance),
+    }
+
+
+@require_http_methods(["GET", "POST"])
+def invoice_edit(request, pk):
+    """Invoice lines and version (GET); add, update and remove lines against that version (POST)"""
+    invoice = get_object_or_404(Invoice, pk=pk, branch=request.branch)
+    if request.method == 'GET':
+        return JsonResponse({'success': True, **_invoice_state(invoice)})
+    
+    try:
+        data = json.loads(request.body)
+        invoice = edit_invoice(
+            invoice,
+            int(data['version']),
+            add=[(int(line['product_id']), Decimal(str(line['quantity']))) for line in data.get('add', [])],
+            update=[(int(line['item_id']), Decimal(str(line['quantity']))) for line in data.get('update', [])],
+            remove=[int(item_id) for item_id in data.get('remove', [])],
+            discount=Decimal(str(data['discount'])) if 'discount' in data else None,
+        )
+    except (StaleInvoiceError, StockError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+    except (EditError, KeyError, TypeError, ValueError, ArithmeticError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': True, **_invoice_state(invoice)})
+
+
+@require_http_methods(["POST"])
+def invoice_payment(request, pk):
+    """Record a payment against an invoice"""
+    invoice = get_object_or_404(Invoice, pk=pk, branch=request.branch)
+    
+    try:
+        data = json.loads(request.body)
+        method = data.get('method', 'CASH')
+        if method not in dict(Payment.METHOD_CHOICES):
+            return JsonResponse({'success': False, 'error': f'Unknown payment method: {method}'}, status=400)
+        
+        payment = record_payment(
+            invoice,
+            Decimal(str(data['amount'])),
+            method=method,
+            reference=data.get('reference', ''),
+            notes=data.get('notes', ''),
+        )
+    except (PaymentError, KeyError, ValueError, ArithmeticError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'payment_id': payment.id,
+        'received_amount': float(invoice.received_amount),
+        'due_balance': float(invoice.due_balance),
+    })
+
+
+@require_http_methods(["GET"])
+@replica_reads()
+def outstanding_dues(request):
+    """Customers who owe money, largest outstanding balance first"""
+    try:
+        limit = min(int(request.GET.get('limit', 50)), 500)
+    except ValueError:
+        limit = 50
+    
+    customers = [{
+        'customer_id': balance.customer_id,
+        'name': balance.customer.name,
+        'phone': balance.customer.phone,
+        'email': balance.customer.email,
+        'total_billed': float(balance.total_billed),
+        'total_paid': float(balance.total_paid),
+        'outstanding': float(balance.outstanding),
+    } for balance in outstanding_customers(limit, request.branch)]
+    
+    return JsonResponse({'customers': customers})
+
+
+@require_http_methods(["GET"])
+def low_stock_products(request):
+    """The branch's tracked products at or below their reorder level"""
+    products = [{
+        'id': p.id,
+        'name': p.name,
+        'unit': p.unit,
+        'stock': float(p.stock),
+        'reorder_level': float(p.reorder_level),
+    } for p in low_stock(request.branch)]
+    
+    return JsonResponse({'products': products})
+
+
+@replica_reads()
 def invoice_search(request):
-    """Search invoices by customer name, phone, or invoice number"""
+    """Search invoices by number, customer name, phone, email, GSTIN or notes"""
     query = request.GET.get('q', '').strip()
     
-    invoices = Invoice.objects.all().order_by('-created_at')
+    invoices = Invoice.objects.filter(branch=request.branch).select_related('customer').order_by('-created_at')
     
     if query:
-        invoices = invoices.filter(
-            Q(invoice_number__icontains=query) |
-            Q(customer__name__icontains=query) |
-            Q(customer__phone__icontains=query)
-        )
+        ids = search_invoice_ids(query, branch=request.branch)
+        if ids is None:
+            invoices = invoices.filter(
+                Q(invoice_number__icontains=query) |
+                Q(customer__name__icontains=query) |
+                Q(customer__phone__icontains=query)
+            )
+        else:
+            # Keep the index's ranking (best match first)
+            found = invoices.in_bulk(ids)
+            invoices = [found[pk] for pk in ids if pk in found]
+    
+    archived_invoices = []
+    if query:
+        from .archive import search_archives
+        archived_invoices = search_archives(query, branch_id=request.branch.pk)
+        # Archived invoices stay in the database too; list each one only once
+        live = set(Invoice.objects.filter(pk__in=[a.pk for a in archived_invoices]).values_list('pk', flat=True))
+        archived_invoices = [a for a in archived_invoices if a.pk not in live]
     
     return render(request, 'billing/invoice_search.html', {
         'invoices': invoices,
+        'archived_invoices': archived_invoices,
         'query': query
     })
 
 
+def archived_invoice_pdf(request, year, invoice_number):
+    """Generate and download the PDF of an archived invoice"""
+    from .archive import ArchiveError, get_year
+    
+    try:
+        archive = get_year(year)
+    except ArchiveError:
+        raise Http404("No archive for that financial year")
+    row = archive.find(invoice_number, request.branch.pk)
+    if row is None:
+        raise Http404("Invoice not found in archive")
+    
+    return _invoice_document(request, archive.invoice(row))
+
+
+@require_http_methods(["GET"])
+def archive_summary(request, year):
+    """JSON monthly totals and top products for an archived financial year"""
+    from .archive import ArchiveError, get_year
+    
+    try:
+        archive = get_year(year)
+    except ArchiveError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    
+    return JsonResponse(archive.summary(branch_id=request.branch.pk))
+
+
 
 def send_invoice_to_whatsapp(request, pk):
     """Send invoice to customer's WhatsApp"""
-    invoice = get_object_or_404(Invoice, pk=pk)
+    invoice = get_object_or_404(Invoice, pk=pk, branch=request.branch)
     
     if request.method == 'POST':
         try:
@@ -224,7 +575,7 @@ def send_invoice_to_whatsapp(request, pk):
             if success:
                 invoice.whatsapp_sent = True
                 invoice.whatsapp_sent_at = datetime.now()
-                invoice.save()
+                invoice.save(update_fields=['whatsapp_sent', 'whatsapp_sent_at', 'updated_at'])
                 
                 return JsonResponse({'success': True, 'message': 'Invoice sent successfully!'})
             else:
@@ -240,7 +591,7 @@ def send_invoice_to_email(request, pk):
     """Send invoice to customer's Email (FREE)"""
     from .utils import send_invoice_email
     
-    invoice = get_object_or_404(Invoice, pk=pk)
+    invoice = get_object_or_404(Invoice, pk=pk, branch=request.branch)
     
     if request.method == 'POST':
         try:
@@ -255,7 +606,7 @@ def send_invoice_to_email(request, pk):
             if success:
                 invoice.email_sent = True
                 invoice.email_sent_at = timezone.now()
-                invoice.save()
+                invoice.save(update_fields=['email_sent', 'email_sent_at', 'updated_at'])
                 return JsonResponse({'success': True, 'message': f'Invoice sent successfully to {customer_email}!'})
             else:
                 return JsonResponse({'success': False, 'error': 'Failed to send email. Please check email configuration.'})
@@ -265,18 +616,71 @@ def send_invoice_to_email(request, pk):
     
     return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
 
+@require_http_methods(["GET"])
+@replica_reads()
+def analytics_api(request):
+    """JSON sales analytics of the current branch for a date range at day/week/month granularity"""
+    try:
+        start, end = analytics.default_range()
+        if request.GET.get('start'):
+            start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+        if request.GET.get('end'):
+            end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date()
+        top = min(int(request.GET.get('top', 10)), 100)
+        granularity = request.GET.get('granularity', 'day')
+        if start > end:
+            raise ValueError('start must not be after end')
+        
+        report = analytics.sales_report(request.branch, start, end, granularity, top)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse(report)
+
+
+@require_http_methods(["GET"])
+@replica_reads()
+def gst_report_api(request):
+    """GST summary for a month (?month=YYYY-MM) as JSON, or CSV with ?format=csv"""
+    from .gst import gst_report, report_to_csv
+    
+    try:
+        year, month = (int(part) for part in request.GET.get('month', '').split('-'))
+        datetime(year, month, 1)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'month must look like YYYY-MM'}, status=400)
+    
+    scope = request.GET.get('scope')
+    if scope not in (None, 'branch', 'all'):
+        return JsonResponse({'success': False, 'error': 'scope must be branch or all'}, status=400)
+    # One branch (its GSTIN) by default; ?scope=all for the whole company
+    report = gst_report(year, month, branch=None if scope == 'all' else request.branch)
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(report_to_csv(report), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="GST_{report["period"]}.csv"'
+        return response
+    return JsonResponse(report)
+
+
+@cache_view('invoice', 'product', 'customer')
+@replica_reads()
 def statistics(request):
     """View for business statistics dashboard"""
+    # Everything below is for the current branch only
+    invoices = Invoice.objects.filter(branch=request.branch)
+    
     # Overall Totals
-    total_revenue = Invoice.objects.aggregate(Sum('grand_total'))['grand_total__sum'] or 0
-    pending_payments = Invoice.objects.aggregate(Sum('due_balance'))['due_balance__sum'] or 0
-    total_invoices = Invoice.objects.count()
-    total_products = Product.objects.count()
-    total_customers = Customer.objects.count()
+    total_revenue = invoices.aggregate(Sum('grand_total'))['grand_total__sum'] or 0
+    pending_payments = CustomerBalance.objects.filter(
+        customer__branch=request.branch, outstanding__gt=0
+    ).aggregate(Sum('outstanding'))['outstanding__sum'] or 0
+    total_invoices = invoices.count()
+    total_products = Product.objects.filter(branch=request.branch).count()
+    total_customers = Customer.objects.filter(branch=request.branch).count()
     
     # Monthly Stats
     now = timezone.now()
-    current_month_invoices = Invoice.objects.filter(
+    current_month_invoices = invoices.filter(
         invoice_date__year=now.year,
         invoice_date__month=now.month
     )
@@ -284,7 +688,7 @@ def statistics(request):
     month_invoices_count = current_month_invoices.count()
     
     # Recent Invoices
-    recent_invoices = Invoice.objects.all().order_by('-created_at')[:5]
+    recent_invoices = invoices.order_by('-created_at')[:5]
     
     context = {
         'total_revenue': total_revenue,
@@ -12,25 +12,38 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Load environment variables. An explicit path skips find_dotenv()'s walk
+# up the call stack and directory tree on every process start.
+if (BASE_DIR / '.env').is_file():
+    load_dotenv(BASE_DIR / '.env')
+
 
-# Quick-start development settings - unsuitable for production
+# Settings profile: 'dev' (default) or 'prod'. The prod profile turns off
+# debug, caches compiled templates, compresses responses, answers conditional
+# GETs with 304s and serves static files under content-hashed names.
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
+PROFILE = os.getenv('DJANGO_PROFILE', 'dev')
+if PROFILE not in ('dev', 'prod'):
+    raise ImproperlyConfigured(f"DJANGO_PROFILE must be 'dev' or 'prod', not {PROFILE!r}")
+PRODUCTION = PROFILE == 'prod'
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-idr6qv5p%y9bjn(+u+3k=6@(=6^7xphl4887=1f0s%h(=7ql5b'
+SECRET_KEY = os.getenv('SECRET_KEY', '')
+if not SECRET_KEY:
+    if PRODUCTION:
+        raise ImproperlyConfigured('SECRET_KEY must be set when DJANGO_PROFILE=prod')
+    SECRET_KEY = 'django-insecure-idr6qv5p%y9bjn(+u+3k=6@(=6^7xphl4887=1f0s%h(=7ql5b'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', str(not PRODUCTION)).lower() in ('1', 'true', 'yes')
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host.strip() for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host.strip()]
 
 
 # Application definition
@@ -54,8 +67,17 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'billing.middleware.ReplicaPinMiddleware',
+    'billing.middleware.BranchMiddleware',
 ]
 
+if PRODUCTION:
+    # Static files are answered before anything else runs. GZip must run after
+    # (i.e. sit above) everything that edits the body; ConditionalGet turns
+    # ETag/Last-Modified matches into empty 304s
+    MIDDLEWARE[1:1] = ['billing.middleware.StaticFilesMiddleware', 'django.middleware.gzip.GZipMiddleware']
+    MIDDLEWARE.insert(4, 'django.middleware.http.ConditionalGetMiddleware')
+
 ROOT_URLCONF = 'bizbilling.urls'
 
 TEMPLATES = [
@@ -69,11 +91,24 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'billing.branches.branches',
             ],
         },
     },
 ]
 
+if PRODUCTION:
+    # Parse each template once per worker and keep the compiled version
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['debug'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+    TEMPLATES[0]['OPTIONS']['context_processors'].remove('django.template.context_processors.debug')
+
 WSGI_APPLICATION = 'bizbilling.wsgi.application'
 
 
@@ -84,9 +119,91 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests in production
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60 if PRODUCTION else 0)),
+        # A file rather than memory, so tests can hit it from several connections at once
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Optional read replica for reports and searches (see billing/routers.py).
+# Locally this can be a second SQLite file kept current by `sync_replica`.
+REPLICA_DB_NAME = os.getenv('REPLICA_DB_NAME', '')
+if REPLICA_DB_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': REPLICA_DB_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['billing.routers.ReplicaRouter']
+
+# Reads fall back to the primary while the replica is further behind than this
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 30))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+
+
+# Cache
+# locmem is per worker process; use the file backend when running several
+# workers so page caches are invalidated for all of them at once.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+            'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 600)),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bizbilling',
+            'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 600)),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# How long cached pages and template fragments live (they are also
+# invalidated as soon as the data behind them changes)
+CACHE_VIEW_TIMEOUT = int(os.getenv('CACHE_VIEW_TIMEOUT', 600))
+# Product prices as of a day (billing.pricing); any price change invalidates them
+PRICE_CACHE_TIMEOUT = int(os.getenv('PRICE_CACHE_TIMEOUT', 86400))
+
+# Import-time budget for a fresh worker, checked by `manage.py check_import_time`
+IMPORT_TIME_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', 600))
+
+# Invoice document renderer: platypus (default), canvas (faster fixed layout)
+# or a dotted path to an InvoiceRenderer subclass. thermal is a plain-text
+# POS receipt and is normally chosen per request with ?renderer=thermal.
+INVOICE_RENDERER = os.getenv('INVOICE_RENDERER', 'platypus')
+THERMAL_RECEIPT_WIDTH = int(os.getenv('THERMAL_RECEIPT_WIDTH', 42))  # 32 for 58 mm paper, 48 for 80 mm
+
+
+# Periodic jobs run by `manage.py run_scheduler` (cron fields in TIME_ZONE).
+# Each entry names a handler from billing.jobs.HANDLERS and its payload.
+SCHEDULES = {
+    'refresh-rollups': {'cron': '5 * * * *', 'kind': 'refresh_rollups', 'payload': {'days': 2}},
+    'nightly-export': {'cron': '15 0 * * *', 'kind': 'export_day', 'payload': {'days_ago': 1}},
+    'cleanup-files': {'cron': '30 3 * * *', 'kind': 'cleanup_files',
+                      'payload': {'days': 7, 'folders': ['invoices', 'exports']}},
+    'payment-reminders': {'cron': '0 10 * * *', 'kind': 'payment_reminders'},
+    'monthly-statements': {'cron': '0 6 1 * *', 'kind': 'monthly_statements'},
+    'apply-prices': {'cron': '1 0 * * *', 'kind': 'apply_prices'},
+}
+SCHEDULER_CONCURRENCY = int(os.getenv('SCHEDULER_CONCURRENCY', 2))  # jobs running at once per node
+SCHEDULER_TICK = float(os.getenv('SCHEDULER_TICK', 5))  # seconds between checks for due work
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', 60))  # how often a running job reports in
+
+# Payment reminders: an unpaid invoice gets one reminder as it passes each of
+# these ages (days); a customer's due invoices go out as one message
+REMINDER_STAGES = [int(days) for days in os.getenv('REMINDER_STAGES', '7,30,60').split(',') if days.strip()]
+REMINDER_CHANNELS = [name.strip() for name in os.getenv('REMINDER_CHANNELS', 'email,whatsapp').split(',') if name.strip()]
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 25))  # customers per SMTP/HTTP session
+REMINDER_PER_MINUTE = int(os.getenv('REMINDER_PER_MINUTE', 30))  # provider rate limit, 0 = none
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -126,20 +243,48 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+if PRODUCTION:
+    # collectstatic minifies our CSS/JS, writes content-hashed copies
+    # (style.3f2a9c.css) that can be cached forever plus .gz/.br versions;
+    # {% static %} resolves names through the manifest
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'billing.staticfiles.CompressedManifestStaticFilesStorage'},
+    }
+
+# Our own assets that collectstatic minifies (third-party files are left alone)
+STATIC_MINIFY_PATTERNS = ['css/*.css', 'js/*.js']
+# Cache lifetime for static files served under their plain (unhashed) names
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 60))
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Columnar archive of closed financial years (see billing/archive.py)
+ARCHIVE_ROOT = Path(os.getenv('ARCHIVE_ROOT', BASE_DIR / 'archive'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Company Details
+# Company Details (the default branch is created from these; other branches
+# carry their own name, address and GSTIN, see billing.models.Branch)
 COMPANY_NAME = os.getenv('COMPANY_NAME', 'Vishubh BizBilling')
 COMPANY_ADDRESS = os.getenv('COMPANY_ADDRESS', '40 Feet road, Pune, Maharashtra 411001')
 COMPANY_PHONE = os.getenv('COMPANY_PHONE', '+91 9890691272')
 COMPANY_GSTIN = os.getenv('COMPANY_GSTIN', '08AALCR2857A1ZD')
 COMPANY_PAN = os.getenv('COMPANY_PAN', 'AVHPC9999A')
+# Used to split GST into CGST+SGST (same state) or IGST (other states)
+COMPANY_STATE = os.getenv('COMPANY_STATE', 'Maharashtra')
+
+# Branch used for existing data, management commands and requests that have
+# not picked one (see billing.middleware.BranchMiddleware)
+DEFAULT_BRANCH = os.getenv('DEFAULT_BRANCH', 'MAIN')
+
+# Customer lookup: recently billed customers kept in memory per worker process,
+# dropped whenever any worker sharing the cache backend changes a customer
+CUSTOMER_CACHE_SIZE = int(os.getenv('CUSTOMER_CACHE_SIZE', 256))
 
 # WhatsApp Cloud API Settings
 WHATSAPP_PHONE_NUMBER_ID = os.getenv('WHATSAPP_PHONE_NUMBER_ID', '')
@@ -95,7 +95,7 @@ class ProductSearch {
             <div class="search-result-item" onclick="cart.addProduct(${JSON.stringify(product).replace(/"/g, '&quot;')})">
                 <div style="font-weight: 600;">${product.name}</div>
                 <div style="font-size: 0.875rem; color: var(--text-secondary);">
-                    ${product.category || 'Uncategorized'} - Rs. ${product.price_per_unit}/${product.unit}
+                    ${product.category || 'Uncategorized'} - Rs. ${product.price_per_unit}/${product.unit}${product.stock !== null ? ` - ${product.stock} in stock` : ''}
                 </div>
             </div>
         `).join('');